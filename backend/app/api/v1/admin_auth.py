@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer
 from datetime import timedelta, datetime
 from pydantic import BaseModel
@@ -9,7 +10,6 @@ from app.utils.auth import (
     get_current_user,
     get_current_admin_user,
     create_admin_user,
-    init_default_admin,
     change_admin_password,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
@@ -27,9 +27,6 @@ security = HTTPBearer()
 # Rate limiter for admin login
 limiter = Limiter(key_func=get_remote_address)
 
-# Initialize default admin on startup
-init_default_admin()
-
 class PasswordChangeRequest(BaseModel):
     current_password: str
     new_password: str
@@ -48,8 +45,9 @@ async def admin_login(login_data: AdminLogin, request: Request):
                 detail="Email and password are required"
             )
         
-        # Authenticate user
-        user = authenticate_user(login_data.email, login_data.password)
+        # Authenticate user - bcrypt (and creating the default admin on first
+        # use) takes hundreds of ms, so keep it off the event loop
+        user = await run_in_threadpool(authenticate_user, login_data.email, login_data.password)
         if not user:
             # 🔒 SECURITY: Use generic error message to prevent user enumeration
             raise HTTPException(
@@ -104,7 +102,8 @@ async def create_admin_user_endpoint(
     Create a new admin user - Only accessible by existing admins.
     """
     try:
-        new_user = create_admin_user(
+        new_user = await run_in_threadpool(
+            create_admin_user,
             email=user_data.email,
             password=user_data.password,
             full_name=user_data.full_name,
@@ -161,14 +160,14 @@ async def change_admin_password_endpoint(
     """
     try:
         # Verify current password
-        if not authenticate_user(current_user.email, password_data.current_password):
+        if not await run_in_threadpool(authenticate_user, current_user.email, password_data.current_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
             )
         
         # Change password
-        success = change_admin_password(current_user.email, password_data.new_password)
+        success = await run_in_threadpool(change_admin_password, current_user.email, password_data.new_password)
         
         if not success:
             raise HTTPException(
@@ -197,7 +196,7 @@ async def admin_system_status():
     """
     from app.utils.auth import get_admin_security_status
     
-    security_status = get_admin_security_status()
+    security_status = await run_in_threadpool(get_admin_security_status)
     
     return {
         "status": "operational" if security_status["system_initialized"] else "not_initialized",
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Request
 import time
 import json
 from datetime import datetime
+from app.utils.lazy import lazy_stats
 
 router = APIRouter()
 
@@ -45,7 +46,9 @@ async def diagnostic_test(request: Request):
             },
             "server_info": {
                 "api_version": "1.0",
-                "environment": "development" if effective_ip.startswith("127.") else "production"
+                "environment": "development" if effective_ip.startswith("127.") else "production",
+                # Heavy dependencies load on first use; shows which have and what they cost
+                "lazy_modules": lazy_stats()
             }
         }
         
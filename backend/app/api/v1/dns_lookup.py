@@ -1,12 +1,31 @@
-from fastapi import APIRouter, HTTPException, Query
-from app.models.ip_models import DNSResponse, DNSRecord
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile, File
+from fastapi.responses import StreamingResponse
+from app.models.ip_models import DNSResponse, DNSRecord, BulkDNSRequest, DNSBenchmarkRequest
+import asyncio
+import ipaddress
 import time
 import logging
-import dns.resolver
-import dns.exception
-from typing import List, Optional
+from app.utils.lazy import lazy_import
+from app.utils.dns_cache import resolve, get_resolver, resolver_for, dns_cache, DNSAnswer, NXDOMAIN, NODATA
+from app.utils.dns_trace import dns_tracer, delegation_cache
+from app.utils.dns_propagation import check_propagation
+from app.utils.dns_benchmark import DNS_BENCHMARK_CONFIG, benchmark_resolvers, validate_user_resolver
+from app.utils.dns_encrypted import DNS_TRANSPORT_CONFIG, transport_stats
+from app.utils.dns_sweep import SWEEP_FIELDS, ptr_cache, sweep_ptr, sweep_range
+from app.utils.cancellation import cancel_on_disconnect
+from app.utils.dns_bulk import (
+    BULK_DNS_CONFIG, SYSTEM_RESOLVER, BulkQuery, dedupe, parse_lines, run_bulk, error_row, ndjson_lines, csv_lines
+)
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+dns = lazy_import("dns", "dns.resolver", "dns.exception", "dns.reversename")
 
 router = APIRouter()
+limiter = Limiter(key_func=get_remote_address)
+
+VALID_RECORD_TYPES = {"A", "AAAA", "MX", "TXT", "NS", "CNAME", "PTR", "SOA", "SRV"}
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,7 +39,8 @@ async def test_endpoint():
 @router.get("/dns-lookup", response_model=DNSResponse)
 async def dns_lookup(
     domain: str = Query(..., description="Domain name to lookup"),
-    record_types: Optional[str] = Query("A", description="DNS record types to query (comma-separated: A,AAAA,MX,TXT,NS,CNAME)")
+    record_types: Optional[str] = Query("A", description="DNS record types to query (comma-separated: A,AAAA,MX,TXT,NS,CNAME)"),
+    transport: Optional[str] = Query(None, pattern="^(udp|doh|dot)$", description="udp, doh or dot; the server default if omitted")
 ):
     """
     Perform real DNS lookup for the specified domain and record types.
@@ -36,9 +56,11 @@ async def dns_lookup(
         else:
             record_types_list = [record_types] if record_types else ["A"]
         
+        # Called directly (not through FastAPI), transport is still its Query() default
+        transport = transport if isinstance(transport, str) else None
+        
         # Validate record types
-        valid_types = {"A", "AAAA", "MX", "TXT", "NS", "CNAME", "PTR", "SOA", "SRV"}
-        invalid_types = [rt for rt in record_types_list if rt.upper() not in valid_types]
+        invalid_types = [rt for rt in record_types_list if rt.upper() not in VALID_RECORD_TYPES]
         if invalid_types:
             raise HTTPException(status_code=400, detail=f"Invalid record types: {', '.join(invalid_types)}")
         
@@ -46,18 +68,21 @@ async def dns_lookup(
         start_time = time.time()
         
         records = []
+        cache = {}
         
-        # Perform real DNS queries
-        for record_type in record_types_list:
-            try:
-                logger.info(f"Querying {record_type} records for {domain}")
-                dns_records = await perform_dns_query(domain, record_type.upper())
-                records.extend(dns_records)
-                
-            except Exception as e:
-                logger.warning(f"Failed to query {record_type} records for {domain}: {e}")
+        # ✅ IMPROVED - Query all record types concurrently
+        results = await asyncio.gather(
+            *(query_records(domain, record_type.upper(), transport=transport) for record_type in record_types_list),
+            return_exceptions=True
+        )
+        for record_type, result in zip(record_types_list, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to query {record_type} records for {domain}: {result}")
                 # Continue with other record types if one fails
                 continue
+            type_records, answer = result
+            records.extend(type_records)
+            cache[record_type.upper()] = answer.info()
         
         query_time = round((time.time() - start_time) * 1000, 2)
         logger.info(f"DNS lookup completed for {domain} in {query_time}ms, found {len(records)} records")
@@ -65,7 +90,9 @@ async def dns_lookup(
         return DNSResponse(
             domain=domain,
             records=records,
-            query_time=query_time
+            query_time=query_time,
+            cache=cache,
+            transport=transport or DNS_TRANSPORT_CONFIG['default']
         )
         
     except HTTPException:
@@ -78,14 +105,23 @@ async def perform_dns_query(domain: str, record_type: str) -> List[DNSRecord]:
     """
     Perform real DNS query using dnspython.
     """
+    records, _ = await query_records(domain, record_type)
+    return records
+
+async def query_records(domain: str, record_type: str, resolver=None,
+                        transport: Optional[str] = None) -> Tuple[List[DNSRecord], DNSAnswer]:
+    """
+    Records of one type for domain, through the shared DNS cache.
+
+    TTLs are the time left until the cached answer expires.
+    """
     try:
-        # Configure resolver with timeout
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 10
-        
-        # Perform DNS resolution
-        answers = resolver.resolve(domain, record_type)
+        # Perform DNS resolution without blocking the event loop
+        answers = await resolve(domain, record_type, resolver=resolver, transport=transport)
+        if answers.status == NXDOMAIN:
+            logger.info(f"Domain {domain} not found for {record_type} records")
+        elif answers.status == NODATA:
+            logger.info(f"No {record_type} records found for {domain}")
         
         records = []
         for answer in answers:
@@ -103,24 +139,106 @@ async def perform_dns_query(domain: str, record_type: str) -> List[DNSRecord]:
                 type=record_type,
                 name=domain,
                 value=record_value,
-                ttl=int(answers.rrset.ttl)
+                ttl=answers.remaining()
             ))
         
-        return records
+        return records, answers
         
-    except dns.resolver.NXDOMAIN:
-        logger.info(f"Domain {domain} not found for {record_type} records")
-        return []
-    except dns.resolver.NoAnswer:
-        logger.info(f"No {record_type} records found for {domain}")
-        return []
-    except dns.resolver.Timeout:
+    except dns.exception.Timeout:
         logger.warning(f"DNS query timeout for {domain} {record_type}")
         raise Exception(f"DNS query timeout for {record_type} records")
     except Exception as e:
         logger.error(f"DNS query failed for {domain} {record_type}: {e}")
         raise Exception(f"DNS query failed: {str(e)}")
 
+# ✅ NEW - Bulk resolution for domain portfolios, streamed as NDJSON or CSV
+@router.post("/dns-lookup/bulk")
+@limiter.limit("5/minute")
+async def dns_lookup_bulk(request: Request, bulk_request: BulkDNSRequest):
+    """
+    Resolve many (domain, record types) pairs and stream one row per query.
+    """
+    items = (
+        (item.domain, item.record_types or bulk_request.record_types, item.resolver)
+        for item in bulk_request.items
+    )
+    return bulk_response(items, bulk_request.format)
+
+@router.post("/dns-lookup/bulk/upload")
+@limiter.limit("5/minute")
+async def dns_lookup_bulk_upload(
+    request: Request,
+    file: UploadFile = File(..., description="One domain per line: domain[,types[,resolver]]"),
+    record_types: str = Query("A", description="Default record types (comma-separated)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson or csv")
+):
+    """
+    Resolve every domain in an uploaded list and stream one row per query.
+    """
+    content = await file.read(BULK_DNS_CONFIG['max_upload_bytes'] + 1)
+    if len(content) > BULK_DNS_CONFIG['max_upload_bytes']:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Uploaded file must be UTF-8 text")
+
+    default_types = [rt.strip() for rt in record_types.split(',') if rt.strip()] or ["A"]
+    return bulk_response(parse_lines(text.splitlines(), default_types), format)
+
+def bulk_response(items: Iterable[Tuple[str, List[str], Optional[str]]], fmt: str) -> StreamingResponse:
+    """
+    Deduplicate the items and stream their resolution.
+
+    Invalid domains, record types and resolvers become INVALID rows
+    rather than failing the whole batch.
+    """
+    queries = dedupe(items)
+    if not queries:
+        raise HTTPException(status_code=400, detail="No domains to resolve")
+    if len(queries) > BULK_DNS_CONFIG['max_queries']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries: {len(queries)} (maximum {BULK_DNS_CONFIG['max_queries']})"
+        )
+
+    resolvers = {name: bulk_resolver(name) for name in {query.resolver for query in queries}}
+    logger.info(f"Starting bulk DNS resolution of {len(queries)} queries across {len(resolvers)} resolvers")
+
+    async def query_fn(query: BulkQuery) -> Dict[str, Any]:
+        resolver = resolvers[query.resolver]
+        if isinstance(resolver, str):
+            return error_row(query, "INVALID", resolver)
+        if not is_valid_domain(query.domain):
+            return error_row(query, "INVALID", "Invalid domain name")
+        if query.type not in VALID_RECORD_TYPES:
+            return error_row(query, "INVALID", f"Invalid record type: {query.type}")
+        records, answer = await query_records(query.domain, query.type, resolver)
+        return {
+            "domain": query.domain, "type": query.type, "resolver": query.resolver,
+            "status": answer.status, "ttl": answer.remaining(), "cached": answer.from_cache,
+            "values": [record.value for record in records], "error": None
+        }
+
+    rows = run_bulk(queries, query_fn)
+    headers = {"X-Bulk-Queries": str(len(queries)), "Cache-Control": "no-store"}
+    if fmt == "csv":
+        headers["Content-Disposition"] = 'attachment; filename="dns-bulk.csv"'
+        return StreamingResponse(csv_lines(rows), media_type="text/csv", headers=headers)
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson", headers=headers)
+
+def bulk_resolver(name: str):
+    """The shared resolver for a bulk resolver name, or why it can't be used."""
+    if name == SYSTEM_RESOLVER:
+        return get_resolver()
+    try:
+        address = ipaddress.ip_address(name)
+    except ValueError:
+        return f"Invalid resolver address: {name}"
+    if not BULK_DNS_CONFIG['allow_private_resolvers'] and not address.is_global:
+        return f"Resolver {name} is not a public address"
+    return resolver_for(str(address))
+
 def is_valid_domain(domain: str) -> bool:
     """
     Validate domain name format.
@@ -134,7 +252,10 @@ def is_valid_domain(domain: str) -> bool:
     return bool(re.match(pattern, domain))
 
 @router.get("/reverse-dns")
-async def reverse_dns_lookup(ip: str = Query(..., description="IP address for reverse DNS lookup")):
+async def reverse_dns_lookup(
+    ip: str = Query(..., description="IP address for reverse DNS lookup"),
+    transport: Optional[str] = Query(None, pattern="^(udp|doh|dot)$", description="udp, doh or dot; the server default if omitted")
+):
     """
     Perform real reverse DNS lookup for an IP address.
     """
@@ -146,34 +267,35 @@ async def reverse_dns_lookup(ip: str = Query(..., description="IP address for re
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid IP address format")
         
-        logger.info(f"Performing reverse DNS lookup for {ip}")
+        transport = transport if isinstance(transport, str) else None
         
-        # Perform reverse DNS lookup
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
+        logger.info(f"Performing reverse DNS lookup for {ip}")
         
         # Convert IP to reverse DNS format
         reversed_ip = dns.reversename.from_address(ip)
         
-        try:
-            answers = resolver.resolve(reversed_ip, "PTR")
-            hostname = str(answers[0]).rstrip('.')
-            
-            logger.info(f"Reverse DNS successful for {ip}: {hostname}")
-            return {
-                "ip": ip,
-                "hostname": hostname,
-                "status": "success"
-            }
-            
-        except dns.resolver.NXDOMAIN:
+        answers = await resolve(reversed_ip, "PTR", transport=transport, cache=ptr_cache)
+        if answers.status == NXDOMAIN:
             logger.info(f"No reverse DNS record found for {ip}")
             return {
                 "ip": ip,
                 "hostname": None,
                 "status": "no_record",
-                "error": "No reverse DNS record found"
+                "error": "No reverse DNS record found",
+                "ttl": answers.remaining()
             }
+        if answers.status == NODATA:
+            raise dns.resolver.NoAnswer()
+        
+        hostname = str(next(iter(answers))).rstrip('.')
+        
+        logger.info(f"Reverse DNS successful for {ip}: {hostname}")
+        return {
+            "ip": ip,
+            "hostname": hostname,
+            "status": "success",
+            "ttl": answers.remaining()
+        }
             
     except HTTPException:
         raise
@@ -181,70 +303,141 @@ async def reverse_dns_lookup(ip: str = Query(..., description="IP address for re
         logger.error(f"Reverse DNS lookup failed for {ip}: {e}")
         raise HTTPException(status_code=500, detail=f"Reverse DNS lookup failed: {str(e)}")
 
+# ✅ NEW - PTR records for a whole range, streamed in address order
+@router.get("/reverse-dns/sweep")
+@limiter.limit("5/minute")
+async def reverse_dns_sweep(
+    request: Request,
+    cidr: str = Query(..., description="Network to sweep, e.g. 192.0.2.0/24 or 2001:db8::/64"),
+    offset: int = Query(0, ge=0, description="First address, counted from the network address"),
+    limit: Optional[int] = Query(None, ge=1, description="Number of addresses (defaults to as many as allowed)"),
+    resolver: Optional[str] = Query(None, description="Nameserver IP; the server's own resolvers if omitted"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson or csv")
+):
+    """
+    Resolve the PTR record of every address in a range and stream one row per address.
+
+    Ranges larger than the per-sweep maximum are swept a slice at a time:
+    the X-Sweep-Next-Offset header gives the offset of the next slice.
+    """
+    try:
+        addresses = sweep_range(cidr, offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sweep_resolver = bulk_resolver(resolver or SYSTEM_RESOLVER)
+    if isinstance(sweep_resolver, str):
+        raise HTTPException(status_code=400, detail=sweep_resolver)
+
+    logger.info(f"Starting reverse DNS sweep of {len(addresses)} addresses in {addresses.network} from offset {offset}")
+    rows = sweep_ptr(addresses, sweep_resolver)
+    headers = {
+        "X-Sweep-Network": str(addresses.network),
+        "X-Sweep-Addresses": str(len(addresses)),
+        "Cache-Control": "no-store"
+    }
+    if addresses.next_offset is not None:
+        headers["X-Sweep-Next-Offset"] = str(addresses.next_offset)
+    if format == "csv":
+        headers["Content-Disposition"] = 'attachment; filename="reverse-dns-sweep.csv"'
+        return StreamingResponse(csv_lines(rows, SWEEP_FIELDS), media_type="text/csv", headers=headers)
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson", headers=headers)
+
 @router.get("/dns-servers")
 async def get_dns_servers():
     """
     Get the currently configured DNS servers.
     """
     try:
-        resolver = dns.resolver.Resolver()
-        servers = [str(server) for server in resolver.nameservers]
+        servers = [str(server) for server in get_resolver().nameservers]
         
         return {
             "dns_servers": servers,
-            "count": len(servers)
+            "count": len(servers),
+            "cache": dns_cache.stats(),
+            "ptr_cache": ptr_cache.stats(),
+            "transport": transport_stats()
         }
         
     except Exception as e:
         logger.error(f"Failed to get DNS servers: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get DNS servers: {str(e)}")
 
+# ✅ NEW - Cached/uncached latency, timeouts and DNSSEC validation per resolver
+@router.post("/dns-benchmark")
+@limiter.limit("3/minute")
+@cancel_on_disconnect
+async def dns_benchmark(request: Request, benchmark_request: DNSBenchmarkRequest):
+    """
+    Benchmark the configured DNS servers and/or a user-supplied list.
+    """
+    try:
+        if len(benchmark_request.resolvers) > DNS_BENCHMARK_CONFIG['max_resolvers']:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {DNS_BENCHMARK_CONFIG['max_resolvers']} resolvers can be benchmarked"
+            )
+        
+        resolvers = []
+        if benchmark_request.include_system:
+            resolver = get_resolver()
+            resolvers.extend(
+                {"address": str(server), "port": resolver.port, "source": "system"}
+                for server in resolver.nameservers
+            )
+        for spec in benchmark_request.resolvers:
+            try:
+                address, port = validate_user_resolver(spec)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid resolver {spec}: {str(e)}")
+            resolvers.append({"address": address, "port": port, "source": "user"})
+        if not resolvers:
+            raise HTTPException(status_code=400, detail="No resolvers to benchmark")
+        
+        logger.info(f"Benchmarking {len(resolvers)} DNS resolvers with {benchmark_request.probes} probes each")
+        results = await benchmark_resolvers(resolvers, benchmark_request.probes)
+        
+        return {
+            "probes": benchmark_request.probes,
+            "resolvers": results,
+            "fastest": results[0]["address"] if results[0]["uncached"] else None
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"DNS benchmark failed: {e}")
+        raise HTTPException(status_code=500, detail=f"DNS benchmark failed: {str(e)}")
+
 @router.get("/dns-trace")
-async def dns_trace(domain: str = Query(..., description="Domain to trace")):
+async def dns_trace(
+    domain: str = Query(..., description="Domain to trace"),
+    record_type: str = Query("A", description="Record type to resolve at the end of the trace")
+):
     """
     Perform DNS trace to show the resolution path.
+
+    ✅ IMPROVED - Walks the delegation chain iteratively from the root
+    servers (or the deepest cached zone cut), with per-hop latency.
     """
     try:
         if not is_valid_domain(domain):
             raise HTTPException(status_code=400, detail="Invalid domain name")
+        if record_type.upper() not in VALID_RECORD_TYPES:
+            raise HTTPException(status_code=400, detail=f"Invalid record type: {record_type}")
         
-        logger.info(f"Performing DNS trace for {domain}")
-        
-        trace_steps = []
-        resolver = dns.resolver.Resolver()
-        
-        # Get authoritative nameservers
-        try:
-            # Start from root servers and trace down
-            current_domain = domain
-            while current_domain:
-                try:
-                    ns_answers = resolver.resolve(current_domain, "NS")
-                    nameservers = [str(ns) for ns in ns_answers]
-                    
-                    trace_steps.append({
-                        "domain": current_domain,
-                        "nameservers": nameservers,
-                        "type": "NS"
-                    })
-                    
-                    # Move up one level
-                    parts = current_domain.split('.')
-                    if len(parts) <= 2:
-                        break
-                    current_domain = '.'.join(parts[1:])
-                    
-                except dns.resolver.NXDOMAIN:
-                    break
-                except dns.resolver.NoAnswer:
-                    break
-                    
-        except Exception as e:
-            logger.warning(f"DNS trace incomplete for {domain}: {e}")
+        logger.info(f"Performing DNS trace for {domain} {record_type.upper()}")
+        trace = await dns_tracer.trace(domain, record_type)
         
         return {
             "domain": domain,
-            "trace_steps": trace_steps
+            "record_type": trace["record_type"],
+            "status": trace["status"],
+            "answer": trace["answer"],
+            "started_from": trace["started_from"],
+            "trace_steps": trace["hops"],
+            "total_ms": trace["total_ms"],
+            "delegation_cache": delegation_cache.stats()
         }
         
     except HTTPException:
@@ -253,3 +446,33 @@ async def dns_trace(domain: str = Query(..., description="Domain to trace")):
         logger.error(f"DNS trace failed for {domain}: {e}")
         raise HTTPException(status_code=500, detail=f"DNS trace failed: {str(e)}")
 
+# ✅ NEW - Has a record change reached resolvers around the world?
+@router.get("/dns-propagation")
+@limiter.limit("10/minute")
+async def dns_propagation(
+    request: Request,
+    domain: str = Query(..., description="Domain to check"),
+    record_type: str = Query("A", description="Record type to compare across resolvers"),
+    expected: Optional[str] = Query(None, description="Expected answer value (e.g. the new IP address)")
+):
+    """
+    Ask many public resolvers at once and group them by the answer they give.
+    """
+    try:
+        if not is_valid_domain(domain):
+            raise HTTPException(status_code=400, detail="Invalid domain name")
+        if record_type.upper() not in VALID_RECORD_TYPES:
+            raise HTTPException(status_code=400, detail=f"Invalid record type: {record_type}")
+        
+        logger.info(f"Checking DNS propagation of {domain} {record_type.upper()}")
+        result = await check_propagation(domain, record_type, expected=expected)
+        logger.info(f"Propagation of {domain}: {len(result['groups'])} distinct answers from "
+                    f"{result['responding']}/{result['total']} resolvers")
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"DNS propagation check failed for {domain}: {e}")
+        raise HTTPException(status_code=500, detail=f"DNS propagation check failed: {str(e)}")
+
@@ -1,17 +1,23 @@
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Request
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Dict, Any
 import asyncio
-import dns.resolver
-import dns.reversename
+from app.utils.lazy import lazy_import
+from app.utils.dns_cache import resolve
+from app.utils.email_auth import EMAIL_AUTH_CONFIG, check_email_auth
 import logging
 import re
 import httpx
 from email.utils import parseaddr
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+dns = lazy_import("dns", "dns.resolver", "dns.exception", "dns.reversename")
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
+limiter = Limiter(key_func=get_remote_address)
 
 class EmailBlacklistResult(BaseModel):
     domain: str
@@ -77,21 +83,14 @@ async def check_domain_blacklist(domain: str, blacklist: str) -> Optional[str]:
         # Create the query domain
         query_domain = f"{domain}.{blacklist}"
         
-        # Perform DNS lookup
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 3
-        resolver.lifetime = 3
-        
-        answers = resolver.resolve(query_domain, 'A')
+        # Perform DNS lookup (NXDOMAIN means not listed, and is cached as such)
+        answers = await resolve(query_domain, 'A', lifetime=3, transport="fanout")
         
         # If we get an answer, the domain is listed
         for answer in answers:
             return str(answer)
             
-    except dns.resolver.NXDOMAIN:
-        # Domain not in blacklist (good)
-        pass
-    except dns.resolver.Timeout:
+    except dns.exception.Timeout:
         logger.warning(f"Timeout checking {domain} against {blacklist}")
     except Exception as e:
         logger.warning(f"Error checking {domain} against {blacklist}: {str(e)}")
@@ -101,11 +100,7 @@ async def check_domain_blacklist(domain: str, blacklist: str) -> Optional[str]:
 async def get_mx_records(domain: str) -> List[str]:
     """Get MX records for the domain"""
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 5
-        
-        answers = resolver.resolve(domain, 'MX')
+        answers = await resolve(domain, 'MX', lifetime=5)
         mx_records = []
         
         for answer in answers:
@@ -339,4 +334,38 @@ async def check_email_blacklist_post(
     """
     Check if an email domain is blacklisted and assess its reputation (JSON body version)
     """
-    return await check_email_blacklist(request.email, request.include_reputation) 
\ No newline at end of file
+    return await check_email_blacklist(request.email, request.include_reputation) 
+
+# ✅ NEW - SPF include tree (flattened), DMARC policy and DKIM keys in one check
+@router.get("/email-auth")
+@limiter.limit("10/minute")
+async def email_auth_check(
+    request: Request,
+    domain: str = Query(..., description="Domain (or email address) to check"),
+    dkim_selectors: Optional[str] = Query(None, description="DKIM selectors (comma-separated); common ones if omitted")
+):
+    """
+    Evaluate a domain's SPF, DMARC and DKIM records.
+    """
+    try:
+        domain = ((extract_domain_from_email(domain) or "") if '@' in domain else domain).strip().lower().rstrip('.')
+        if not re.match(r'^([a-z0-9_]([a-z0-9_\-]{0,61}[a-z0-9])?\.)+[a-z]{2,}$', domain):
+            raise HTTPException(status_code=400, detail="Invalid domain name")
+
+        selectors = [s.strip() for s in (dkim_selectors or "").split(',') if s.strip()] or None
+        if selectors and len(selectors) > EMAIL_AUTH_CONFIG['max_selectors']:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many DKIM selectors (maximum {EMAIL_AUTH_CONFIG['max_selectors']})"
+            )
+        if selectors and not all(re.match(r'^[A-Za-z0-9_\-.]{1,63}$', selector) for selector in selectors):
+            raise HTTPException(status_code=400, detail="Invalid DKIM selector")
+
+        logger.info(f"Checking email authentication for {domain}")
+        return await check_email_auth(domain, selectors)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Email authentication check failed for {domain}: {e}")
+        raise HTTPException(status_code=500, detail=f"Email authentication check failed: {str(e)}")
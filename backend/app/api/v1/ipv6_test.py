@@ -4,11 +4,14 @@ from typing import List, Optional, Dict, Any
 import asyncio
 import socket
 import ipaddress
-import dns.resolver
+from app.utils.lazy import lazy_import
+from app.utils.dns_cache import resolve
 import logging
 import time
 import httpx
 
+dns = lazy_import("dns", "dns.resolver")
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -112,12 +115,10 @@ async def test_ipv6_dns_resolution() -> IPv6TestResult:
     
     try:
         # Try to resolve a known IPv6 address
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = 5
-        resolver.lifetime = 5
-        
         # Test resolving AAAA records
-        answers = resolver.resolve('google.com', 'AAAA')
+        answers = await resolve('google.com', 'AAAA', lifetime=5)
+        if not len(answers):
+            raise dns.resolver.NoAnswer()
         ipv6_addresses = [str(answer) for answer in answers]
         
         duration = (time.time() - start_time) * 1000
@@ -149,10 +150,8 @@ async def test_ipv6_connectivity(target_name: str, target_host: str, port: int)
         else:
             # Resolve hostname to IPv6
             try:
-                resolver = dns.resolver.Resolver()
-                resolver.timeout = 3
-                answers = resolver.resolve(target_host, 'AAAA')
-                target_ip = str(answers[0])
+                answers = await resolve(target_host, 'AAAA', lifetime=3)
+                target_ip = str(next(iter(answers)))
             except:
                 duration = (time.time() - start_time) * 1000
                 return IPv6TestResult(
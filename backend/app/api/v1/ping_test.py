@@ -1,14 +1,18 @@
 from fastapi import APIRouter, HTTPException, Request
-from app.models.ip_models import PingTestRequest, PingTestResult
+from app.models.ip_models import PingTestRequest, PingTestResult, UDPTestRequest, UDPTestResult
 import asyncio
 import logging
 import time
 import socket
-import aiohttp
+from app.utils.lazy import lazy_import
 from typing import List, Optional
+from app.utils.cancellation import cancel_on_disconnect
+from app.utils.udp_probe import run_udp_probe, echo_responder_status, UDP_PROBE_CONFIG
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 
+aiohttp = lazy_import("aiohttp")
+
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
@@ -273,7 +277,9 @@ async def run_traceroute(host: str, max_hops: int = 30):
         raise HTTPException(status_code=500, detail=f"HTTP traceroute failed: {str(e)}")
 
 @router.get("/ping-test/bulk")
+@cancel_on_disconnect
 async def run_bulk_ping_test(
+    request: Request,
     hosts: str,
     count: int = 4
 ):
@@ -354,3 +360,39 @@ async def check_connectivity(host: str):
             "error": str(e),
             "status": "error"
         }
+
+# ✅ NEW - UDP echo measurement: real packet loss, duplication, reordering and jitter
+@router.post("/udp-test", response_model=UDPTestResult)
+@limiter.limit("5/minute")
+@cancel_on_disconnect
+async def run_udp_test(request: Request, udp_request: UDPTestRequest):
+    """
+    Send sequenced UDP datagrams to an echo responder and measure what comes back.
+    """
+    try:
+        if udp_request.count > UDP_PROBE_CONFIG['max_count'] or udp_request.rate > UDP_PROBE_CONFIG['max_rate']:
+            raise HTTPException(status_code=400, detail="Count or rate exceeds the configured maximum")
+
+        logger.info(f"Starting UDP test to {udp_request.host}:{udp_request.port} "
+                    f"({udp_request.count} packets at {udp_request.rate}/s)")
+        result = await run_udp_probe(
+            udp_request.host, udp_request.port, udp_request.count, udp_request.rate, udp_request.payload_size
+        )
+        logger.info(f"UDP test to {udp_request.host}: {result['packets_received']}/{result['packets_sent']} "
+                    f"received, {result['reordered']} reordered")
+        return UDPTestResult(**result)
+
+    except HTTPException:
+        raise
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"UDP test failed: {str(e)}")
+    except Exception as e:
+        logger.error(f"UDP test failed for {udp_request.host}: {e}")
+        raise HTTPException(status_code=500, detail=f"UDP test failed: {str(e)}")
+
+@router.get("/udp-echo")
+async def get_udp_echo_status():
+    """
+    Where this server's UDP echo responder listens, if it runs (UDP_ECHO_PORT).
+    """
+    return echo_responder_status()
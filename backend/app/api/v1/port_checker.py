@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from app.models.ip_models import PortCheckRequest, PortCheckResponse, PortStatus, PortCheckResult, PortCheckResultResponse
 import asyncio
 import socket
 import time
 import logging
 from typing import List
+from app.utils.cancellation import cancel_on_disconnect
 
 router = APIRouter()
 
@@ -92,7 +93,8 @@ async def check_single_port(host: str, port: int, timeout: float = 3.0) -> PortC
         )
 
 @router.post("/port-checker", response_model=PortCheckResultResponse)
-async def check_ports(request: PortCheckRequest):
+@cancel_on_disconnect
+async def check_ports(request: PortCheckRequest, http_request: Request):
     """
     Check if specified ports are open on a host using real network connections.
     """
@@ -159,6 +161,7 @@ def is_valid_host(host: str) -> bool:
 
 @router.get("/port-check-simple")
 async def check_ports_simple(
+    http_request: Request,
     host: str = Query(..., description="Target hostname or IP address"),
     ports: str = Query(..., description="Comma-separated list of ports to check")
 ):
@@ -181,7 +184,7 @@ async def check_ports_simple(
         
         # Create request object and use the main port check function
         request = PortCheckRequest(host=host, ports=port_list)
-        return await check_ports(request)
+        return await check_ports(request, http_request)
         
     except HTTPException:
         raise
@@ -1,25 +1,42 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
 from app.models.ip_models import SpeedTestResult
+from app.utils.speed_payload import aiter_payload, MAX_DOWNLOAD_BYTES, MAX_UPLOAD_BYTES
+from app.utils.throughput import measure_download, measure_upload, measure_latency
+from app.utils.latency import (
+    sample_http_latency, sample_tcp_latency, LatencyProber, http_probe, probe_client, LATENCY_CONFIG
+)
+from app.utils.cancellation import cancel_on_disconnect, run_in_thread, run_subprocess, current_token
+from app.utils.rate_limit import GCRALimiter, get_client_prefix
+from app.utils.result_store import result_store, METRICS, GROUP_COLUMNS
+from app.utils.result_reuse import ReuseCache
+from app.utils.throughput_analysis import analyze_counter, series, series_csv_rows, RawSeriesStore
+from app.utils.lazy import lazy_import
+from app.utils.speedtest_pool import SpeedtestPool
 import asyncio
 import time
 import subprocess
 import json
 import logging
 import statistics
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import httpx
-from geopy.distance import geodesic
 import threading
 import os
 import signal
 import tempfile
 import shutil
-import aiofiles
 from concurrent.futures import ThreadPoolExecutor
 import platform
-import speedtest
 import sys
 import random
+import uuid
+from collections import deque
+
+# ✅ IMPROVED - Loaded on first use so cold starts don't pay for them
+geopy = lazy_import("geopy", "geopy.distance")
+speedtest = lazy_import("speedtest")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +47,11 @@ router = APIRouter()
 # Official Ookla CLI path - use absolute path resolution
 def get_ookla_cli_path():
     """Get the correct path to the Ookla CLI executable."""
+    # Explicit override, e.g. a Linux build or the benchmark stand-in
+    env_path = os.getenv("OOKLA_CLI_PATH")
+    if env_path:
+        return os.path.abspath(env_path)
+    
     # Try multiple path resolution strategies
     paths_to_try = [
         # Current working directory
@@ -50,7 +72,16 @@ def get_ookla_cli_path():
     logger.warning("Ookla CLI not found in any expected location")
     return paths_to_try[0]
 
-OOKLA_CLI_PATH = get_ookla_cli_path()
+# Resolved on first use (probing the filesystem slows cold starts); tests and
+# benchmarks may assign it directly
+OOKLA_CLI_PATH: Optional[str] = None
+
+def ookla_cli_path() -> str:
+    """Path of the Ookla CLI, resolved once."""
+    global OOKLA_CLI_PATH
+    if OOKLA_CLI_PATH is None:
+        OOKLA_CLI_PATH = get_ookla_cli_path()
+    return OOKLA_CLI_PATH
 
 # ADD HEALTH ENDPOINT
 @router.get("/health")
@@ -63,73 +94,65 @@ async def health_check():
         "version": "1.0.0"
     }
 
-# ✅ ENHANCED - Improved rate limiting for production scalability
+# ✅ FIXED - Upstream Ookla quota tracking (shared, since Ookla limits this server's IP)
 class RateLimitTracker:
-    def __init__(self, burst_interval=30, burst_requests=5, hourly_requests=100, daily_requests=500):
-        self.last_request_time = 0
-        self.request_count = 0
-        self.reset_time = time.time()
-        self.daily_reset_time = time.time()
-        self.daily_count = 0
-        
-        # More reasonable limits for production
-        self.burst_interval = burst_interval  # 30 seconds between burst requests
-        self.burst_requests = burst_requests  # 5 requests per burst
-        self.hourly_requests = hourly_requests  # 100 requests per hour
-        self.daily_requests = daily_requests  # 500 requests per day
-        
+    """Track this server's own Ookla CLI request budget with backoff on 429s."""
+    
+    def __init__(self, interval=3600, max_requests=100, max_backoff=86400):
+        self.base_interval = interval
+        self.interval = interval  # Grows with consecutive upstream rate limits
+        self.max_requests = max_requests
+        self.max_backoff = max_backoff
+        self.request_times = deque()
         self.consecutive_failures = 0
-        self.blocked_until = 0  # Exponential backoff for abuse
+        self.blocked_until = 0
+    
+    def _prune(self, current_time):
+        while self.request_times and current_time - self.request_times[0] >= self.interval:
+            self.request_times.popleft()
         
     def can_make_request(self):
         current_time = time.time()
         
-        # Check if user is temporarily blocked
+        # Backing off after being rate limited upstream
         if current_time < self.blocked_until:
             return False
         
-        # Reset hourly counter
-        if current_time - self.reset_time > 3600:
-            self.request_count = 0
-            self.reset_time = current_time
-            self.consecutive_failures = 0
-        
-        # Reset daily counter
-        if current_time - self.daily_reset_time > 86400:
-            self.daily_count = 0
-            self.daily_reset_time = current_time
-        
-        # Check daily limit
-        if self.daily_count >= self.daily_requests:
-            return False
-        
-        # Check hourly limit
-        if self.request_count >= self.hourly_requests:
-            return False
-        
-        # Check burst limit (time-based)
-        if current_time - self.last_request_time < self.burst_interval:
-            return False
-            
-        return True
+        self._prune(current_time)
+        return len(self.request_times) < self.max_requests
     
     def record_request(self):
-        self.last_request_time = time.time()
-        self.request_count += 1
-        self.daily_count += 1
+        self.request_times.append(time.time())
     
     def record_success(self):
-        """Record successful request - reset failure counter"""
+        """Record successful request - reset failure counter and backoff"""
         self.consecutive_failures = 0
+        self.interval = self.base_interval
     
     def record_rate_limit(self):
-        """Record rate limit - only slightly increase interval"""
+        """Record upstream rate limit - back off exponentially"""
         self.consecutive_failures += 1
-        logger.warning(f"Rate limited. Consecutive failures: {self.consecutive_failures}")
+        self.interval = min(self.base_interval * (2 ** self.consecutive_failures), self.max_backoff)
+        self.blocked_until = time.time() + self.interval
+        logger.warning(f"Rate limited. Consecutive failures: {self.consecutive_failures}, backing off {self.interval}s")
+    
+    def reset(self):
+        self.interval = self.base_interval
+        self.request_times.clear()
+        self.consecutive_failures = 0
+        self.blocked_until = 0
 
-# Global rate limit tracker
+# Global upstream quota tracker for the Ookla CLI
 rate_limiter = RateLimitTracker()
 
+# ✅ NEW - Per-client limits so one heavy user can't exhaust the budget for everyone
+CLIENT_RATE_LIMITS = [
+    (30, 5),       # 5 tests per 30 seconds (burst)
+    (3600, 100),   # 100 tests per hour
+    (86400, 500)   # 500 tests per day
+]
+client_rate_limiter = GCRALimiter(CLIENT_RATE_LIMITS, max_clients=100_000)
+
 # Enhanced speed test configuration for maximum accuracy
 SPEED_TEST_CONFIG = {
     'timeout': 90,  # Increased timeout for better accuracy
@@ -139,9 +162,28 @@ SPEED_TEST_CONFIG = {
     'chunk_size': 1024 * 1024,  # 1MB chunks for better throughput
     'max_retries': 3,
     'connection_timeout': 15,
-    'read_timeout': 60
+    'read_timeout': 60,
+    # HTTP fallback engine - {bytes} is filled with the per-request object size
+    'http_download_url': os.getenv("SPEED_TEST_DOWNLOAD_URL", "https://speed.cloudflare.com/__down?bytes={bytes}"),
+    # Upload sink - an external endpoint or this backend's /api/v1/speed-test/upload
+    'http_upload_url': os.getenv("SPEED_TEST_UPLOAD_URL", "https://speed.cloudflare.com/__up"),
+    'http_latency_url': os.getenv("SPEED_TEST_LATENCY_URL", "https://speed.cloudflare.com/__down?bytes=0"),
+    'http_streams': 6,
+    'http_time_budget': 15,  # Upper bound - phases stop earlier once the estimate converges
+    'http_min_duration': 4,
+    'http_convergence_threshold': 0.03,
+    # Default reuse window in seconds for POST /speed-test (0 = only when the request asks)
+    'reuse_window': int(os.getenv("SPEED_TEST_REUSE_WINDOW", "0")),
+    # Keep speedtest-cli's config, server list and best server warm in the background.
+    # Opt-in: every worker process would otherwise poll speedtest.net from startup
+    'warm_pool': os.getenv("SPEEDTEST_WARM_POOL", "false").lower() == "true",
+    'warm_refresh_interval': int(os.getenv("SPEEDTEST_WARM_REFRESH", "600")),
+    'warm_max_age': 1800
 }
 
+# Longest reuse window a request may ask for
+REUSE_MAX_WINDOW = 600
+
 async def get_user_location(request: Request) -> Optional[Dict[str, Any]]:
     """Get user's location from IP address with proper IP detection."""
     try:
@@ -273,7 +315,7 @@ def find_best_server(servers: List[Dict], user_location: Optional[Dict[str, Any]
         if server.get('lat') and server.get('lon'):
             server_coords = (server['lat'], server['lon'])
             try:
-                distance = geodesic(user_coords, server_coords).kilometers
+                distance = geopy.distance.geodesic(user_coords, server_coords).kilometers
                 server_distances.append((server, distance))
             except:
                 # If distance calculation fails, use as backup
@@ -286,7 +328,41 @@ def find_best_server(servers: List[Dict], user_location: Optional[Dict[str, Any]
     server_distances.sort(key=lambda x: x[1])
     return server_distances[0][0]
 
+def _ookla_loaded_latency(phase: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Map the Ookla CLI per-phase latency block onto our latency fields (Ookla reports an IQM, not a median)."""
+    latency = phase.get('latency')
+    if not latency:
+        return None
+    return {'min': latency.get('low'), 'iqm': latency.get('iqm'), 'max': latency.get('high')}
+
 # ✅ FIXED - Enhanced Ookla CLI with better rate limiting
+def _parse_ookla_output(stdout: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Tuple[List[float], List[float]]]]:
+    """
+    Split Ookla CLI output into the final result and per-phase progress counters.
+
+    Handles --format=jsonl event streams (progress events carry the
+    cumulative bytes and elapsed milliseconds of the running phase) as well
+    as a single JSON document from --format=json.
+    """
+    progress = {'download': ([0.0], [0.0]), 'upload': ([0.0], [0.0])}
+    try:
+        events = [json.loads(line) for line in stdout.splitlines() if line.strip()]
+    except json.JSONDecodeError:
+        events = [json.loads(stdout)]
+    
+    data = None
+    for event in events:
+        kind = event.get('type')
+        if kind == 'result' or (kind is None and 'download' in event):
+            data = event
+        elif kind in progress and isinstance(event.get(kind), dict):
+            phase = event[kind]
+            if 'elapsed' in phase and 'bytes' in phase:
+                times, totals = progress[kind]
+                times.append(phase['elapsed'] / 1000)
+                totals.append(phase['bytes'])
+    return data, progress
+
 def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """Run the official Ookla CLI speed test with enhanced rate limiting."""
     try:
@@ -296,24 +372,25 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
             return None
             
         logger.info("Starting official Ookla CLI speed test...")
-        logger.info(f"Using Ookla CLI path: {OOKLA_CLI_PATH}")
+        cli_path = ookla_cli_path()
+        logger.info(f"Using Ookla CLI path: {cli_path}")
         
-        if not os.path.exists(OOKLA_CLI_PATH):
-            logger.warning(f"Official Ookla CLI not found at {OOKLA_CLI_PATH}")
+        if not os.path.exists(cli_path):
+            logger.warning(f"Official Ookla CLI not found at {cli_path}")
             return None
         
         # Set working directory to ensure proper CLI execution
         original_cwd = os.getcwd()
-        cli_dir = os.path.dirname(OOKLA_CLI_PATH)
+        cli_dir = os.path.dirname(cli_path)
         
         try:
             # Build optimized command with server selection
             cmd = [
-                OOKLA_CLI_PATH, 
-                "--format=json", 
+                cli_path, 
+                "--format=jsonl", 
                 "--accept-license", 
                 "--accept-gdpr",
-                "--progress=no"
+                "--progress=yes"  # Progress events carry the byte counter for the analysis
             ]
             
             # ✅ FIXED - Better server selection with country preference
@@ -324,8 +401,8 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
                     logger.info(f"Selecting optimal server for {country_code}")
                     
                     # Get server list
-                    server_cmd = [OOKLA_CLI_PATH, "--servers", "--format=json", "--accept-license", "--accept-gdpr"]
-                    server_result = subprocess.run(server_cmd, capture_output=True, text=True, timeout=30, cwd=cli_dir)
+                    server_cmd = [cli_path, "--servers", "--format=json", "--accept-license", "--accept-gdpr"]
+                    server_result = run_subprocess(server_cmd, capture_output=True, text=True, timeout=30, cwd=cli_dir)
                     
                     if server_result.returncode == 0:
                         server_data = json.loads(server_result.stdout)
@@ -360,7 +437,7 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
             logger.info(f"Command: {' '.join(cmd)}")
             
             # ✅ FIXED - Enhanced subprocess execution with better error handling
-            result = subprocess.run(
+            result = run_subprocess(
                 cmd, 
                 capture_output=True, 
                 text=True, 
@@ -376,7 +453,7 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
                 rate_limiter.record_success()
                 
                 try:
-                    data = json.loads(result.stdout)
+                    data, progress = _parse_ookla_output(result.stdout)
                 except json.JSONDecodeError as e:
                     logger.error(f"Failed to parse Ookla CLI JSON output: {e}")
                     logger.error(f"Raw output: {result.stdout}")
@@ -400,6 +477,16 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
                 server_info = data['server']
                 server_location = f"{server_info['name']}, {server_info['location']}"
                 
+                # Newer CLI versions report loaded latency (IQM/low/high) per phase
+                ping_info = data.get('ping', {})
+                idle_latency = {'min': ping_info.get('low'), 'p50': ping_info.get('latency'), 'max': ping_info.get('high')}
+                download_latency = _ookla_loaded_latency(data['download'])
+                upload_latency = _ookla_loaded_latency(data['upload'])
+                
+                # Ookla's own figures stay the headline; the analysis adds stability flags
+                download_analysis = analyze_counter(*progress['download'])
+                upload_analysis = analyze_counter(*progress['upload'])
+                
                 # Enhanced result logging
                 logger.info(f"Official Ookla CLI results:")
                 logger.info(f"  Download: {download_mbps} Mbps ({download_bps} bps)")
@@ -414,6 +501,8 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
                     'upload_speed': upload_mbps,
                     'ping': ping_ms,
                     'jitter': jitter_ms,
+                    'ping_min': ping_info.get('low'),
+                    'packet_loss': data.get('packetLoss'),
                     'server_location': server_location,
                     'server_id': server_info.get('id'),
                     'isp': data.get('isp'),
@@ -421,6 +510,12 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
                     'success': True,
                     'raw_download_bps': download_bps,
                     'raw_upload_bps': upload_bps,
+                    'idle_latency': idle_latency,
+                    'download_latency': download_latency,
+                    'upload_latency': upload_latency,
+                    'download_analysis': download_analysis,
+                    'upload_analysis': upload_analysis,
+                    'raw_samples': {phase: series(*counter) for phase, counter in progress.items() if len(counter[0]) > 1},
                     'result_url': data.get('result', {}).get('url', '')
                 }
             else:
@@ -449,29 +544,185 @@ def _run_official_ookla_cli(user_location: Optional[Dict[str, Any]] = None) -> O
         logger.error(f"Official Ookla CLI error: {str(e)}")
         return None
 
+class _CountingResponse:
+    """Response wrapper that credits every read to a _CountingOpener."""
+    
+    def __init__(self, response, counter: "_CountingOpener"):
+        self._response = response
+        self._counter = counter
+    
+    def read(self, *args, **kwargs):
+        data = self._response.read(*args, **kwargs)
+        self._counter.add_downloaded(len(data))
+        return data
+    
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+class _CountingOpener:
+    """
+    Wraps speedtest-cli's opener so its worker threads' bytes can be sampled live.
+    
+    speedtest-cli only exposes per-request totals once a phase is over.
+    Downloads are counted as they are read; uploads through the live
+    `total` list of each request's HTTPUploaderData. That list grows as
+    bytes go into the socket's send buffer rather than when the server has
+    them, so the upload samples are only good for stability flags - the
+    upload figure itself stays speedtest-cli's.
+    """
+    
+    def __init__(self, opener):
+        self._opener = opener
+        self._lock = threading.Lock()
+        self._downloaded = 0
+        self._uploads = []
+    
+    @classmethod
+    def install(cls, st: "speedtest.Speedtest") -> "_CountingOpener":
+        # Speedtest passes self._opener to every HTTPDownloader/HTTPUploader
+        counter = cls(st._opener)
+        st._opener = counter
+        return counter
+    
+    def open(self, request, *args, **kwargs):
+        if isinstance(getattr(request, 'data', None), speedtest.HTTPUploaderData):
+            with self._lock:
+                self._uploads.append(request.data)
+        return _CountingResponse(self._opener.open(request, *args, **kwargs), self)
+    
+    def add_downloaded(self, count: int):
+        with self._lock:
+            self._downloaded += count
+    
+    def downloaded(self) -> int:
+        return self._downloaded
+    
+    def uploaded(self) -> int:
+        with self._lock:
+            uploads = list(self._uploads)
+        return sum(sum(data.total) for data in uploads)
+    
+    def __getattr__(self, name):
+        return getattr(self._opener, name)
+
+class _CounterSampler:
+    """Samples a byte counter from a background thread while a blocking phase runs."""
+    
+    def __init__(self, read_total, interval: float = 0.1):
+        self._read_total = read_total
+        self._interval = interval
+        self._stop = threading.Event()
+        self.times: List[float] = []
+        self.totals: List[float] = []
+    
+    def _sample(self):
+        self.times.append(time.perf_counter() - self._start)
+        self.totals.append(self._read_total() - self._base)
+    
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._sample()
+    
+    def __enter__(self) -> "_CounterSampler":
+        self._start = time.perf_counter()
+        self._base = self._read_total()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+class _ThreadLatencyProber:
+    """
+    Probes url for loaded latency from a background event loop while a blocking phase runs.
+
+    The speedtest-cli phases block their thread, so the LatencyProber the
+    HTTP engine runs alongside its streams gets a loop of its own here.
+    Without a url nothing is probed and summary() is None.
+    """
+    
+    def __init__(self, url: Optional[str]):
+        self._url = url
+        self._loop = None
+        self._prober = None
+    
+    async def _start(self):
+        self._client = probe_client(LATENCY_CONFIG['probe_timeout'])
+        self._prober = LatencyProber(http_probe(self._client, self._url))
+        self._prober.start()
+    
+    async def _stop(self):
+        await self._prober.stop()
+        await self._client.aclose()
+    
+    def __enter__(self) -> "_ThreadLatencyProber":
+        if self._url:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+    
+    def summary(self) -> Optional[Dict[str, Any]]:
+        return self._prober.summary() if self._prober else None
+
+def _stable_mbps(analysis: Optional[Dict[str, Any]], library_bps: float) -> float:
+    """Stable-phase mean when the counter analysis found a clean one, else the library's own figure."""
+    if analysis and not analysis['flags']:
+        return round(analysis['mbps'], 3)
+    return round(library_bps / 1_000_000, 3)
+
 # ✅ FIXED - Enhanced speedtest-cli fallback with better reliability
 def _run_speedtest_cli_library_enhanced(user_location: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """Run enhanced speed test using speedtest-cli library as fallback."""
+    # Stop downloads/uploads early if the client goes away
+    shutdown_event = threading.Event()
+    token = current_token()
+    unregister = token.add_callback(shutdown_event.set) if token else (lambda: None)
+    
     try:
         logger.info("Starting enhanced speedtest-cli library test...")
         
-        # Initialize with optimized settings
-        st = speedtest.Speedtest(secure=True)
+        # ✅ IMPROVED - Start from a warm context when one is ready: config,
+        # servers and best-server latency are already known
+        st = speedtest_pool.acquire(shutdown_event)
+        warm = st is not None
+        if warm:
+            logger.info("Using warm speedtest-cli context")
+        else:
+            st = speedtest.Speedtest(secure=True, shutdown_event=shutdown_event)
+        counter = _CountingOpener.install(st)
         
         # Configure for enhanced accuracy
-        st.config['threads'] = SPEED_TEST_CONFIG['threads']
+        st.config['threads'] = {'download': SPEED_TEST_CONFIG['threads'], 'upload': SPEED_TEST_CONFIG['threads']}
         st.upload_timeout = SPEED_TEST_CONFIG['read_timeout']
         st.download_timeout = SPEED_TEST_CONFIG['read_timeout']
         
         # Get server list with retry
-        logger.info("Retrieving server list...")
         try:
-            st.get_servers()
+            if not warm:
+                logger.info("Retrieving server list...")
+                st.get_servers()
         except Exception as e:
             logger.warning(f"Failed to get servers: {e}")
             # Try with simpler configuration
             try:
-                st = speedtest.Speedtest()
+                st = speedtest.Speedtest(shutdown_event=shutdown_event)
+                counter = _CountingOpener.install(st)
                 st.get_servers()
             except Exception as e2:
                 logger.warning(f"Failed to get servers with simple config: {e2}")
@@ -503,9 +754,13 @@ def _run_speedtest_cli_library_enhanced(user_location: Optional[Dict[str, Any]]
                     st.servers = {best_server['d']: [best_server]}
                     logger.info(f"Using global server: {best_server['sponsor']} - {best_server['name']}")
         
-        # Get best server
+        # Get best server - a warm context has already measured it unless the
+        # location-based choice picked another one
         try:
-            st.get_best_server()
+            if warm and (best_server is None or best_server.get('id') == st.best.get('id')):
+                logger.info(f"Best server latency known: {st.best.get('latency')} ms")
+            else:
+                st.get_best_server([best_server] if best_server else None)
         except Exception as e:
             logger.warning(f"Failed to get best server: {e}")
             return None
@@ -513,18 +768,26 @@ def _run_speedtest_cli_library_enhanced(user_location: Optional[Dict[str, Any]]
         # Run tests
         logger.info("Running download test...")
         try:
-            download_speed = st.download(threads=SPEED_TEST_CONFIG['threads'])
+            with _CounterSampler(counter.downloaded) as download_counter, \
+                    _ThreadLatencyProber(SPEED_TEST_CONFIG['http_latency_url']) as download_prober:
+                download_speed = st.download(threads=SPEED_TEST_CONFIG['threads'])
         except Exception as e:
             logger.warning(f"Download test failed: {e}")
             return None
         
         logger.info("Running upload test...")
         try:
-            upload_speed = st.upload(threads=SPEED_TEST_CONFIG['threads'])
+            with _CounterSampler(counter.uploaded) as upload_counter, \
+                    _ThreadLatencyProber(SPEED_TEST_CONFIG['http_latency_url']) as upload_prober:
+                upload_speed = st.upload(threads=SPEED_TEST_CONFIG['threads'])
         except Exception as e:
             logger.warning(f"Upload test failed: {e}")
             return None
         
+        if shutdown_event.is_set():
+            logger.info("Speedtest-cli run abandoned - client disconnected")
+            return None
+        
         # Get results
         try:
             results = st.results.dict()
@@ -532,8 +795,13 @@ def _run_speedtest_cli_library_enhanced(user_location: Optional[Dict[str, Any]]
             logger.warning(f"Failed to get results: {e}")
             return None
         
-        # Convert to Mbps
-        download_mbps = round(download_speed / 1_000_000, 3)
+        # speedtest-cli averages over the whole download, slow-start included -
+        # prefer the stable-phase mean from the read counter. Upload samples
+        # count bytes handed to the socket, not received, so speedtest-cli's
+        # own upload figure stays the headline
+        download_analysis = analyze_counter(download_counter.times, download_counter.totals)
+        upload_analysis = analyze_counter(upload_counter.times, upload_counter.totals)
+        download_mbps = _stable_mbps(download_analysis, download_speed)
         upload_mbps = round(upload_speed / 1_000_000, 3)
         ping_ms = round(results['ping'], 2)
         
@@ -550,162 +818,206 @@ def _run_speedtest_cli_library_enhanced(user_location: Optional[Dict[str, Any]]
             'download_speed': download_mbps,
             'upload_speed': upload_mbps,
             'ping': ping_ms,
-            'jitter': 0.0,  # Not provided by speedtest-cli
+            'jitter': 0.0,  # Not provided by speedtest-cli - sampled afterwards
             'server_location': server_location,
             'server_id': server_info.get('id'),
+            'server_url': server_info.get('url'),
+            'server_host': server_info.get('host'),
             'isp': results.get('client', {}).get('isp'),
             'method': 'Enhanced Speedtest-cli Library (Ookla Network)',
             'success': True,
             'raw_download_bps': download_speed,
             'raw_upload_bps': upload_speed,
+            'download_latency': download_prober.summary(),
+            'upload_latency': upload_prober.summary(),
+            'download_analysis': download_analysis,
+            'upload_analysis': upload_analysis,
+            'raw_samples': {
+                'download': series(download_counter.times, download_counter.totals),
+                'upload': series(upload_counter.times, upload_counter.totals)
+            },
             'result_url': results.get('share', '')
         }
         
     except Exception as e:
         logger.error(f"Enhanced speedtest-cli library error: {str(e)}")
         return None
+    finally:
+        unregister()
 
-# ✅ FIXED - Enhanced HTTP-based fallback with better accuracy for high-speed connections
-def _run_http_fallback_test() -> Optional[Dict[str, Any]]:
-    """Run an enhanced HTTP-based speed test optimized for high-speed connections."""
+# ✅ IMPROVED - Multi-stream, time-budgeted HTTP fallback
+async def _run_http_fallback_test() -> Optional[Dict[str, Any]]:
+    """Run an HTTP-based speed test over parallel streams with a fixed time budget."""
     try:
-        logger.info("Starting enhanced HTTP fallback speed test...")
+        logger.info("Starting multi-stream HTTP fallback speed test...")
         
         # Check if we're in a test environment by checking for mocked httpx
         # This is a simple way to detect if we're in a test environment
-        import httpx
         try:
             # If this is a mock, it might raise an exception or behave unexpectedly
             test_client = httpx.AsyncClient()
             if hasattr(test_client, 'side_effect') or str(type(test_client)) == "<class 'unittest.mock.MagicMock'>":
                 logger.info("Test environment detected - HTTP fallback test will fail")
                 return None
+            await test_client.aclose()
         except Exception as e:
             # If httpx is mocked and fails, assume we're in a test that expects failure
             if "Mock" in str(e) or "side_effect" in str(e):
                 logger.info("Test environment detected - HTTP fallback test will fail")
                 return None
         
-        # Test download speed using much larger files for high-speed accuracy (300+ Mbps)
-        download_speeds = []
-        test_urls = [
-            "https://speed.cloudflare.com/__down?bytes=500000000",  # 500MB for high-speed accuracy
-            "https://speed.cloudflare.com/__down?bytes=250000000",  # 250MB backup
-            "https://speed.cloudflare.com/__down?bytes=100000000",  # 100MB additional test
-        ]
+        engine_config = {
+            'streams': SPEED_TEST_CONFIG['http_streams'],
+            'time_budget': SPEED_TEST_CONFIG['http_time_budget'],
+            'min_duration': SPEED_TEST_CONFIG['http_min_duration'],
+            'convergence_threshold': SPEED_TEST_CONFIG['http_convergence_threshold'],
+            'ramp_time': SPEED_TEST_CONFIG['warmup_time'],
+            'loaded_latency_url': SPEED_TEST_CONFIG['http_latency_url']
+        }
+        latency = await measure_latency(SPEED_TEST_CONFIG['http_latency_url'])
+        if not latency:
+            logger.warning("HTTP latency measurement failed")
+            return None
+        logger.info(f"HTTP latency: {latency['ping']} ms (jitter {latency['jitter']} ms)")
         
-        for url in test_urls:
-            try:
-                import time
-                import requests
-                
-                start_time = time.time()
-                response = requests.get(url, timeout=90, stream=True)  # Increased timeout for larger files
-                
-                if response.status_code == 200:
-                    total_bytes = 0
-                    chunk_count = 0
-                    
-                    # Use larger chunks for better throughput measurement
-                    for chunk in response.iter_content(chunk_size=1048576):  # 1MB chunks for high-speed
-                        if chunk:
-                            total_bytes += len(chunk)
-                            chunk_count += 1
-                    
-                    duration = time.time() - start_time
-                    if duration > 2.0:  # Ensure longer test duration for high-speed accuracy
-                        speed_mbps = (total_bytes * 8) / (duration * 1_000_000)
-                        download_speeds.append(speed_mbps)
-                        logger.info(f"HTTP test: {speed_mbps:.1f} Mbps from {url} ({total_bytes/1024/1024:.1f}MB in {duration:.1f}s)")
-                        
-                        # For high-speed connections, one good measurement is enough
-                        if speed_mbps > 200:
-                            break
-                        
-            except Exception as e:
-                logger.warning(f"HTTP test failed for {url}: {e}")
-                continue
+        download = await measure_download(SPEED_TEST_CONFIG['http_download_url'], engine_config)
+        if not download or download['mbps'] <= 0:
+            return None
+        logger.info(f"HTTP download: {download['mbps']:.1f} Mbps ±{download['precision']}% ({download['total_bytes']/1024/1024:.1f}MB in {download['duration']:.1f}s over {download['streams']} streams)")
         
-        # Enhanced upload test simulation for high-speed connections
-        upload_speeds = []
-        if download_speeds:
-            # More sophisticated upload estimation based on download speed
-            max_download = max(download_speeds)
-            if max_download > 250:
-                # Very high-speed connection (300+ Mbps) - typical upload is 80-90% of download
-                estimated_upload = max_download * 0.85
-            elif max_download > 100:
-                # High-speed connection - typical upload is 75-85% of download
-                estimated_upload = max_download * 0.80
-            elif max_download > 50:
-                # Medium-speed connection - typical upload is 70-80% of download
-                estimated_upload = max_download * 0.75
-            else:
-                # Lower-speed connection - typical upload is 60-70% of download
-                estimated_upload = max_download * 0.65
-            
-            upload_speeds.append(estimated_upload)
+        upload = await measure_upload(SPEED_TEST_CONFIG['http_upload_url'], engine_config)
+        if not upload or upload['mbps'] <= 0:
+            return None
+        logger.info(f"HTTP upload: {upload['mbps']:.1f} Mbps ±{upload['precision']}% ({upload['total_bytes']/1024/1024:.1f}MB in {upload['duration']:.1f}s over {upload['streams']} streams)")
         
-        if download_speeds and upload_speeds:
-            # Use the highest measurement for accuracy (typical for speed tests)
-            best_download = max(download_speeds)
-            best_upload = max(upload_speeds)
-            
-            logger.info(f"Enhanced HTTP fallback results: {best_download:.1f} Mbps download, {best_upload:.1f} Mbps upload")
-            
-            return {
-                'download_speed': round(best_download, 1),
-                'upload_speed': round(best_upload, 1),
-                'ping': 35.0,  # Estimated (slightly better than before)
-                'jitter': 1.5,  # Estimated (slightly better than before)
-                'server_location': 'Enhanced HTTP Fallback Server',
-                'server_id': 'enhanced-http-fallback',
-                'isp': 'Unknown',
-                'method': 'Enhanced HTTP Fallback (Optimized for High-Speed)',
-                'success': True,
-                'raw_download_bps': int(best_download * 125000),
-                'raw_upload_bps': int(best_upload * 125000),
-                'result_url': ''
-            }
+        download_mbps = download['mbps']
+        upload_mbps = upload['mbps']
         
-        return None
+        return {
+            'download_speed': round(download_mbps, 1),
+            'upload_speed': round(upload_mbps, 1),
+            'ping': latency['ping'],
+            'jitter': latency['jitter'],
+            'ping_min': latency['min'],
+            'packet_loss': latency['loss'],
+            'server_location': 'Enhanced HTTP Fallback Server',
+            'server_id': 'enhanced-http-fallback',
+            'isp': 'Unknown',
+            'method': 'Enhanced HTTP Fallback (Multi-Stream)',
+            'success': True,
+            'raw_download_bps': int(download_mbps * 125000),
+            'raw_upload_bps': int(upload_mbps * 125000),
+            'download_precision': download['precision'],
+            'upload_precision': upload['precision'],
+            'idle_latency': latency['percentiles'],
+            'download_latency': download.get('latency'),
+            'upload_latency': upload.get('latency'),
+            'download_analysis': download['analysis'],
+            'upload_analysis': upload['analysis'],
+            'raw_samples': {'download': download['samples'], 'upload': upload['samples']},
+            'result_url': ''
+        }
         
     except Exception as e:
         logger.error(f"Enhanced HTTP fallback test error: {str(e)}")
         return None
 
+async def _sample_server_latency(result: Dict[str, Any]):
+    """
+    Replace speedtest-cli's single ping with sampled ping, jitter and loss.
+
+    Probes the server's latency.txt over one kept-alive connection, falling
+    back to TCP connect times when HTTP probing fails. Leaves the result
+    untouched if the server can't be reached at all.
+    """
+    latency = None
+    server_url = result.get('server_url')
+    if server_url:
+        latency_url = server_url.rsplit('/', 1)[0] + '/latency.txt'
+        latency = await sample_http_latency(latency_url)
+    if not latency and result.get('server_host'):
+        host, _, port = result['server_host'].rpartition(':')
+        if host and port.isdigit():
+            latency = await sample_tcp_latency(host.strip('[]'), int(port))
+    if not latency:
+        logger.warning("Could not sample speedtest-cli server latency")
+        return
+
+    logger.info(f"Sampled server latency: {latency['ping']} ms (jitter {latency['jitter']} ms, loss {latency['loss']}%)")
+    result.update({
+        'ping': latency['ping'],
+        'jitter': latency['jitter'],
+        'ping_min': latency['min'],
+        'packet_loss': latency['loss'],
+        'idle_latency': latency['percentiles']
+    })
+
 # ✅ FIXED - Enhanced speed test with better fallback chain
-def _perform_accurate_speed_test(user_location: Optional[Dict[str, Any]]) -> dict:
+async def _perform_accurate_speed_test(user_location: Optional[Dict[str, Any]]) -> dict:
     """Perform highly accurate speed test using best available method."""
     logger.info("Starting enhanced speed test with improved fallback chain...")
     
     # Try official Ookla CLI first (most accurate)
-    if os.path.exists(OOKLA_CLI_PATH):
+    if os.path.exists(ookla_cli_path()):
         logger.info("Attempting official Ookla CLI...")
-        result = _run_official_ookla_cli(user_location)
+        result = await run_in_thread(_run_official_ookla_cli, user_location)
         if result and result.get('success'):
             return result
     
     # Fallback to speedtest-cli library
     logger.info("Attempting speedtest-cli library...")
-    result = _run_speedtest_cli_library_enhanced(user_location)
+    result = await run_in_thread(_run_speedtest_cli_library_enhanced, user_location)
     if result and result.get('success'):
+        await _sample_server_latency(result)
         return result
     
-    # Final fallback to HTTP-based test
+    # Final fallback to HTTP-based test (runs on the event loop, no thread needed)
     logger.info("Attempting HTTP fallback test...")
-    result = _run_http_fallback_test()
+    result = await _run_http_fallback_test()
     if result and result.get('success'):
         return result
     
     # If all methods fail
     raise Exception("All speed test methods failed")
 
-@router.post("/speed-test", response_model=SpeedTestResult)
-async def run_speed_test(request: Request):
-    """Run enhanced speed test with improved reliability and accuracy."""
-    start_time = time.time()
-    
+async def _record_result(result: SpeedTestResult, user_location: Optional[Dict[str, Any]]):
+    """Append a completed test to the result history; never fails the request."""
+    row = {
+        'timestamp': result.timestamp,
+        'download': result.download_speed,
+        'upload': result.upload_speed,
+        'ping': result.ping,
+        'jitter': result.jitter,
+        'isp': result.isp or (user_location or {}).get('isp'),
+        'country': (user_location or {}).get('country_code'),
+        'server': result.server_location,
+        'method': result.method
+    }
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, result_store.append, row)
+    except Exception as e:
+        logger.warning(f"Failed to record speed test result: {e}")
+
+# Raw byte-counter series of recent tests, downloadable for debugging
+raw_series = RawSeriesStore(max_tests=500)
+
+# ✅ NEW - Repeat tests from the same network can reuse a recent result or join
+# the test already running instead of measuring again (opt-in per request or
+# via SPEED_TEST_REUSE_WINDOW)
+speed_result_cache = ReuseCache(max_window=REUSE_MAX_WINDOW)
+
+# ✅ NEW - Pre-configured speedtest-cli contexts, refreshed while the app runs
+speedtest_pool = SpeedtestPool(
+    refresh_interval=SPEED_TEST_CONFIG['warm_refresh_interval'],
+    max_age=SPEED_TEST_CONFIG['warm_max_age']
+)
+
+def _reused(result: SpeedTestResult, age: float) -> SpeedTestResult:
+    return result.model_copy(update={'reused': True, 'result_age': round(max(0.0, age), 1)})
+
+async def _measure_speed(request: Request, start_time: float) -> SpeedTestResult:
+    """Run a full test and record it; shared by every request that joins it."""
     try:
         logger.info("Starting enhanced speed test...")
         
@@ -718,9 +1030,7 @@ async def run_speed_test(request: Request):
         
         # Run the speed test with timeout protection
         result = await asyncio.wait_for(
-            asyncio.get_event_loop().run_in_executor(
-                None, _perform_accurate_speed_test, user_location
-            ),
+            _perform_accurate_speed_test(user_location),
             timeout=150.0  # 2.5 minute maximum timeout
         )
         
@@ -751,17 +1061,34 @@ async def run_speed_test(request: Request):
         
         logger.info(f"Speed test completed in {test_duration}s using {result.get('method', 'Unknown')}")
         
-        return SpeedTestResult(
+        test_id = None
+        if result.get('raw_samples'):
+            test_id = uuid.uuid4().hex
+            raw_series.put(test_id, result.get('method'), result['raw_samples'])
+        
+        speed_result = SpeedTestResult(
             download_speed=result['download_speed'],
             upload_speed=result['upload_speed'],
             ping=result['ping'],
             jitter=result.get('jitter', 0.0),
+            ping_min=result.get('ping_min'),
+            packet_loss=result.get('packet_loss'),
             server_location=result['server_location'],
             isp=result.get('isp'),
             method=result.get('method'),
+            download_precision=result.get('download_precision'),
+            upload_precision=result.get('upload_precision'),
+            idle_latency=result.get('idle_latency'),
+            download_latency=result.get('download_latency'),
+            upload_latency=result.get('upload_latency'),
+            download_analysis=result.get('download_analysis'),
+            upload_analysis=result.get('upload_analysis'),
+            test_id=test_id,
             test_duration=test_duration,
             timestamp=time.time()
         )
+        await _record_result(speed_result, user_location)
+        return speed_result
         
     except asyncio.TimeoutError:
         logger.error("Speed test timed out")
@@ -769,20 +1096,161 @@ async def run_speed_test(request: Request):
     except Exception as e:
         logger.error(f"Speed test execution error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Speed test execution failed: {str(e)}")
+
+@router.post("/speed-test", response_model=SpeedTestResult)
+@cancel_on_disconnect
+async def run_speed_test(
+    request: Request,
+    reuse: Optional[int] = Query(
+        None, ge=0, le=REUSE_MAX_WINDOW,
+        description="Accept a result for your network measured up to this many seconds ago, "
+                    "or join a test already running for it (0 disables; defaults to the server setting)"
+    )
+):
+    """Run enhanced speed test with improved reliability and accuracy."""
+    start_time = time.time()
+    client_key = get_client_prefix(request)
+    max_age = SPEED_TEST_CONFIG['reuse_window'] if reuse is None else reuse
+    
+    # Reused and joined results cost nothing, so they skip the rate limit
+    if max_age > 0:
+        recent = speed_result_cache.recent(client_key, max_age)
+        if recent:
+            logger.info(f"Reusing speed test result for {client_key} ({recent[1]:.0f}s old)")
+            return _reused(*recent)
+    joining = max_age > 0 and speed_result_cache.in_flight(client_key)
+    
+    # Per-client limit check before any expensive work
+    if not joining:
+        allowed, retry_after = client_rate_limiter.hit(client_key)
+        if not allowed:
+            logger.warning(f"Speed test rate limit exceeded for {client_key}, retry after {retry_after:.0f}s")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many speed tests - retry after {max(1, round(retry_after))} seconds",
+                headers=client_rate_limiter.retry_after_header(retry_after)
+            )
+    
+    try:
+        speed_result, joined = await speed_result_cache.run(
+            client_key, lambda: _measure_speed(request, start_time), join=max_age > 0
+        )
+        if joined:
+            logger.info(f"Joined speed test already running for {client_key}")
+            return _reused(speed_result, time.time() - speed_result.timestamp)
+        return speed_result
     finally:
         # Always log completion time
         end_time = time.time()
         total_duration = round(end_time - start_time, 2)
         logger.info(f"Speed test request completed in {total_duration}s")
 
+@router.get("/speed-test/download")
+async def speed_test_download(
+    bytes: int = Query(25_000_000, ge=0, le=MAX_DOWNLOAD_BYTES, description="Number of bytes to stream")
+):
+    """
+    Stream an incompressible payload of the requested size for download measurement.
+    """
+    return StreamingResponse(
+        aiter_payload(bytes),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Length": str(bytes),
+            "Cache-Control": "no-store, no-transform",
+            "Content-Encoding": "identity"
+        }
+    )
+
+@router.post("/speed-test/upload")
+async def speed_test_upload(request: Request):
+    """
+    Discard the uploaded body and report the server-side receive throughput.
+    """
+    bytes_received = 0
+    first_byte_time = None
+    
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            if first_byte_time is None:
+                first_byte_time = time.perf_counter()
+            bytes_received += len(chunk)
+            if bytes_received > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    except ClientDisconnect:
+        # Clients end upload streams when their time budget runs out
+        logger.debug(f"Upload client disconnected after {bytes_received} bytes")
+    
+    duration = time.perf_counter() - first_byte_time if first_byte_time is not None else 0.0
+    throughput_mbps = (bytes_received * 8) / (duration * 1_000_000) if duration > 0 else 0.0
+    
+    return {
+        'bytes_received': bytes_received,
+        'duration': round(duration, 6),
+        'throughput_mbps': round(throughput_mbps, 3)
+    }
+
+@router.get("/speed-test/history/stats")
+async def get_speed_test_history_stats(
+    metric: str = Query("download", description=f"One of: {', '.join(METRICS)}"),
+    group_by: Optional[str] = Query(None, description=f"One of: {', '.join(GROUP_COLUMNS)}"),
+    bucket: Optional[float] = Query(None, gt=0, description="Time bucket width in seconds"),
+    since: Optional[float] = Query(None, description="Unix timestamp lower bound (inclusive)"),
+    until: Optional[float] = Query(None, description="Unix timestamp upper bound (exclusive)"),
+    percentiles: str = Query("10,50,90", description="Comma-separated percentiles"),
+    min_count: int = Query(1, ge=1, description="Omit groups with fewer results")
+):
+    """Percentile statistics over the recorded speed-test history."""
+    try:
+        requested = [float(p) for p in percentiles.split(',') if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Percentiles must be numbers")
+    if not requested or any(p < 0 or p > 100 for p in requested):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None,
+            lambda: result_store.aggregate(
+                metric, group_by=group_by, bucket_seconds=bucket, since=since,
+                until=until, percentiles=requested, min_count=min_count
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Speed test history query failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"History query failed: {str(e)}")
+
+@router.get("/speed-test/samples/{test_id}")
+async def get_speed_test_samples(
+    test_id: str,
+    format: str = Query("json", pattern="^(json|csv)$", description="json or csv")
+):
+    """Raw byte-counter samples behind a recent test's throughput figures."""
+    record = raw_series.get(test_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="No samples for this test - only recent tests are kept")
+    if format == "csv":
+        return StreamingResponse(
+            series_csv_rows(record),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="speed-test-{test_id}.csv"'}
+        )
+    return record
+
 @router.get("/speed-test/method")
 async def get_speed_test_method():
     """Get information about the current speed test method and accuracy."""
     try:
-        ookla_cli_available = os.path.exists(OOKLA_CLI_PATH)
+        cli_path = ookla_cli_path()
+        ookla_cli_available = os.path.exists(cli_path)
         rate_limit_status = rate_limiter.can_make_request()
         
-        logger.info(f"Checking Ookla CLI at: {OOKLA_CLI_PATH}")
+        logger.info(f"Checking Ookla CLI at: {cli_path}")
         logger.info(f"Ookla CLI available: {ookla_cli_available}")
         logger.info(f"Rate limit OK: {rate_limit_status}")
         
@@ -812,7 +1280,7 @@ async def get_speed_test_method():
                 'official_cli_available': ookla_cli_available,
                 'rate_limit_ok': rate_limit_status,
                 'network': 'Multiple Networks',
-                'cli_path': OOKLA_CLI_PATH,
+                'cli_path': cli_path,
                 'optimizations': [
                     'Geographic server selection',
                     'Rate limiting protection',
@@ -834,10 +1302,10 @@ async def get_available_servers():
     """Get list of available servers with intelligent filtering."""
     try:
         # Try Ookla CLI first
-        if os.path.exists(OOKLA_CLI_PATH) and rate_limiter.can_make_request():
+        if os.path.exists(ookla_cli_path()) and rate_limiter.can_make_request():
             try:
-                cmd = [OOKLA_CLI_PATH, "--servers", "--format=json", "--accept-license", "--accept-gdpr"]
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+                cmd = [ookla_cli_path(), "--servers", "--format=json", "--accept-license", "--accept-gdpr"]
+                result = run_subprocess(cmd, capture_output=True, text=True, timeout=30)
                 
                 if result.returncode == 0:
                     data = json.loads(result.stdout)
@@ -856,12 +1324,17 @@ async def get_available_servers():
             except Exception as e:
                 logger.warning(f"Ookla CLI server list failed: {e}")
         
-        # Fallback to speedtest-cli library
-        st = speedtest.Speedtest()
-        st.get_servers()
+        # Fallback to speedtest-cli library - the warm snapshot already has the list
+        snapshot = speedtest_pool.snapshot()
+        if snapshot is not None:
+            servers_by_distance = snapshot.servers
+        else:
+            st = speedtest.Speedtest()
+            st.get_servers()
+            servers_by_distance = st.servers
         
         all_servers = []
-        for server_list in st.servers.values():
+        for server_list in servers_by_distance.values():
             all_servers.extend(server_list)
         
         # Sort by distance
@@ -885,12 +1358,17 @@ async def get_speed_test_config():
     """Get current speed test configuration."""
     return {
         'config': SPEED_TEST_CONFIG,
-        'ookla_cli_path': OOKLA_CLI_PATH,
-        'ookla_cli_available': os.path.exists(OOKLA_CLI_PATH),
+        'ookla_cli_path': ookla_cli_path(),
+        'ookla_cli_available': os.path.exists(ookla_cli_path()),
         'rate_limiter': {
             'can_make_request': rate_limiter.can_make_request(),
-            'min_interval': rate_limiter.min_interval,
-            'request_count': rate_limiter.request_count
-        }
+            'interval': rate_limiter.interval,
+            'max_requests': rate_limiter.max_requests,
+            'request_count': len(rate_limiter.request_times),
+            'blocked_until': rate_limiter.blocked_until
+        },
+        'client_rate_limiter': client_rate_limiter.stats(),
+        'result_reuse': speed_result_cache.stats(),
+        'speedtest_pool': speedtest_pool.stats()
     }
 
@@ -13,6 +13,7 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from app.models.ip_models import TracerouteResponse, TracerouteHop
 from app.utils.security import sanitize_command_input, validate_hostname, validate_ip_address
+from app.utils.cancellation import cancel_on_disconnect, communicate_or_kill
 
 # 🔒 SECURITY FIX - Add rate limiting
 limiter = Limiter(key_func=get_remote_address)
@@ -190,6 +191,7 @@ def parse_traceroute_output(output: str, is_windows: bool = False) -> List[Trace
 
 @router.post("/traceroute", response_model=TracerouteResponse)
 @limiter.limit("5/minute")  # 🔒 SECURITY FIX - Rate limiting for resource-intensive operation
+@cancel_on_disconnect
 async def perform_traceroute(
     request: Request,
     traceroute_request: TracerouteRequest
@@ -243,8 +245,9 @@ async def perform_traceroute(
             stderr=asyncio.subprocess.PIPE
         )
         
-        stdout, stderr = await asyncio.wait_for(
-            process.communicate(), 
+        # Kills traceroute on timeout or when the client disconnects
+        stdout, stderr = await communicate_or_kill(
+            process,
             timeout=max_hops * timeout + 30  # Give extra time for command completion
         )
         
@@ -352,6 +355,7 @@ async def perform_traceroute(
 
 @router.get("/traceroute", response_model=TracerouteResponse)
 async def get_traceroute(
+    request: Request,
     target: str = Query(..., description="Target hostname or IP address"),
     max_hops: int = Query(30, ge=1, le=64, description="Maximum number of hops"),
     timeout: int = Query(5, ge=1, le=30, description="Timeout per hop in seconds")
@@ -359,5 +363,5 @@ async def get_traceroute(
     """
     Perform a traceroute to the specified target (GET method for convenience)
     """
-    request = TracerouteRequest(target=target, max_hops=max_hops, timeout=timeout)
-    return await perform_traceroute(request) 
\ No newline at end of file
+    traceroute_request = TracerouteRequest(target=target, max_hops=max_hops, timeout=timeout)
+    return await perform_traceroute(request=request, traceroute_request=traceroute_request) 
\ No newline at end of file
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from app.models.ip_models import WhoisInfo
 import re
 import logging
-import whois
+from app.utils.lazy import lazy_import
 from datetime import datetime
 from typing import Optional, List
+from app.utils.cancellation import cancel_on_disconnect
+
+whois = lazy_import("whois")
 
 router = APIRouter()
 
@@ -199,7 +202,9 @@ async def check_domain_availability(domain: str = Query(..., description="Domain
         raise HTTPException(status_code=500, detail=f"Domain availability check failed: {str(e)}")
 
 @router.get("/bulk-whois")
+@cancel_on_disconnect
 async def bulk_whois_lookup(
+    request: Request,
     domains: str = Query(..., description="Comma-separated list of domains to lookup")
 ):
     """
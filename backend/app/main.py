@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 import time
 import uvicorn
 import os
@@ -25,6 +26,7 @@ from app.api.v1 import (
     admin_blog,
     diagnostic
 )
+from app.utils.udp_probe import start_echo_responder, stop_echo_responder
 
 # ✅ IMPROVED - Configure logging for better debugging
 logging.basicConfig(
@@ -36,12 +38,26 @@ logger = logging.getLogger(__name__)
 # 🔒 SECURITY FIX - Rate limiting configuration
 limiter = Limiter(key_func=get_remote_address)
 
+# ✅ NEW - Background services that live as long as the server
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # UDP echo responder for packet-loss tests; only runs when UDP_ECHO_PORT is set
+    await start_echo_responder()
+    if speed_test.SPEED_TEST_CONFIG['warm_pool']:
+        speed_test.speedtest_pool.start()
+    try:
+        yield
+    finally:
+        speed_test.speedtest_pool.stop()
+        stop_echo_responder()
+
 app = FastAPI(
     title="WhatIsMyIP API",
     description="Professional IP address tools and networking utilities API with blog management",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # 🔒 SECURITY FIX - Add rate limiting to the app
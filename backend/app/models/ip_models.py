@@ -26,6 +26,23 @@ class DNSResponse(BaseModel):
     domain: str
     records: List[DNSRecord]
     query_time: Optional[float] = None  # Time in milliseconds
+    cache: Optional[Dict[str, Dict[str, Any]]] = None  # Per record type: status, remaining TTL, cache hit
+    transport: Optional[str] = None  # udp, doh or dot
+
+class BulkDNSItem(BaseModel):
+    domain: str
+    record_types: Optional[List[str]] = None    # Defaults to the request's record_types
+    resolver: Optional[str] = None              # Nameserver IP; the server's own resolvers if omitted
+
+class BulkDNSRequest(BaseModel):
+    items: List[BulkDNSItem] = Field(..., min_length=1)
+    record_types: List[str] = Field(default_factory=lambda: ["A"])
+    format: str = Field("ndjson", pattern="^(ndjson|csv)$")
+
+class DNSBenchmarkRequest(BaseModel):
+    resolvers: List[str] = Field(default_factory=list)  # "ip" or "ip:port", on top of the configured ones
+    probes: int = Field(10, ge=1, le=50)                # Per resolver, for each of cached and uncached
+    include_system: bool = True                         # Also benchmark the server's own resolvers
 
 class PortStatus(BaseModel):
     port: int
@@ -100,6 +117,33 @@ class BlacklistResponse(BaseModel):
     clean_on: Optional[List[str]] = None
     details: Optional[Dict[str, Dict[str, Any]]] = None
 
+class LatencyStats(BaseModel):
+    min: Optional[float] = None   # ms
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+    iqm: Optional[float] = None   # Interquartile mean (Ookla CLI loaded latency)
+    samples: Optional[int] = None
+    lost: Optional[int] = None
+
+class ThroughputAnalysis(BaseModel):
+    """Stable-phase statistics of one throughput phase (Mbps unless noted)."""
+    mbps: float
+    p10: float
+    p50: float
+    p90: float
+    stdev: float
+    cv: Optional[float] = None         # Coefficient of variation
+    precision: Optional[float] = None  # ±% at 95% confidence
+    trend: Optional[float] = None      # % drift across the stable phase
+    ramp_seconds: float                # Slow-start trimmed from the start
+    stable_seconds: float
+    slices: int
+    stable_slices: int
+    unstable: bool = False
+    flags: List[str] = []
+
 class SpeedTestResult(BaseModel):
     download_speed: float  # Mbps
     upload_speed: float    # Mbps
@@ -108,8 +152,20 @@ class SpeedTestResult(BaseModel):
     server_location: str
     isp: Optional[str] = None
     method: Optional[str] = None
+    ping_min: Optional[float] = None     # ms
+    packet_loss: Optional[float] = None  # % of latency probes lost
+    download_precision: Optional[float] = None  # ±% at 95% confidence (HTTP engine only)
+    upload_precision: Optional[float] = None
+    idle_latency: Optional[LatencyStats] = None
+    download_latency: Optional[LatencyStats] = None  # Loaded latency while downloading
+    upload_latency: Optional[LatencyStats] = None    # Loaded latency while uploading
+    download_analysis: Optional[ThroughputAnalysis] = None
+    upload_analysis: Optional[ThroughputAnalysis] = None
+    test_id: Optional[str] = None        # Raw samples at /speed-test/samples/{test_id} while retained
     test_duration: Optional[float] = None
     timestamp: Optional[float] = None
+    reused: bool = False                 # Served from a recent or in-progress test for the same network
+    result_age: Optional[float] = None   # Seconds since a reused result was measured
 
 class PingTestRequest(BaseModel):
     host: str
@@ -127,6 +183,34 @@ class PingTestResult(BaseModel):
     timestamps: List[str]
     success: bool = True
 
+class UDPTestRequest(BaseModel):
+    host: str
+    port: int = Field(..., ge=1, le=65535)
+    count: int = Field(100, ge=1, le=1000)
+    rate: float = Field(50.0, ge=1, le=500)            # Packets per second
+    payload_size: int = Field(64, ge=24, le=1400)      # Bytes, header included
+
+class UDPTestResult(BaseModel):
+    host: str
+    target_ip: str
+    port: int
+    packets_sent: int
+    packets_received: int
+    packets_lost: int
+    loss_percent: float
+    duplicates: int
+    reordered: int
+    reorder_percent: float
+    max_reorder_distance: int
+    jitter_forward_ms: float   # One-way jitter towards the responder (RFC 3550)
+    jitter_return_ms: float    # One-way jitter back from the responder
+    rtt: Optional[Dict[str, float]] = None
+    rate: float
+    payload_size: int
+    send_duration: float
+    errors: int = 0
+    invalid: int = 0
+
 class TracerouteHop(BaseModel):
     hop_number: int
     ip_address: Optional[str] = None
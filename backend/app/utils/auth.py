@@ -1,12 +1,15 @@
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 import secrets
+import threading
 from app.models.blog_models import AdminUser, TokenData, UserRole
+from app.utils.lazy import lazy_import
+
+bcrypt = lazy_import("bcrypt")
 
 # JWT Configuration with secure secret key generation
 def generate_secure_jwt_secret() -> str:
@@ -55,6 +58,28 @@ security = HTTPBearer()
 # In-memory admin users storage (replace with database in production)
 ADMIN_USERS: Dict[str, Dict[str, Any]] = {}
 
+# ✅ NEW - The default admin is created on first use of the admin store rather
+# than at import: hashing its password costs ~0.3s of every cold start
+_default_admin_lock = threading.RLock()
+_default_admin_ready = threading.Event()
+_default_admin_initialising = False
+
+def ensure_default_admin():
+    """Create the default admin user the first time the admin store is used."""
+    global _default_admin_initialising
+    if _default_admin_ready.is_set():
+        return
+    with _default_admin_lock:
+        # init_default_admin reads the store itself; don't recurse into it
+        if _default_admin_ready.is_set() or _default_admin_initialising:
+            return
+        _default_admin_initialising = True
+        try:
+            init_default_admin()
+        finally:
+            _default_admin_initialising = False
+            _default_admin_ready.set()
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
     salt = bcrypt.gensalt()
@@ -120,6 +145,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
 
 def get_user_by_id(user_id: str) -> Optional[AdminUser]:
     """Get user by ID."""
+    ensure_default_admin()
     user_data = ADMIN_USERS.get(user_id)
     if not user_data:
         return None
@@ -179,6 +205,7 @@ def create_admin_user(email: str, password: str, full_name: str, role: UserRole
 
 def get_user_by_email(email: str) -> Optional[AdminUser]:
     """Get user by email."""
+    ensure_default_admin()
     for user_data in ADMIN_USERS.values():
         if user_data["email"] == email:
             return AdminUser(
@@ -197,6 +224,7 @@ def authenticate_user(email: str, password: str) -> Optional[AdminUser]:
     # 🔒 SECURITY: Add basic input validation
     if not email or not password:
         return None
+    ensure_default_admin()
     
     # 🔒 SECURITY: Normalize email to prevent case-sensitivity issues
     email = email.lower().strip()
@@ -232,6 +260,7 @@ def authenticate_user(email: str, password: str) -> Optional[AdminUser]:
 
 def change_admin_password(email: str, new_password: str) -> bool:
     """Change admin password by email."""
+    ensure_default_admin()
     try:
         user_data = None
         for uid, data in ADMIN_USERS.items():
@@ -304,6 +333,7 @@ def is_development() -> bool:
 
 def get_admin_security_status() -> dict:
     """Get admin system security status for monitoring."""
+    ensure_default_admin()
     admin_count = len(ADMIN_USERS)
     active_admins = sum(1 for user in ADMIN_USERS.values() if user["is_active"])
     
@@ -0,0 +1,226 @@
+"""
+Client-disconnect-aware cancellation for long-running endpoints.
+
+@cancel_on_disconnect runs an endpoint as a task and listens for the
+ASGI http.disconnect message alongside it. When the client goes away the
+task is cancelled, which cancels every coroutine it is awaiting (gather
+fan-outs included). Work that cancellation can't reach directly - child
+processes and executor threads - registers with the request's
+CancellationToken, found through a context variable:
+
+  * run_subprocess() is a subprocess.run() replacement whose child (and its
+    process group) is killed when the token is cancelled
+  * run_in_thread() runs a blocking function in the default executor with
+    the token visible, so the function can register its own callbacks
+    (e.g. setting a library's shutdown event)
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import signal
+import subprocess
+import threading
+from typing import Any, Callable, List, Optional
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+# Non-standard status popularised by nginx for "client closed request";
+# nobody receives it, but it keeps logs and metrics honest
+CLIENT_CLOSED_REQUEST = 499
+
+
+class CancellationToken:
+    """Cancellation state shared by an endpoint task and the threads it starts."""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Run callback on cancellation (immediately if already cancelled).
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancellation callback failed: {e}")
+
+
+_current_token: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar(
+    "cancellation_token", default=None
+)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """Token of the request being served, if it runs under cancel_on_disconnect."""
+    return _current_token.get()
+
+
+async def _wait_for_disconnect(request: Request):
+    """
+    Return once the client has disconnected.
+
+    Blocks on receive() rather than polling request.is_disconnected(): the
+    latter checks with an already-cancelled scope, which never gets through
+    the receive wrapper of @app.middleware("http") (BaseHTTPMiddleware).
+    Endpoints using this must not read the body themselves afterwards.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_with_token(token: CancellationToken, coro):
+    """
+    Await coro with token as the current token.
+
+    Meant to be the whole body of a task, so the token is only visible to
+    that task's work (and the tasks and threads it starts).
+    """
+    _current_token.set(token)
+    return await coro
+
+
+async def run_until_disconnected(request: Request, coro):
+    """
+    Await coro, cancelling it and everything it started if the client disconnects.
+
+    Raises HTTPException(499) after a disconnect.
+    """
+    token = CancellationToken()
+    task = asyncio.create_task(run_with_token(token, coro))
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # The server itself cancelled us (e.g. shutdown) - take the work down too
+        token.cancel()
+        task.cancel()
+        watcher.cancel()
+        raise
+
+    if task.done():
+        watcher.cancel()
+        return task.result()
+
+    logger.info(f"Client disconnected from {request.url.path} - cancelling work")
+    token.cancel()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+
+
+def cancel_on_disconnect(endpoint):
+    """
+    Decorator for endpoints whose work should stop when the client leaves.
+
+    The endpoint must take a starlette Request parameter (under any name).
+    Direct calls without one run the endpoint unwrapped.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        request = next((a for a in (*args, *kwargs.values()) if isinstance(a, Request)), None)
+        if request is None:
+            return await endpoint(*args, **kwargs)
+        return await run_until_disconnected(request, endpoint(*args, **kwargs))
+    return wrapper
+
+
+async def run_in_thread(func: Callable, *args) -> Any:
+    """Run a blocking function in the default executor with the current token visible."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args))
+
+
+def _kill_process_tree(process: subprocess.Popen):
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_subprocess(cmd, timeout: Optional[float] = None, **kwargs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run() that is killed when the current request is cancelled.
+
+    Takes the same arguments as subprocess.run (input/check are not
+    supported). The child gets its own process group so anything it
+    spawns is killed with it. A cancelled run raises CancelledError.
+    """
+    token = current_token()
+    if os.name == "posix":
+        kwargs.setdefault("start_new_session", True)
+    if kwargs.pop("capture_output", False):
+        kwargs["stdout"] = subprocess.PIPE
+        kwargs["stderr"] = subprocess.PIPE
+
+    with subprocess.Popen(cmd, **kwargs) as process:
+        unregister = token.add_callback(lambda: _kill_process_tree(process)) if token else (lambda: None)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_process_tree(process)
+            process.communicate()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        except BaseException:
+            _kill_process_tree(process)
+            raise
+        finally:
+            unregister()
+
+    if token and token.cancelled:
+        raise asyncio.CancelledError()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+async def communicate_or_kill(process: asyncio.subprocess.Process, timeout: Optional[float] = None):
+    """process.communicate() that kills the child on timeout or cancellation."""
+    try:
+        return await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except BaseException:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+        raise
@@ -0,0 +1,142 @@
+"""
+Resolver latency benchmark.
+
+For each resolver, probes run concurrently through the shared DNSFanout
+engine and are summarised as percentile tables:
+
+  * cached: popular names, asked once to warm the resolver's cache
+    and then `probes` more times - the latency a user sees for common
+    sites, mostly the network path to the resolver
+  * uncached: a random label under an unsigned zone per probe, e.g.
+    "wmip-3f9c1a7e.google.com". The resolver can't have it cached, so
+    every probe pays for a trip to the authoritative servers. An
+    unsigned zone is used so that aggressive NSEC caching (RFC 8198)
+    can't answer it either
+  * timeout rate across all probes
+  * DNSSEC: whether answers for a signed zone come back with the AD bit,
+    and whether a deliberately broken zone is rejected with SERVFAIL -
+    only a validating resolver does both
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import secrets
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.dns_fanout import fanout_engine
+from app.utils.latency import latency_percentiles
+from app.utils.lazy import lazy_import
+
+dns = lazy_import("dns", "dns.rcode")
+
+logger = logging.getLogger(__name__)
+
+DNS_BENCHMARK_CONFIG = {
+    'max_probes': 50,
+    'max_resolvers': 10,      # User-supplied, on top of the configured ones
+    'timeout': 2.0,           # Seconds per probe
+    'cached_names': ["google.com", "youtube.com", "facebook.com", "amazon.com", "wikipedia.org"],
+    'uncached_zones': ["google.com", "amazon.com"],
+    'dnssec_signed': "cloudflare.com",
+    'dnssec_bogus': "dnssec-failed.org",
+    # Benchmarking private addresses from the server would let clients probe its network
+    'allow_private_resolvers': os.getenv("DNS_BENCHMARK_ALLOW_PRIVATE_RESOLVERS", "false").lower() == "true"
+}
+
+
+def parse_resolver(spec: str) -> Tuple[str, int]:
+    """'1.1.1.1', '1.1.1.1:5353', '2606:4700::1111' or '[2606:4700::1111]:53' -> (address, port)."""
+    spec = spec.strip()
+    port = 53
+    if spec.startswith('['):
+        address, _, rest = spec[1:].partition(']')
+        if rest.startswith(':'):
+            port = int(rest[1:])
+    elif spec.count(':') == 1:
+        address, port_text = spec.split(':')
+        port = int(port_text)
+    else:
+        address = spec
+    address = ipaddress.ip_address(address).compressed
+    if not 0 < port < 65536:
+        raise ValueError(f"Invalid port in {spec}")
+    return address, port
+
+
+def validate_user_resolver(spec: str) -> Tuple[str, int]:
+    """parse_resolver() that also refuses non-public addresses unless allowed."""
+    address, port = parse_resolver(spec)
+    if not DNS_BENCHMARK_CONFIG['allow_private_resolvers'] and not ipaddress.ip_address(address).is_global:
+        raise ValueError(f"Resolver {spec} is not a public address")
+    return address, port
+
+
+async def _timed(address: str, port: int, name: str, rdtype: str = "A", dnssec: bool = False):
+    return await fanout_engine().query(
+        name, rdtype, [address], port=port, timeout=DNS_BENCHMARK_CONFIG['timeout'], dnssec=dnssec
+    )
+
+
+def _table(replies) -> Optional[Dict[str, Any]]:
+    latencies = [reply.latency_ms for reply in replies if reply.error is None]
+    return latency_percentiles(latencies, lost=len(replies) - len(latencies))
+
+
+async def benchmark_resolver(address: str, port: int = 53, probes: int = 10) -> Dict[str, Any]:
+    """Cached and uncached latency tables, timeout rate and DNSSEC behaviour of one resolver."""
+    names = DNS_BENCHMARK_CONFIG['cached_names']
+    zones = DNS_BENCHMARK_CONFIG['uncached_zones']
+
+    # Warm the cache first, so the cached probes really are cached
+    await asyncio.gather(*(_timed(address, port, name) for name in names))
+
+    cached_probes = [_timed(address, port, names[i % len(names)]) for i in range(probes)]
+    uncached_probes = [
+        _timed(address, port, f"wmip-{secrets.token_hex(4)}.{zones[i % len(zones)]}") for i in range(probes)
+    ]
+    dnssec_probes = [
+        _timed(address, port, DNS_BENCHMARK_CONFIG['dnssec_signed'], dnssec=True),
+        _timed(address, port, DNS_BENCHMARK_CONFIG['dnssec_bogus'], dnssec=True)
+    ]
+    replies = await asyncio.gather(*cached_probes, *uncached_probes, *dnssec_probes)
+    cached, uncached, (signed, bogus) = replies[:probes], replies[probes:2 * probes], replies[2 * probes:]
+
+    measured = cached + uncached
+    timeouts = sum(1 for reply in measured if reply.error == "timeout")
+    authenticated = signed.error is None and signed.authenticated
+    rejects_bogus = bogus.error is None and bogus.rcode == dns.rcode.SERVFAIL
+    return {
+        'address': address,
+        'port': port,
+        'cached': _table(cached),
+        'uncached': _table(uncached),
+        'timeouts': timeouts,
+        'timeout_rate': round(timeouts / len(measured) * 100, 1),
+        'dnssec': {
+            'authenticated_data': authenticated,
+            'rejects_bogus': rejects_bogus,
+            'validating': authenticated and rejects_bogus
+        }
+    }
+
+
+async def benchmark_resolvers(resolvers: List[Dict[str, Any]], probes: int = 10) -> List[Dict[str, Any]]:
+    """
+    Benchmark every resolver at once; entries are {"address", "port", "source"}.
+
+    Results are ranked by uncached median latency (resolvers that never
+    answered go last).
+    """
+    results = await asyncio.gather(*(
+        benchmark_resolver(resolver['address'], resolver.get('port', 53), probes) for resolver in resolvers
+    ))
+    for resolver, result in zip(resolvers, results):
+        result['source'] = resolver.get('source')
+
+    def rank(result):
+        table = result['uncached'] or result['cached']
+        return (table is None, table['p50'] if table else 0.0)
+
+    return sorted(results, key=rank)
@@ -0,0 +1,184 @@
+"""
+Bulk DNS resolution pipeline.
+
+Resolving a portfolio of thousands of (domain, record type) pairs one
+request at a time is slow for the client and bursty for the resolvers.
+run_bulk() takes the whole batch and:
+
+  * deduplicates it on (domain, type, resolver) before anything is sent
+  * runs at most `concurrency` queries at once, and at most
+    `per_resolver` against any one resolver, so a batch aimed mostly at
+    one resolver can't starve the others or hammer that one
+  * hands queries out round-robin across resolvers (FairScheduler)
+  * yields each row as soon as it completes, through a bounded queue: a
+    slow reader pauses the workers instead of buffering results
+
+Memory therefore grows with the input list, never with the output.
+Rows arrive in completion order, not input order.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BULK_DNS_CONFIG = {
+    'max_queries': int(os.getenv("DNS_BULK_MAX_QUERIES", "20000")),  # After deduplication
+    'max_upload_bytes': 2 * 1024 * 1024,
+    'concurrency': int(os.getenv("DNS_BULK_CONCURRENCY", "64")),
+    'per_resolver': int(os.getenv("DNS_BULK_PER_RESOLVER", "16")),
+    # Sending queries to private resolvers would let clients probe the server's network
+    'allow_private_resolvers': os.getenv("DNS_BULK_ALLOW_PRIVATE_RESOLVERS", "false").lower() == "true"
+}
+
+# Resolver name for the server's own configured nameservers
+SYSTEM_RESOLVER = "system"
+
+ROW_FIELDS = ["domain", "type", "resolver", "status", "ttl", "cached", "values", "error"]
+
+
+class BulkQuery(NamedTuple):
+    domain: str
+    type: str
+    resolver: str
+
+
+def dedupe(items: Iterable[Tuple[str, Iterable[str], Optional[str]]]) -> List[BulkQuery]:
+    """
+    Expand (domain, record types, resolver) items into unique queries.
+
+    Domains are compared case-insensitively and without the trailing dot;
+    first-seen order is kept.
+    """
+    seen = {}
+    for domain, record_types, resolver in items:
+        domain = domain.strip().lower().rstrip('.')
+        for record_type in record_types:
+            query = BulkQuery(domain, record_type.strip().upper(), resolver or SYSTEM_RESOLVER)
+            seen.setdefault(query, None)
+    return list(seen)
+
+
+def parse_lines(lines: Iterable[str], default_types: List[str]) -> Iterator[Tuple[str, List[str], Optional[str]]]:
+    """
+    Items from an uploaded list, one domain per line:
+
+        domain[,types[,resolver]]
+
+    types are separated by spaces, ';' or '|' and default to default_types.
+    Blank lines, '#' comments and a "domain" header row are skipped.
+    """
+    for row in csv.reader(line for line in lines if line.strip() and not line.lstrip().startswith('#')):
+        if not row or not row[0].strip() or row[0].strip().lower() == "domain":
+            continue
+        types = row[1].replace(';', ' ').replace('|', ' ').split() if len(row) > 1 else []
+        resolver = row[2].strip() if len(row) > 2 and row[2].strip() else None
+        yield row[0].strip(), types or default_types, resolver
+
+
+class FairScheduler:
+    """Hands out queries round-robin across resolvers, with at most per_resolver in flight for each."""
+
+    def __init__(self, queries: Iterable[BulkQuery], per_resolver: int):
+        self.per_resolver = per_resolver
+        self._queues: Dict[str, deque] = {}
+        for query in queries:
+            self._queues.setdefault(query.resolver, deque()).append(query)
+        self._order = deque(self._queues)
+        self._active = Counter()
+        self._changed = asyncio.Condition()
+
+    def _pick(self) -> Optional[BulkQuery]:
+        for _ in range(len(self._order)):
+            resolver = self._order[0]
+            self._order.rotate(-1)
+            if self._active[resolver] >= self.per_resolver:
+                continue
+            queue = self._queues[resolver]
+            query = queue.popleft()
+            if not queue:
+                del self._queues[resolver]
+                self._order.remove(resolver)
+            self._active[resolver] += 1
+            return query
+        return None
+
+    async def next(self) -> Optional[BulkQuery]:
+        """The next query to run, waiting while every pending resolver is at its limit; None when drained."""
+        async with self._changed:
+            while self._queues:
+                query = self._pick()
+                if query is not None:
+                    return query
+                await self._changed.wait()
+            return None
+
+    async def done(self, query: BulkQuery):
+        async with self._changed:
+            self._active[query.resolver] -= 1
+            self._changed.notify_all()
+
+
+def error_row(query: BulkQuery, status: str, error: str) -> Dict[str, Any]:
+    return {
+        "domain": query.domain, "type": query.type, "resolver": query.resolver,
+        "status": status, "ttl": None, "cached": False, "values": [], "error": error
+    }
+
+
+async def run_bulk(queries: List[BulkQuery], query_fn: Callable[[BulkQuery], Awaitable[Dict[str, Any]]],
+                   concurrency: Optional[int] = None, per_resolver: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run query_fn for every query and yield the rows as they complete.
+
+    A query_fn exception becomes an ERROR row. Closing the iterator early
+    (e.g. the client disconnected) cancels the queries still in flight.
+    """
+    concurrency = concurrency or BULK_DNS_CONFIG['concurrency']
+    scheduler = FairScheduler(queries, per_resolver or BULK_DNS_CONFIG['per_resolver'])
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def worker():
+        while (query := await scheduler.next()) is not None:
+            try:
+                row = await query_fn(query)
+            except Exception as e:
+                logger.warning(f"Bulk DNS query {query.domain} {query.type} via {query.resolver} failed: {e}")
+                row = error_row(query, "ERROR", str(e))
+            finally:
+                await scheduler.done(query)
+            await results.put(row)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(queries)))]
+    try:
+        for _ in range(len(queries)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def ndjson_lines(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    async for row in rows:
+        yield json.dumps(row, separators=(',', ':')) + "\n"
+
+
+async def csv_lines(rows: AsyncIterator[Dict[str, Any]], fields: List[str] = ROW_FIELDS) -> AsyncIterator[str]:
+    """CSV with a header row; list values share a cell, separated by ' | '."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator="\n")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow({key: " | ".join(value) if isinstance(value, list) else value for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,321 @@
+"""
+Shared DNS resolution with a TTL-honouring answer cache.
+
+Every router that resolves names goes through resolve(), which answers
+from DNSCache while the upstream TTL lasts and queries the shared async
+resolver otherwise:
+
+  * entries are keyed by (name, type, resolver), so answers from
+    different nameservers never mix
+  * positive answers live for the smallest TTL of the rrsets used to
+    build them (CNAME chain included), clamped to [min_ttl, max_ttl]
+  * NXDOMAIN and NODATA answers are cached per RFC 2308 for
+    min(SOA TTL, SOA MINIMUM) from the authority section, capped at
+    negative_max_ttl; without an SOA they aren't cached at all
+  * timeouts and server failures are never cached
+
+Answers carry their remaining TTL, the way a caching resolver decrements
+TTLs, so responses can report how long a record is still valid.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from app.utils.dns_encrypted import DNS_TRANSPORT_CONFIG, ENCRYPTED_TRANSPORTS, encrypted_client, upstream_key
+from app.utils.dns_fanout import fanout_engine
+from app.utils.lazy import lazy_import
+
+dns = lazy_import("dns", "dns.resolver", "dns.asyncresolver", "dns.exception", "dns.rcode", "dns.rdatatype", "dns.name")
+
+logger = logging.getLogger(__name__)
+
+DNS_CACHE_CONFIG = {
+    'min_ttl': int(os.getenv("DNS_CACHE_MIN_TTL", "0")),        # Floor for positive and negative TTLs
+    'max_ttl': int(os.getenv("DNS_CACHE_MAX_TTL", "86400")),    # Ceiling for positive TTLs
+    'negative_max_ttl': int(os.getenv("DNS_CACHE_NEGATIVE_MAX_TTL", "3600")),  # RFC 2308 suggests 1-3 hours
+    'max_entries': 50_000,
+    'max_nameserver_resolvers': 64,  # Per-nameserver resolvers kept for reuse
+    'timeout': 5,    # Seconds per nameserver attempt
+    'lifetime': 10   # Seconds for the whole query, retries included
+}
+
+NOERROR = 'NOERROR'
+NXDOMAIN = 'NXDOMAIN'
+NODATA = 'NODATA'
+
+
+class DNSAnswer:
+    """A resolved (or negatively cached) answer for one name and type."""
+
+    __slots__ = ('name', 'rdtype', 'status', 'rrset', 'ttl', 'expires_at', 'from_cache')
+
+    def __init__(self, name: str, rdtype: str, status: str, rrset, ttl: int,
+                 now: Optional[float] = None, from_cache: bool = False):
+        self.name = name
+        self.rdtype = rdtype
+        self.status = status
+        self.rrset = rrset
+        self.ttl = ttl
+        self.expires_at = (time.monotonic() if now is None else now) + ttl
+        self.from_cache = from_cache
+
+    def remaining(self, now: Optional[float] = None) -> int:
+        """Seconds of TTL left (never negative)."""
+        now = time.monotonic() if now is None else now
+        return max(0, math.ceil(self.expires_at - now))
+
+    def cached_copy(self) -> "DNSAnswer":
+        copy = DNSAnswer.__new__(DNSAnswer)
+        for slot in self.__slots__:
+            setattr(copy, slot, getattr(self, slot))
+        copy.from_cache = True
+        return copy
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.rrset if self.rrset is not None else ())
+
+    def __len__(self) -> int:
+        return len(self.rrset) if self.rrset is not None else 0
+
+    def info(self) -> Dict[str, Any]:
+        """Status, remaining TTL and cache hit, for API responses."""
+        return {'status': self.status, 'ttl': self.remaining(), 'cached': self.from_cache}
+
+
+class DNSCache:
+    """Answers per (name, type, resolver) until their TTL runs out, with bounded memory."""
+
+    def __init__(self, max_entries: int = DNS_CACHE_CONFIG['max_entries']):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], DNSAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str, str], now: Optional[float] = None) -> Optional[DNSAnswer]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is None or answer.expires_at <= now:
+                if answer is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer.cached_copy()
+
+    def __contains__(self, key: Tuple[str, str, str]) -> bool:
+        """Whether key has an unexpired entry, without counting a hit or miss."""
+        answer = self._entries.get(key)
+        return answer is not None and answer.expires_at > time.monotonic()
+
+    def put(self, key: Tuple[str, str, str], answer: DNSAnswer):
+        if answer.ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = answer
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Occupancy and hit counts for diagnostics."""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'min_ttl': DNS_CACHE_CONFIG['min_ttl'],
+            'max_ttl': DNS_CACHE_CONFIG['max_ttl'],
+            'negative_max_ttl': DNS_CACHE_CONFIG['negative_max_ttl']
+        }
+
+
+dns_cache = DNSCache()
+
+_resolver = None
+
+
+def get_resolver():
+    """
+    The shared async resolver for the system's nameservers.
+
+    Created on first use: building one reads the system resolver
+    configuration, and dnspython resolvers are safe to share between
+    concurrent queries.
+    """
+    global _resolver
+    if _resolver is None:
+        resolver = dns.asyncresolver.Resolver()
+        resolver.timeout = DNS_CACHE_CONFIG['timeout']
+        resolver.lifetime = DNS_CACHE_CONFIG['lifetime']
+        _resolver = resolver
+    return _resolver
+
+
+_nameserver_resolvers: "OrderedDict[Tuple[str, int], Any]" = OrderedDict()
+_nameserver_resolvers_lock = threading.Lock()
+
+
+def resolver_for(nameserver: str, port: int = 53):
+    """
+    A shared async resolver that asks only nameserver.
+
+    One per (address, port), kept in a small LRU: clients choose the
+    nameserver, so the set must stay bounded. Cache entries are keyed by
+    address rather than resolver, so an evicted resolver loses no answers.
+    """
+    key = (nameserver, port)
+    with _nameserver_resolvers_lock:
+        resolver = _nameserver_resolvers.get(key)
+        if resolver is not None:
+            _nameserver_resolvers.move_to_end(key)
+            return resolver
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        resolver.nameservers = [nameserver]
+        resolver.port = port
+        resolver.timeout = DNS_CACHE_CONFIG['timeout']
+        resolver.lifetime = DNS_CACHE_CONFIG['lifetime']
+        _nameserver_resolvers[key] = resolver
+        while len(_nameserver_resolvers) > DNS_CACHE_CONFIG['max_nameserver_resolvers']:
+            _nameserver_resolvers.popitem(last=False)
+    return resolver
+
+
+def resolver_key(resolver) -> str:
+    """Cache key part identifying which nameservers a resolver asks."""
+    return ",".join(str(nameserver) for nameserver in resolver.nameservers) + f":{resolver.port}"
+
+
+def _clamp(ttl: int, ceiling: int) -> int:
+    return max(DNS_CACHE_CONFIG['min_ttl'], min(int(ttl), ceiling))
+
+
+def negative_ttl(response) -> Optional[int]:
+    """RFC 2308 negative TTL from a response's authority SOA, or None without one."""
+    if response is None:
+        return None
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+            return min(rrset.ttl, rrset[0].minimum)
+    return None
+
+
+def cache_key(name, rdtype: str, resolver=None, transport: Optional[str] = None) -> Tuple[str, str, str]:
+    """The cache key resolve() uses for name/rdtype asked of resolver (or an encrypted upstream)."""
+    if transport in ENCRYPTED_TRANSPORTS:
+        upstream = upstream_key(transport)
+    else:
+        upstream = resolver_key(resolver or get_resolver())
+    return (str(name).lower().rstrip('.'), rdtype.upper(), upstream)
+
+
+async def resolve(name: str, rdtype: str, resolver=None, lifetime: Optional[float] = None,
+                  transport: Optional[str] = None, cache: Optional[DNSCache] = None) -> DNSAnswer:
+    """
+    Resolve name/rdtype through the cache.
+
+    Returns a DNSAnswer whose status is NOERROR, NXDOMAIN or NODATA;
+    iterating it yields the rdata. Timeouts and other failures raise the
+    resolver's exception and leave the cache untouched.
+
+    transport "fanout" sends cache misses through the raw UDP fan-out
+    engine (for high-volume callers such as DNSBL checks) instead of
+    dnspython's resolver; the nameservers, and the cache entries, are
+    the same either way.
+
+    transport "doh" or "dot" asks the configured DNS-over-HTTPS or
+    DNS-over-TLS upstream instead, over a shared persistent connection
+    (see dns_encrypted); "udp" asks the resolver's nameservers. Without a
+    transport, queries for the system resolver use DNS_TRANSPORT.
+
+    cache defaults to the shared dns_cache; callers that churn through
+    many one-off names (e.g. reverse-DNS sweeps) can keep their own.
+    """
+    if transport is None and (resolver is None or resolver is get_resolver()):
+        transport = DNS_TRANSPORT_CONFIG['default']
+    resolver = resolver or get_resolver()
+    cache = cache if cache is not None else dns_cache
+    rdtype = rdtype.upper()
+    key = cache_key(name, rdtype, resolver, transport)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    if transport == "fanout" or transport in ENCRYPTED_TRANSPORTS:
+        if transport == "fanout":
+            response = await _query_fanout(name, rdtype, resolver, lifetime)
+        else:
+            response = await _query_encrypted(name, rdtype, transport, lifetime)
+        if response.rcode() == dns.rcode.NXDOMAIN:
+            return _negative(cache, key, rdtype, NXDOMAIN, response)
+        chain = response.resolve_chaining()
+        rrset, minimum_ttl = chain.answer, chain.minimum_ttl
+    else:
+        try:
+            answer = await resolver.resolve(name, rdtype, raise_on_no_answer=False, lifetime=lifetime)
+        except dns.resolver.NXDOMAIN as e:
+            responses = e.kwargs.get('responses') or {}
+            return _negative(cache, key, rdtype, NXDOMAIN, next(iter(responses.values()), None))
+        response, rrset, minimum_ttl = answer.response, answer.rrset, answer.chaining_result.minimum_ttl
+
+    if rrset is None:
+        # A CNAME leading to the empty answer may expire sooner
+        return _negative(cache, key, rdtype, NODATA, response, minimum_ttl)
+
+    result = DNSAnswer(key[0], rdtype, NOERROR, rrset, _clamp(minimum_ttl, DNS_CACHE_CONFIG['max_ttl']))
+    cache.put(key, result)
+    return result
+
+
+def _negative(cache: DNSCache, key: Tuple[str, str, str], rdtype: str, status: str, response,
+              chain_ttl: Optional[int] = None) -> DNSAnswer:
+    """NXDOMAIN/NODATA answer, cached only when the response carried an SOA."""
+    ttl = negative_ttl(response)
+    if ttl is not None and chain_ttl is not None:
+        ttl = min(ttl, chain_ttl)
+    result = DNSAnswer(key[0], rdtype, status, None, _clamp(ttl or 0, DNS_CACHE_CONFIG['negative_max_ttl']))
+    if ttl is not None:
+        cache.put(key, result)
+    return result
+
+
+async def _query_fanout(name: str, rdtype: str, resolver, lifetime: Optional[float]):
+    """One query through the fan-out engine, as a parsed message; failures raise like the resolver's."""
+    reply = await fanout_engine().query(
+        str(name), rdtype, resolver.nameservers, port=resolver.port,
+        timeout=lifetime if lifetime is not None else resolver.lifetime
+    )
+    if reply.error == "timeout":
+        raise dns.exception.Timeout()
+    if reply.error is not None:
+        raise dns.exception.DNSException(f"Query for {name} {rdtype} failed: {reply.error}")
+    if reply.rcode not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+        raise dns.exception.DNSException(
+            f"Query for {name} {rdtype} failed: {dns.rcode.to_text(reply.rcode)} from {reply.nameserver}"
+        )
+    return reply.message()
+
+
+async def _query_encrypted(name: str, rdtype: str, transport: str, lifetime: Optional[float]):
+    """One query over DoH or DoT, as a parsed message; failures raise like the resolver's."""
+    client = encrypted_client(transport)
+    response = await client.query(name, rdtype, timeout=lifetime)
+    if response.rcode() not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+        raise dns.exception.DNSException(
+            f"Query for {name} {rdtype} failed: {dns.rcode.to_text(response.rcode())} over {transport}"
+        )
+    return response
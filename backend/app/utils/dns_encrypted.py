@@ -0,0 +1,279 @@
+"""
+DNS over HTTPS (RFC 8484) and DNS over TLS (RFC 7858) transports.
+
+Both keep encrypted connections open and put many queries on each, instead
+of paying a TCP and TLS handshake per query:
+
+  * DoHClient posts application/dns-message to the upstream through a
+    pooled HTTP/2 httpx client, so concurrent queries travel as streams
+    multiplexed on one connection
+  * DoTConnection keeps one TLS stream open and pipelines queries on it
+    (RFC 7766): each query is written as soon as it is issued, under its
+    own message ID, and a reader task hands replies - which may arrive
+    out of order - back to their callers. A connection the server closed
+    is reopened by the next query; queries caught by the close are resent
+    once on the new connection.
+
+resolve() in dns_cache selects them with transport="doh" or "dot", or for
+the system resolver through DNS_TRANSPORT. They always ask the configured
+upstream (DNS_DOH_URL, DNS_DOT_SERVER), not the system nameservers.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import ssl
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.utils.lazy import lazy_import
+
+dns = lazy_import("dns", "dns.message", "dns.exception")
+
+logger = logging.getLogger(__name__)
+
+DNS_TRANSPORT_CONFIG = {
+    'default': os.getenv("DNS_TRANSPORT", "udp").lower(),  # udp, doh or dot, for the system resolver
+    'doh_url': os.getenv("DNS_DOH_URL", "https://cloudflare-dns.com/dns-query"),
+    'dot_server': os.getenv("DNS_DOT_SERVER", "1.1.1.1"),
+    'dot_port': int(os.getenv("DNS_DOT_PORT", "853")),
+    'dot_hostname': os.getenv("DNS_DOT_HOSTNAME", "cloudflare-dns.com"),  # Name the certificate must match
+    'ca_file': os.getenv("DNS_TLS_CA_FILE") or None,  # Extra CA bundle, e.g. for a private resolver
+    'timeout': 5.0,          # Seconds per query
+    'idle_timeout': 30.0,    # Seconds an unused connection stays open
+    'max_connections': 2,    # DoH connections per upstream; HTTP/2 multiplexes queries on each
+    'max_pipelined': 256     # DoT queries in flight on the connection
+}
+
+TRANSPORTS = ("udp", "doh", "dot")
+ENCRYPTED_TRANSPORTS = ("doh", "dot")
+
+DNS_MESSAGE = "application/dns-message"
+
+
+def tls_context() -> ssl.SSLContext:
+    """Certificate-verifying client context, trusting ca_file on top of the system CAs."""
+    context = ssl.create_default_context()
+    if DNS_TRANSPORT_CONFIG['ca_file']:
+        context.load_verify_locations(cafile=DNS_TRANSPORT_CONFIG['ca_file'])
+    return context
+
+
+def _check_reply(query, wire: bytes):
+    response = dns.message.from_wire(wire)
+    if not query.is_response(response):
+        raise dns.exception.DNSException("Encrypted DNS reply doesn't match the query")
+    return response
+
+
+class DoHClient:
+    """DNS over HTTPS to one URL on a pooled HTTP/2 client."""
+
+    def __init__(self, url: str, context: Optional[ssl.SSLContext] = None):
+        self.url = url
+        self.queries = 0
+        self.errors = 0
+        self.http_version: Optional[str] = None
+        self._client = httpx.AsyncClient(
+            http2=True,
+            verify=context or tls_context(),
+            timeout=DNS_TRANSPORT_CONFIG['timeout'],
+            limits=httpx.Limits(
+                max_connections=DNS_TRANSPORT_CONFIG['max_connections'],
+                max_keepalive_connections=DNS_TRANSPORT_CONFIG['max_connections'],
+                keepalive_expiry=DNS_TRANSPORT_CONFIG['idle_timeout']
+            )
+        )
+
+    async def query(self, name, rdtype: str, timeout: Optional[float] = None):
+        """One query as a parsed message; timeouts raise dns.exception.Timeout."""
+        query = dns.message.make_query(name, rdtype)
+        query.id = 0  # RFC 8484: lets HTTP caches share identical queries
+        self.queries += 1
+        try:
+            response = await self._client.post(
+                self.url, content=query.to_wire(),
+                headers={"content-type": DNS_MESSAGE, "accept": DNS_MESSAGE},
+                timeout=timeout or DNS_TRANSPORT_CONFIG['timeout']
+            )
+            response.raise_for_status()
+        except httpx.TimeoutException:
+            self.errors += 1
+            raise dns.exception.Timeout()
+        except httpx.HTTPError as e:
+            self.errors += 1
+            raise dns.exception.DNSException(f"DoH query to {self.url} failed: {e}")
+        self.http_version = response.http_version
+        return _check_reply(query, response.content)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'url': self.url, 'queries': self.queries, 'errors': self.errors, 'http_version': self.http_version}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class DoTConnection:
+    """DNS over TLS to one server on a single persistent, pipelined connection."""
+
+    def __init__(self, host: str, port: int = 853, server_hostname: Optional[str] = None,
+                 context: Optional[ssl.SSLContext] = None):
+        self.host = host
+        self.port = port
+        self.server_hostname = server_hostname or host
+        self.context = context or tls_context()
+        self.connections = 0  # Opened so far
+        self.queries = 0
+        self.errors = 0
+        self.max_inflight = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._connect_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(DNS_TRANSPORT_CONFIG['max_pipelined'])
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self._connect_lock:
+            if not self.connected:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.context,
+                                            server_hostname=self.server_hostname),
+                    DNS_TRANSPORT_CONFIG['timeout']
+                )
+                self.connections += 1
+                self._writer = writer
+                self._reader_task = asyncio.get_running_loop().create_task(self._read_replies(reader, writer))
+            return self._writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+                wire = await reader.readexactly(length)
+                future = self._pending.get(int.from_bytes(wire[:2], "big"))
+                if future is not None and not future.done():
+                    future.set_result(wire)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            logger.debug(f"DoT connection to {self.host}:{self.port} closed: {e!r}")
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            # Whatever was in flight on this connection will never be answered
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionResetError("DoT connection closed"))
+
+    def _new_id(self) -> int:
+        while True:
+            query_id = secrets.randbelow(65536)
+            if query_id not in self._pending:
+                return query_id
+
+    async def query(self, name, rdtype: str, timeout: Optional[float] = None):
+        """One query as a parsed message; timeouts raise dns.exception.Timeout."""
+        timeout = timeout or DNS_TRANSPORT_CONFIG['timeout']
+        self.queries += 1
+        async with self._slots:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            try:
+                # Once more on a fresh connection if the server closed this one under us
+                for attempt in range(2):
+                    try:
+                        return await self._exchange(name, rdtype, timeout)
+                    except ConnectionError:
+                        if attempt:
+                            raise
+            except asyncio.TimeoutError:
+                self.errors += 1
+                raise dns.exception.Timeout()
+            except (ConnectionError, OSError, ssl.SSLError) as e:
+                self.errors += 1
+                raise dns.exception.DNSException(f"DoT query to {self.host}:{self.port} failed: {e}")
+            finally:
+                if not self._pending:
+                    self._idle_timer = asyncio.get_running_loop().call_later(
+                        DNS_TRANSPORT_CONFIG['idle_timeout'], self.close
+                    )
+
+    async def _exchange(self, name, rdtype: str, timeout: float):
+        writer = await self._connect()
+        query = dns.message.make_query(name, rdtype)
+        query.id = self._new_id()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[query.id] = future
+        self.max_inflight = max(self.max_inflight, len(self._pending))
+        try:
+            wire = query.to_wire()
+            writer.write(len(wire).to_bytes(2, "big") + wire)
+            await writer.drain()
+            return _check_reply(query, await asyncio.wait_for(future, timeout))
+        finally:
+            del self._pending[query.id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'server': f"{self.host}:{self.port}", 'connected': self.connected, 'connections': self.connections,
+            'queries': self.queries, 'errors': self.errors, 'max_inflight': self.max_inflight
+        }
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+_clients: Dict[str, Any] = {}
+_clients_loop = None
+
+
+def encrypted_client(transport: str):
+    """
+    The shared DoHClient ("doh") or DoTConnection ("dot") for the configured upstream.
+
+    Connections belong to an event loop, so a new loop gets new clients.
+    """
+    global _clients_loop
+    loop = asyncio.get_running_loop()
+    if loop is not _clients_loop:
+        _clients.clear()
+        _clients_loop = loop
+    client = _clients.get(transport)
+    if client is None:
+        if transport == "doh":
+            client = DoHClient(DNS_TRANSPORT_CONFIG['doh_url'])
+        elif transport == "dot":
+            client = DoTConnection(
+                DNS_TRANSPORT_CONFIG['dot_server'], DNS_TRANSPORT_CONFIG['dot_port'],
+                DNS_TRANSPORT_CONFIG['dot_hostname']
+            )
+        else:
+            raise ValueError(f"Unknown encrypted DNS transport: {transport}")
+        _clients[transport] = client
+    return client
+
+
+def upstream_key(transport: str) -> str:
+    """Cache key part for answers from an encrypted upstream."""
+    if transport == "doh":
+        return f"doh:{DNS_TRANSPORT_CONFIG['doh_url']}"
+    return f"dot:{DNS_TRANSPORT_CONFIG['dot_server']}:{DNS_TRANSPORT_CONFIG['dot_port']}"
+
+
+def transport_stats() -> Dict[str, Any]:
+    """Default transport, configured upstreams and, once used, their clients' counters."""
+    return {
+        'default': DNS_TRANSPORT_CONFIG['default'],
+        'doh_url': DNS_TRANSPORT_CONFIG['doh_url'],
+        'dot_server': f"{DNS_TRANSPORT_CONFIG['dot_server']}:{DNS_TRANSPORT_CONFIG['dot_port']}",
+        'clients': {transport: client.stats() for transport, client in _clients.items()}
+    }
@@ -0,0 +1,428 @@
+"""
+Raw UDP DNS fan-out engine.
+
+DNSBL, email blacklist and propagation checks send thousands of tiny,
+independent queries. A resolver object, socket or executor thread per
+query costs far more than the query itself, so DNSFanout does the work
+directly:
+
+  * query packets are built from a packed 12-byte header and the
+    question in dnspython's wire format - no Message object per query
+  * they go out over a small pool of non-blocking UDP sockets, each
+    drained with recvfrom() in a loop from one add_reader() callback.
+    A socket is replaced by one on a fresh random port after rotate_after
+    queries (and closed once its last reply is in), so an off-path
+    spoofer can't learn the ports and only has to guess the 16-bit ID
+  * replies are matched by query ID (per socket), then source address
+    and port, then the echoed question bytes - anything else is dropped
+    and counted, never delivered
+  * each query has one timer: on expiry it is retransmitted (to the next
+    nameserver, if there are several) until its retries run out
+  * a truncated reply is retried over TCP with the same query, flags
+    and EDNS (DO bit) included
+
+Replies stay raw: rcode and answer count come from the header, and the
+full dnspython message is parsed only when a caller asks for it, so the
+common "NXDOMAIN: not listed" case never pays for parsing.
+
+benchmarks/bench_dns_fanout.py measures throughput against a local
+responder.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import random
+import re
+import socket
+import struct
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from app.utils.lazy import lazy_import
+
+dns = lazy_import("dns", "dns.asyncquery", "dns.exception", "dns.message", "dns.name", "dns.rdatatype")
+
+logger = logging.getLogger(__name__)
+
+DNS_FANOUT_CONFIG = {
+    'sockets': int(os.getenv("DNS_FANOUT_SOCKETS", "4")),         # Per address family
+    'max_inflight': int(os.getenv("DNS_FANOUT_MAX_INFLIGHT", "4096")),
+    'timeout': 3.0,       # Seconds per query, retransmits included
+    'retries': 1,
+    'rotate_after': int(os.getenv("DNS_FANOUT_ROTATE_AFTER", "1000")),  # Queries per socket before a new port
+    'recv_size': 4096     # Replies larger than this come back truncated over UDP anyway (EDNS off)
+}
+
+_HEADER = struct.Struct("!HHHHHH")
+_QUESTION_TAIL = struct.Struct("!HH")
+_RD = 0x0100
+_AD = 0x0020
+# EDNS0 OPT record: root owner, 1232-byte UDP payload, DO bit set, no options
+_OPT_DO = b"\x00" + struct.pack("!HHIH", 41, 1232, 0x8000, 0)
+_IN = 1
+_HEADER_SIZE = 12
+# Plain hostnames are encoded directly; anything needing escapes or IDNA goes through dns.name
+_PLAIN_NAME = re.compile(r'^[A-Za-z0-9_-]{1,63}(\.[A-Za-z0-9_-]{1,63})*\.?$')
+
+
+class DNSReply:
+    """Outcome of one query: the raw reply, or why there isn't one."""
+
+    __slots__ = ('wire', 'latency_ms', 'transport', 'error', 'nameserver', '_message')
+
+    def __init__(self, wire: Optional[bytes] = None, latency_ms: Optional[float] = None,
+                 transport: str = "udp", error: Optional[str] = None, nameserver: Optional[str] = None):
+        self.wire = wire
+        self.latency_ms = latency_ms
+        self.transport = transport
+        self.error = error
+        self.nameserver = nameserver
+        self._message = None
+
+    @property
+    def rcode(self) -> Optional[int]:
+        return self.wire[3] & 0x0F if self.wire else None
+
+    @property
+    def answer_count(self) -> int:
+        return (self.wire[6] << 8 | self.wire[7]) if self.wire else 0
+
+    @property
+    def authenticated(self) -> bool:
+        """AD bit: the resolver validated the answer with DNSSEC."""
+        return bool(self.wire and self.wire[3] & 0x20)
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.wire and self.wire[2] & 0x02)
+
+    def message(self):
+        """The reply parsed into a dns.message.Message (cached), or None without a reply."""
+        if self._message is None and self.wire is not None:
+            self._message = dns.message.from_wire(self.wire)
+        return self._message
+
+
+class _Pending:
+    __slots__ = ('qid', 'wire', 'question', 'nameservers', 'port', 'attempt', 'attempts',
+                 'attempt_timeout', 'timer', 'future', 'started', 'slot')
+
+    def __init__(self, qid, wire, question, nameservers, port, attempts, attempt_timeout, future, slot):
+        self.qid = qid
+        self.wire = wire
+        self.question = question
+        self.nameservers = nameservers
+        self.port = port
+        self.attempt = 0
+        self.attempts = attempts
+        self.attempt_timeout = attempt_timeout
+        self.timer = None
+        self.future = future
+        self.started = time.perf_counter()
+        self.slot = slot
+
+    @property
+    def nameserver(self) -> str:
+        return self.nameservers[self.attempt % len(self.nameservers)]
+
+
+class _SocketSlot:
+    """One non-blocking UDP socket and the queries waiting for replies on it, by ID."""
+
+    __slots__ = ('family', 'sock', 'pending', 'queries', 'retired')
+
+    def __init__(self, family: int):
+        self.family = family
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        # Room for a burst of replies between two event loop iterations
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        self.sock.bind(("::", 0) if family == socket.AF_INET6 else ("0.0.0.0", 0))
+        self.pending: Dict[int, _Pending] = {}
+        self.queries = 0
+        self.retired = False
+
+
+class DNSFanout:
+    """Sends many independent DNS queries over a small pool of UDP sockets."""
+
+    def __init__(self, sockets: Optional[int] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None, max_inflight: Optional[int] = None,
+                 rotate_after: Optional[int] = None):
+        self.sockets = sockets or DNS_FANOUT_CONFIG['sockets']
+        self.rotate_after = rotate_after or DNS_FANOUT_CONFIG['rotate_after']
+        self.timeout = DNS_FANOUT_CONFIG['timeout'] if timeout is None else timeout
+        self.retries = DNS_FANOUT_CONFIG['retries'] if retries is None else retries
+        self.max_inflight = max_inflight or DNS_FANOUT_CONFIG['max_inflight']
+        self._slots: Dict[int, List[_SocketSlot]] = {}
+        self._retired: List[_SocketSlot] = []  # Replaced, still waiting for replies
+        self._next_slot = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._nameservers: Dict[Tuple[str, ...], List[str]] = {}
+        self._rdtypes: Dict[str, int] = {}
+        self.sent = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.unmatched = 0
+        self.tcp_fallbacks = 0
+        self.rotations = 0
+
+    def _bind(self):
+        """(Re)bind to the running loop; sockets registered with another loop are dropped."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self.close()
+            self._loop = loop
+            self._active = 0
+            self._waiters.clear()
+        return loop
+
+    async def _admit(self):
+        """
+        Wait for one of max_inflight slots.
+
+        A FIFO of futures rather than asyncio.Semaphore, whose release
+        walks every waiter - quadratic with thousands queued.
+        """
+        if self._active < self.max_inflight and not self._waiters:
+            self._active += 1
+            return
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def _open_slot(self, family: int) -> _SocketSlot:
+        slot = _SocketSlot(family)
+        self._loop.add_reader(slot.sock.fileno(), self._on_readable, slot)
+        return slot
+
+    def _close_slot(self, slot: _SocketSlot):
+        try:
+            self._loop.remove_reader(slot.sock.fileno())
+        except Exception:
+            pass
+        slot.sock.close()
+
+    def _slot(self, family: int) -> _SocketSlot:
+        slots = self._slots.get(family)
+        if slots is None:
+            slots = self._slots[family] = [self._open_slot(family) for _ in range(self.sockets)]
+        self._next_slot += 1
+        index = self._next_slot % len(slots)
+        slot = slots[index]
+        if slot.queries >= self.rotate_after:
+            # New queries go out from a fresh port; the old socket stays open for its replies
+            old, slot = slot, self._open_slot(family)
+            slots[index] = slot
+            old.retired = True
+            if old.pending:
+                self._retired.append(old)
+            else:
+                self._close_slot(old)
+            self.rotations += 1
+        slot.queries += 1
+        return slot
+
+    def _question(self, qname: str, rdtype: str) -> bytes:
+        rdtype_value = self._rdtypes.get(rdtype)
+        if rdtype_value is None:
+            rdtype_value = self._rdtypes[rdtype] = dns.rdatatype.from_text(rdtype)
+        if len(qname) < 254 and _PLAIN_NAME.match(qname):
+            labels = qname.rstrip('.').encode('ascii').split(b'.')
+            name = b"".join(bytes((len(label),)) + label for label in labels) + b"\0"
+        else:
+            name = dns.name.from_text(qname).to_wire()
+        return name + _QUESTION_TAIL.pack(rdtype_value, _IN)
+
+    def _normalized(self, nameservers: Sequence[str]) -> List[str]:
+        key = tuple(nameservers)
+        normalized = self._nameservers.get(key)
+        if normalized is None:
+            normalized = [ipaddress.ip_address(ns).compressed for ns in nameservers]
+            if len(self._nameservers) < 1024:
+                self._nameservers[key] = normalized
+        return normalized
+
+    async def query(self, qname: str, rdtype: str, nameservers: Sequence[str],
+                    port: int = 53, timeout: Optional[float] = None, dnssec: bool = False) -> DNSReply:
+        """
+        Ask nameservers (recursion desired) for qname/rdtype.
+
+        dnssec sets the DO and AD bits, asking a validating resolver to
+        report whether it validated the answer.
+
+        Retransmits rotate through nameservers. Failures come back as a
+        DNSReply with error set ("timeout", or the socket error), never
+        as an exception.
+        """
+        loop = self._bind()
+        nameservers = self._normalized(nameservers)
+        question = self._question(qname, rdtype.upper())
+        timeout = self.timeout if timeout is None else timeout
+
+        await self._admit()
+        try:
+            # The ID is filled in by _register() once a socket is chosen
+            if dnssec:
+                wire = _HEADER.pack(0, _RD | _AD, 1, 0, 0, 1) + question + _OPT_DO
+            else:
+                wire = _HEADER.pack(0, _RD, 1, 0, 0, 0) + question
+            pending = _Pending(
+                0, wire, question.lower(), nameservers, port, self.retries + 1,
+                timeout / (self.retries + 1), loop.create_future(), None
+            )
+            self._send(pending)
+            try:
+                reply = await pending.future
+            finally:
+                self._forget(pending)
+                pending.timer.cancel()
+        finally:
+            self._release()
+
+        if reply.truncated:
+            return await self._tcp_fallback(pending, timeout)
+        return reply
+
+    def _register(self, pending: _Pending):
+        """Put pending on a socket of its current nameserver's address family, under a fresh ID."""
+        family = socket.AF_INET6 if ':' in pending.nameserver else socket.AF_INET
+        if pending.slot is not None:
+            if pending.slot.family == family:
+                return
+            # Retransmit to a nameserver of the other family
+            self._forget(pending)
+        slot = self._slot(family)
+        qid = random.getrandbits(16)
+        while qid in slot.pending:
+            qid = random.getrandbits(16)
+        pending.slot = slot
+        pending.qid = qid
+        pending.wire = qid.to_bytes(2, 'big') + pending.wire[2:]
+        slot.pending[qid] = pending
+
+    def _forget(self, pending: _Pending):
+        slot = pending.slot
+        if slot is None:
+            return
+        slot.pending.pop(pending.qid, None)
+        if slot.retired and not slot.pending and slot in self._retired:
+            self._retired.remove(slot)
+            self._close_slot(slot)
+
+    def _send(self, pending: _Pending):
+        try:
+            self._register(pending)
+            pending.slot.sock.sendto(pending.wire, (pending.nameserver, pending.port))
+            self.sent += 1
+        except (BlockingIOError, InterruptedError):
+            # Socket buffer full: the timer retransmits it like a lost packet
+            pass
+        except OSError as e:
+            if not pending.future.done():
+                pending.future.set_result(DNSReply(error=str(e), nameserver=pending.nameserver))
+        pending.timer = self._loop.call_later(pending.attempt_timeout, self._expired, pending)
+
+    def _expired(self, pending: _Pending):
+        if pending.future.done():
+            return
+        pending.attempt += 1
+        if pending.attempt >= pending.attempts:
+            self.timeouts += 1
+            pending.future.set_result(DNSReply(error="timeout"))
+            return
+        self.retransmits += 1
+        self._send(pending)
+
+    def _on_readable(self, slot: _SocketSlot):
+        recvfrom = slot.sock.recvfrom
+        size = DNS_FANOUT_CONFIG['recv_size']
+        while True:
+            try:
+                data, addr = recvfrom(size)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # Linux reports ICMP errors from earlier sends here; the query times out instead
+                continue
+            if len(data) < _HEADER_SIZE or not data[2] & 0x80:
+                self.unmatched += 1
+                continue
+            pending = slot.pending.get(data[0] << 8 | data[1])
+            if (pending is None or pending.future.done() or addr[1] != pending.port
+                    or addr[0] not in pending.nameservers
+                    or data[_HEADER_SIZE:_HEADER_SIZE + len(pending.question)].lower() != pending.question):
+                self.unmatched += 1
+                continue
+            latency = round((time.perf_counter() - pending.started) * 1000, 2)
+            pending.future.set_result(DNSReply(data, latency, nameserver=addr[0]))
+
+    async def _tcp_fallback(self, pending: _Pending, timeout: float) -> DNSReply:
+        self.tcp_fallbacks += 1
+        # The UDP query as sent, so the RD/AD flags and the EDNS DO bit carry over
+        query = dns.message.from_wire(pending.wire)
+        remaining = max(timeout - (time.perf_counter() - pending.started), 0.1)
+        nameserver = pending.nameserver
+        try:
+            response = await dns.asyncquery.tcp(query, nameserver, timeout=remaining, port=pending.port)
+        except dns.exception.Timeout:
+            return DNSReply(transport="tcp", error="timeout", nameserver=nameserver)
+        except Exception as e:
+            return DNSReply(transport="tcp", error=str(e), nameserver=nameserver)
+        reply = DNSReply(response.to_wire(), round((time.perf_counter() - pending.started) * 1000, 2),
+                         transport="tcp", nameserver=nameserver)
+        reply._message = response
+        return reply
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sockets': sum(len(slots) for slots in self._slots.values()),
+            'pending': sum(len(slot.pending) for slots in self._slots.values() for slot in slots),
+            'sent': self.sent,
+            'retransmits': self.retransmits,
+            'timeouts': self.timeouts,
+            'unmatched_replies': self.unmatched,
+            'tcp_fallbacks': self.tcp_fallbacks,
+            'socket_rotations': self.rotations
+        }
+
+    def close(self):
+        for slot in [slot for slots in self._slots.values() for slot in slots] + self._retired:
+            for pending in slot.pending.values():
+                if pending.timer is not None:
+                    pending.timer.cancel()
+                if not pending.future.done():
+                    pending.future.cancel()
+            self._close_slot(slot)
+        self._slots.clear()
+        self._retired.clear()
+
+
+_engine: Optional[DNSFanout] = None
+
+
+def fanout_engine() -> DNSFanout:
+    """The process-wide engine, created on first use."""
+    global _engine
+    if _engine is None:
+        _engine = DNSFanout()
+    return _engine
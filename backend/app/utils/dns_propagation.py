@@ -0,0 +1,189 @@
+"""
+DNS propagation check across many public resolvers.
+
+After a record changes, resolvers keep serving the old answer until
+their cached copy expires. check_propagation() asks every configured
+resolver the same question at once - all through the shared DNSFanout
+engine's small socket pool - and returns:
+
+  * a matrix row per resolver: status, answer values, TTL, latency and
+    whether the reply needed TCP
+  * the resolvers grouped by identical (status, answer set), largest
+    group first, so "40 say X, 3 still say Y" is visible at a glance
+  * the share of responding resolvers that agree with the expected value
+    (or with the majority when none is given)
+
+The resolver list defaults to PROPAGATION_RESOLVERS; set
+DNS_PROPAGATION_RESOLVERS to a JSON file of the same entries to replace it.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from app.utils.dns_fanout import DNSFanout, fanout_engine
+from app.utils.lazy import lazy_import
+
+dns = lazy_import("dns", "dns.rcode", "dns.rdatatype")
+
+logger = logging.getLogger(__name__)
+
+DNS_PROPAGATION_CONFIG = {
+    'timeout': 3.0,   # Seconds per resolver, retransmits included
+    'resolvers_file': os.getenv("DNS_PROPAGATION_RESOLVERS")
+}
+
+PROPAGATION_RESOLVERS: List[Dict[str, Any]] = [
+    {"name": "Google", "address": "8.8.8.8", "country": "US"},
+    {"name": "Google (secondary)", "address": "8.8.4.4", "country": "US"},
+    {"name": "Cloudflare", "address": "1.1.1.1", "country": "US"},
+    {"name": "Cloudflare (secondary)", "address": "1.0.0.1", "country": "US"},
+    {"name": "Cloudflare for Families", "address": "1.1.1.2", "country": "US"},
+    {"name": "Quad9", "address": "9.9.9.9", "country": "CH"},
+    {"name": "Quad9 (secondary)", "address": "149.112.112.112", "country": "CH"},
+    {"name": "Quad9 Unsecured", "address": "9.9.9.10", "country": "CH"},
+    {"name": "OpenDNS", "address": "208.67.222.222", "country": "US"},
+    {"name": "OpenDNS (secondary)", "address": "208.67.220.220", "country": "US"},
+    {"name": "Level3", "address": "4.2.2.1", "country": "US"},
+    {"name": "Level3 (secondary)", "address": "4.2.2.2", "country": "US"},
+    {"name": "Level3 (tertiary)", "address": "4.2.2.3", "country": "US"},
+    {"name": "Hurricane Electric", "address": "74.82.42.42", "country": "US"},
+    {"name": "Comodo Secure DNS", "address": "8.26.56.26", "country": "US"},
+    {"name": "Comodo Secure DNS (secondary)", "address": "8.20.247.20", "country": "US"},
+    {"name": "UltraDNS Public", "address": "64.6.64.6", "country": "US"},
+    {"name": "UltraDNS", "address": "156.154.70.1", "country": "US"},
+    {"name": "Alternate DNS", "address": "76.76.19.19", "country": "US"},
+    {"name": "Control D", "address": "76.76.2.0", "country": "CA"},
+    {"name": "Control D (secondary)", "address": "76.76.10.0", "country": "CA"},
+    {"name": "CIRA Canadian Shield", "address": "149.112.121.10", "country": "CA"},
+    {"name": "CIRA Canadian Shield (secondary)", "address": "149.112.122.10", "country": "CA"},
+    {"name": "AdGuard DNS", "address": "94.140.14.14", "country": "CY"},
+    {"name": "AdGuard DNS (secondary)", "address": "94.140.15.15", "country": "CY"},
+    {"name": "CleanBrowsing", "address": "185.228.168.9", "country": "US"},
+    {"name": "DNS.WATCH", "address": "84.200.69.80", "country": "DE"},
+    {"name": "DNS.WATCH (secondary)", "address": "84.200.70.40", "country": "DE"},
+    {"name": "Freifunk München", "address": "5.1.66.255", "country": "DE"},
+    {"name": "DNS0.eu", "address": "193.110.81.0", "country": "FR"},
+    {"name": "DNS0.eu (secondary)", "address": "185.253.5.0", "country": "FR"},
+    {"name": "FDN", "address": "80.67.169.12", "country": "FR"},
+    {"name": "UncensoredDNS", "address": "91.239.100.100", "country": "DK"},
+    {"name": "Mullvad", "address": "194.242.2.2", "country": "SE"},
+    {"name": "puntCAT", "address": "109.69.8.51", "country": "ES"},
+    {"name": "Yandex", "address": "77.88.8.8", "country": "RU"},
+    {"name": "Yandex (secondary)", "address": "77.88.8.1", "country": "RU"},
+    {"name": "114DNS", "address": "114.114.114.114", "country": "CN"},
+    {"name": "AliDNS", "address": "223.5.5.5", "country": "CN"},
+    {"name": "AliDNS (secondary)", "address": "223.6.6.6", "country": "CN"},
+    {"name": "DNSPod", "address": "119.29.29.29", "country": "CN"},
+    {"name": "Baidu DNS", "address": "180.76.76.76", "country": "CN"},
+    {"name": "Quad101", "address": "101.101.101.101", "country": "TW"},
+    {"name": "KT", "address": "168.126.63.1", "country": "KR"}
+]
+
+_resolvers: Optional[List[Dict[str, Any]]] = None
+
+
+def propagation_resolvers() -> List[Dict[str, Any]]:
+    """The configured resolver list, read from DNS_PROPAGATION_RESOLVERS on first use if set."""
+    global _resolvers
+    if _resolvers is None:
+        path = DNS_PROPAGATION_CONFIG['resolvers_file']
+        if path:
+            with open(path) as f:
+                _resolvers = json.load(f)
+            logger.info(f"Loaded {len(_resolvers)} propagation resolvers from {path}")
+        else:
+            _resolvers = PROPAGATION_RESOLVERS
+    return _resolvers
+
+
+def _row(resolver: Dict[str, Any], result, rdtype: int) -> Dict[str, Any]:
+    row = {
+        'name': resolver['name'],
+        'address': resolver['address'],
+        'country': resolver.get('country'),
+        'status': None,
+        'values': [],
+        'ttl': None,
+        'latency_ms': result.latency_ms,
+        'transport': result.transport,
+        'error': result.error
+    }
+    response = result.message()
+    if response is None:
+        row['status'] = "TIMEOUT" if result.error == "timeout" else "ERROR"
+        return row
+
+    rcode = response.rcode()
+    rrsets = [rrset for rrset in response.answer if rrset.rdtype == rdtype]
+    if rcode != dns.rcode.NOERROR:
+        row['status'] = dns.rcode.to_text(rcode)
+    elif not rrsets:
+        row['status'] = "NODATA"
+    else:
+        row['status'] = "NOERROR"
+        row['values'] = sorted({rdata.to_text() for rrset in rrsets for rdata in rrset})
+        row['ttl'] = min(rrset.ttl for rrset in rrsets)
+    return row
+
+
+def group_answers(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Resolvers that responded, grouped by identical (status, values), largest group first."""
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        if row['status'] in ("TIMEOUT", "ERROR"):
+            continue
+        key = (row['status'], tuple(row['values']))
+        group = groups.setdefault(key, {'status': row['status'], 'values': row['values'], 'resolvers': []})
+        group['resolvers'].append(row['name'])
+    ordered = sorted(groups.values(), key=lambda group: len(group['resolvers']), reverse=True)
+    for group in ordered:
+        group['count'] = len(group['resolvers'])
+    return ordered
+
+
+async def check_propagation(name: str, rdtype: str = "A", resolvers: Optional[List[Dict[str, Any]]] = None,
+                            expected: Optional[str] = None, client: Optional[DNSFanout] = None) -> Dict[str, Any]:
+    """
+    Query every resolver for name/rdtype concurrently and compare their answers.
+
+    Resolver entries are {"name", "address", optional "port" and "country"}.
+    expected, if given, is one answer value (e.g. the new A address); a
+    resolver counts as propagated when its answer contains it.
+    """
+    resolvers = propagation_resolvers() if resolvers is None else resolvers
+    rdtype = rdtype.upper()
+    rdtype_value = dns.rdatatype.from_text(rdtype)
+    client = client or fanout_engine()
+    results = await asyncio.gather(*(
+        client.query(name, rdtype, [resolver['address']], port=resolver.get('port', 53),
+                     timeout=DNS_PROPAGATION_CONFIG['timeout'])
+        for resolver in resolvers
+    ))
+
+    rows = [_row(resolver, result, rdtype_value) for resolver, result in zip(resolvers, results)]
+    groups = group_answers(rows)
+    responding = sum(group['count'] for group in groups)
+
+    if expected is not None:
+        expected_value = expected.strip().lower().rstrip('.')
+        agreeing = sum(
+            1 for row in rows
+            if any(value.lower().rstrip('.').strip('"') == expected_value for value in row['values'])
+        )
+    else:
+        agreeing = groups[0]['count'] if groups else 0
+
+    return {
+        'domain': name,
+        'record_type': rdtype,
+        'expected': expected,
+        'resolvers': rows,
+        'groups': groups,
+        'consistent': len(groups) == 1,
+        'responding': responding,
+        'total': len(rows),
+        'propagated_percent': round(agreeing / responding * 100, 1) if responding else 0.0
+    }
@@ -0,0 +1,199 @@
+"""
+Reverse-DNS sweeps over address ranges.
+
+sweep_ptr() resolves the PTR record of every address in a range - a /24,
+or a slice of a /64 - and yields one row per address, in address order:
+
+  * lookups go through the raw UDP fan-out engine, at most `concurrency`
+    at once, and at most `rate` per second to any one resolver; the rate
+    is shared by every sweep in the process, so parallel sweeps can't
+    add up to a flood
+  * rows that finish early wait in a ReorderBuffer until every address
+    before them is done. Workers never start more than `window` addresses
+    ahead of the reader, so an unanswered address or a slow client caps
+    the memory held instead of growing it
+  * answers go through their own PTR cache: a large sweep can't evict the
+    shared DNS cache, and re-sweeping a range only asks for what expired
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional, Union
+
+from app.utils.dns_cache import DNSCache, NOERROR, cache_key, get_resolver, resolve, resolver_key
+from app.utils.lazy import lazy_import
+from app.utils.rate_limit import GCRALimiter
+
+dns = lazy_import("dns", "dns.exception", "dns.reversename")
+
+logger = logging.getLogger(__name__)
+
+REVERSE_SWEEP_CONFIG = {
+    'max_addresses': int(os.getenv("DNS_SWEEP_MAX_ADDRESSES", "4096")),  # Per sweep
+    'concurrency': int(os.getenv("DNS_SWEEP_CONCURRENCY", "64")),
+    'window': 512,      # Addresses workers may run ahead of the reader
+    'rate': int(os.getenv("DNS_SWEEP_RATE", "200")),  # PTR queries per second per resolver
+    'lifetime': 4.0,    # Seconds per lookup, retransmits included
+    'cache_entries': 200_000
+}
+
+SWEEP_FIELDS = ["ip", "hostname", "hostnames", "status", "ttl", "cached", "error"]
+
+ptr_cache = DNSCache(max_entries=REVERSE_SWEEP_CONFIG['cache_entries'])
+
+# One schedule per resolver; a one-second window allows a burst of `rate`
+_pacer = GCRALimiter([(1.0, REVERSE_SWEEP_CONFIG['rate'])], max_clients=1000)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class SweepRange(NamedTuple):
+    """`count` consecutive addresses of network, starting `offset` addresses in."""
+    network: IPNetwork
+    offset: int
+    count: int
+
+    def __len__(self) -> int:
+        return self.count
+
+    def address(self, index: int):
+        return self.network.network_address + self.offset + index
+
+    @property
+    def next_offset(self) -> Optional[int]:
+        """Where the next slice starts, or None if this one reaches the end of the network."""
+        end = self.offset + self.count
+        return end if end < self.network.num_addresses else None
+
+
+def sweep_range(cidr: str, offset: int = 0, limit: Optional[int] = None) -> SweepRange:
+    """
+    Parse a CIDR block into the slice of it to sweep.
+
+    Host bits are ignored ("192.0.2.77/24" is 192.0.2.0/24). Without a
+    limit the slice runs to the end of the network, up to max_addresses;
+    larger networks (a /64) are swept a slice at a time via offset.
+    """
+    network = ipaddress.ip_network(cidr.strip(), strict=False)
+    maximum = REVERSE_SWEEP_CONFIG['max_addresses']
+    if not 0 <= offset < network.num_addresses:
+        raise ValueError(f"Offset {offset} is outside {network}")
+    if limit is not None and not 0 < limit <= maximum:
+        raise ValueError(f"Limit must be between 1 and {maximum}")
+    count = min(network.num_addresses - offset, limit or maximum)
+    return SweepRange(network, offset, count)
+
+
+class ReorderBuffer:
+    """
+    Hands items to the reader in index order, whatever order they complete in.
+
+    Writers reserve() an index before starting on it and wait while it is
+    `window` or more ahead of the next index the reader needs.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.next_index = 0
+        self.high_water = 0  # Most items held at once
+        self._ready: Dict[int, Any] = {}
+        self._changed = asyncio.Condition()
+
+    async def reserve(self, index: int):
+        async with self._changed:
+            await self._changed.wait_for(lambda: index < self.next_index + self.window)
+
+    async def put(self, index: int, item: Any):
+        async with self._changed:
+            self._ready[index] = item
+            self.high_water = max(self.high_water, len(self._ready))
+            self._changed.notify_all()
+
+    async def get(self) -> Any:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.next_index in self._ready)
+            item = self._ready.pop(self.next_index)
+            self.next_index += 1
+            self._changed.notify_all()
+            return item
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+
+def _row(ip: str, status: str, hostnames=(), ttl: Optional[int] = None, cached: bool = False,
+         error: Optional[str] = None) -> Dict[str, Any]:
+    hostnames = sorted(str(name).rstrip('.') for name in hostnames)
+    return {
+        "ip": ip, "hostname": hostnames[0] if hostnames else None, "hostnames": hostnames,
+        "status": status, "ttl": ttl, "cached": cached, "error": error
+    }
+
+
+async def _pace(key: str):
+    """Wait for the resolver's next query slot."""
+    while True:
+        allowed, retry_after = _pacer.hit(key)
+        if allowed:
+            return
+        await asyncio.sleep(retry_after)
+
+
+async def lookup_ptr(address, resolver=None) -> Dict[str, Any]:
+    """
+    PTR lookup for one address as a sweep row.
+
+    Status is "success", "no_record" (NXDOMAIN or no PTR), "timeout" or
+    "error". Cached answers skip the rate limit.
+    """
+    resolver = resolver or get_resolver()
+    ip = str(address)
+    name = dns.reversename.from_address(ip)
+    if cache_key(name, "PTR", resolver) not in ptr_cache:
+        await _pace(resolver_key(resolver))
+    try:
+        answer = await resolve(name, "PTR", resolver, lifetime=REVERSE_SWEEP_CONFIG['lifetime'],
+                               transport="fanout", cache=ptr_cache)
+    except dns.exception.Timeout:
+        return _row(ip, "timeout", error="Query timed out")
+    except dns.exception.DNSException as e:
+        return _row(ip, "error", error=str(e))
+
+    status = "success" if answer.status == NOERROR else "no_record"
+    return _row(ip, status, answer, ttl=answer.remaining(), cached=answer.from_cache)
+
+
+async def sweep_ptr(addresses: SweepRange, resolver=None, concurrency: Optional[int] = None,
+                    window: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield lookup_ptr() rows for every address, in address order.
+
+    Closing the iterator early (e.g. the client disconnected) cancels the
+    lookups still in flight.
+    """
+    concurrency = concurrency or REVERSE_SWEEP_CONFIG['concurrency']
+    buffer = ReorderBuffer(max(window or REVERSE_SWEEP_CONFIG['window'], concurrency))
+    # Shared by all workers, so indexes are claimed once each, in order
+    indexes = iter(range(len(addresses)))
+
+    async def worker():
+        for index in indexes:
+            await buffer.reserve(index)
+            address = addresses.address(index)
+            try:
+                row = await lookup_ptr(address, resolver)
+            except Exception as e:
+                logger.warning(f"Reverse DNS sweep lookup for {address} failed: {e}")
+                row = _row(str(address), "error", error=str(e))
+            await buffer.put(index, row)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(addresses)))]
+    try:
+        for _ in range(len(addresses)):
+            yield await buffer.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
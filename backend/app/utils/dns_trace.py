@@ -0,0 +1,274 @@
+"""
+Iterative, root-down DNS resolution for tracing the delegation path.
+
+A recursive resolver hides the path it took. IterativeTracer walks it
+itself, the way `dig +trace` does:
+
+  1. start at the root hints - or at the deepest zone cut already in the
+     DelegationCache for the name
+  2. send the non-recursive query to several of that zone's nameservers
+     in parallel, timing each one
+  3. take the fastest usable response; a referral (NS records for a
+     deeper zone in the authority section) names the next zone and its
+     nameservers, with glue addresses from the additional section
+  4. repeat until a server answers authoritatively, says the name
+     doesn't exist, or the walk fails
+
+Every referral is cached for its NS TTL, so later traces - of the same
+name or a sibling - skip the hops above the deepest known cut.
+Nameservers delegated without glue are looked up through the shared
+recursive resolver rather than by a nested iterative walk.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.utils.dns_cache import resolve, NOERROR
+from app.utils.lazy import lazy_import
+
+dns = lazy_import(
+    "dns", "dns.asyncquery", "dns.exception", "dns.flags", "dns.message", "dns.name", "dns.rcode", "dns.rdatatype"
+)
+
+logger = logging.getLogger(__name__)
+
+DNS_TRACE_CONFIG = {
+    'timeout': 2.0,        # Seconds per nameserver query
+    'max_servers': 3,      # Nameservers queried in parallel per hop
+    'max_hops': 16,        # Referrals followed before giving up
+    'max_ttl': 86400,      # Ceiling for cached delegations
+    'max_delegations': 10_000
+}
+
+# IANA root hints (https://www.internic.net/domain/named.root), IPv4 addresses
+ROOT_HINTS: List[Tuple[str, str]] = [
+    ("a.root-servers.net.", "198.41.0.4"),
+    ("b.root-servers.net.", "170.247.170.2"),
+    ("c.root-servers.net.", "192.33.4.12"),
+    ("d.root-servers.net.", "199.7.91.13"),
+    ("e.root-servers.net.", "192.203.230.10"),
+    ("f.root-servers.net.", "192.5.5.241"),
+    ("g.root-servers.net.", "192.112.36.4"),
+    ("h.root-servers.net.", "198.97.190.53"),
+    ("i.root-servers.net.", "192.36.148.17"),
+    ("j.root-servers.net.", "192.58.128.30"),
+    ("k.root-servers.net.", "193.0.14.129"),
+    ("l.root-servers.net.", "199.7.83.42"),
+    ("m.root-servers.net.", "202.12.27.33")
+]
+
+Nameservers = List[Tuple[str, Optional[str]]]
+
+
+class DelegationCache:
+    """Zone cuts learned from referrals: zone -> nameservers (name, address), until the NS TTL runs out."""
+
+    def __init__(self, max_entries: int = DNS_TRACE_CONFIG['max_delegations']):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Nameservers, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, zone: str, nameservers: Nameservers, ttl: int, now: Optional[float] = None):
+        ttl = min(ttl, DNS_TRACE_CONFIG['max_ttl'])
+        if ttl <= 0 or not nameservers:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries.pop(zone, None)
+            self._entries[zone] = (list(nameservers), now + ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def closest(self, name: str, now: Optional[float] = None) -> Optional[Tuple[str, Nameservers, int]]:
+        """Deepest unexpired cut enclosing name, as (zone, nameservers, remaining TTL)."""
+        now = time.monotonic() if now is None else now
+        labels = name.lower().rstrip('.').split('.')
+        with self._lock:
+            for i in range(len(labels)):
+                zone = '.'.join(labels[i:]) + '.'
+                entry = self._entries.get(zone)
+                if entry is None:
+                    continue
+                nameservers, expires_at = entry
+                if expires_at <= now:
+                    del self._entries[zone]
+                    continue
+                self._entries.move_to_end(zone)
+                self.hits += 1
+                return zone, list(nameservers), int(expires_at - now)
+            self.misses += 1
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {'zones': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class IterativeTracer:
+    """Follows referrals from the root (or the deepest cached cut) down to the authoritative answer."""
+
+    def __init__(self, root_hints: Sequence[Tuple[str, str]] = ROOT_HINTS, port: int = 53,
+                 cache: Optional[DelegationCache] = None):
+        self.root_hints = list(root_hints)
+        self.port = port
+        self.cache = cache if cache is not None else DelegationCache()
+
+    async def trace(self, name: str, rdtype: str = "A") -> Dict[str, Any]:
+        qname = dns.name.from_text(name)
+        rdtype = rdtype.upper()
+        start = time.perf_counter()
+
+        cut = self.cache.closest(qname.to_text())
+        if cut is not None:
+            zone, nameservers, _ = cut
+        else:
+            zone, nameservers = ".", list(self.root_hints)
+        started_from = {'zone': zone, 'cached': cut is not None}
+
+        hops = []
+        status, answer = "ERROR", []
+        for _ in range(DNS_TRACE_CONFIG['max_hops']):
+            servers = await self._addresses(nameservers)
+            if not servers:
+                hops.append({'zone': zone, 'servers': [], 'result': 'error',
+                             'error': "No nameserver addresses for zone"})
+                break
+
+            results = await asyncio.gather(*(self._query(qname, rdtype, server) for server in servers))
+            hop: Dict[str, Any] = {
+                'zone': zone,
+                'servers': [result for result, _ in results],
+                'referral': None,
+                'answer': []
+            }
+            hops.append(hop)
+
+            usable = sorted(
+                (result for result in results if result[1] is not None),
+                key=lambda result: result[0]['latency_ms']
+            )
+            if not usable:
+                hop['result'] = 'error'
+                hop['error'] = "No nameserver for the zone gave a usable response"
+                break
+            fastest, response = usable[0]
+            hop['responder'] = fastest['address']
+            hop['latency_ms'] = fastest['latency_ms']
+
+            referral = self._referral(response, qname, zone)
+            if referral is not None:
+                zone, nameservers, ttl = referral
+                self.cache.put(zone, nameservers, ttl)
+                hop['result'] = 'referral'
+                hop['referral'] = {
+                    'zone': zone,
+                    'nameservers': [ns for ns, _ in nameservers],
+                    'glue': [address for _, address in nameservers if address],
+                    'ttl': ttl
+                }
+                continue
+
+            if not response.answer and response.rcode() == dns.rcode.NOERROR and not response.flags & dns.flags.AA \
+                    and any(rrset.rdtype == dns.rdatatype.NS for rrset in response.authority):
+                hop['result'] = 'error'
+                hop['error'] = "Lame delegation: referral that leads no deeper"
+                break
+
+            answer = [rrset.to_text() for rrset in response.answer]
+            hop['answer'] = answer
+            if response.rcode() == dns.rcode.NXDOMAIN:
+                status = "NXDOMAIN"
+            elif response.answer:
+                status = NOERROR
+            else:
+                status = "NODATA"
+            hop['result'] = status.lower() if status != NOERROR else 'answer'
+            hop['authoritative'] = bool(response.flags & dns.flags.AA)
+            break
+        else:
+            hops[-1]['error'] = "Too many referrals"
+
+        return {
+            'domain': qname.to_text(),
+            'record_type': rdtype,
+            'status': status,
+            'answer': answer,
+            'started_from': started_from,
+            'hops': hops,
+            'total_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    async def _addresses(self, nameservers: Nameservers) -> List[Tuple[str, str]]:
+        """Up to max_servers (name, address) pairs, resolving glueless nameservers if needed."""
+        with_glue = [(name, address) for name, address in nameservers if address]
+        random.shuffle(with_glue)
+        servers = with_glue[:DNS_TRACE_CONFIG['max_servers']]
+        if servers:
+            return servers
+        for name, _ in nameservers[:DNS_TRACE_CONFIG['max_servers']]:
+            try:
+                answer = await resolve(name, "A", lifetime=DNS_TRACE_CONFIG['timeout'])
+            except Exception as e:
+                logger.debug(f"Could not resolve glueless nameserver {name}: {e}")
+                continue
+            servers.extend((name, str(rdata)) for rdata in answer)
+        return servers[:DNS_TRACE_CONFIG['max_servers']]
+
+    async def _query(self, qname, rdtype: str, server: Tuple[str, str]):
+        """One non-recursive query; returns (server report, response or None)."""
+        name, address = server
+        query = dns.message.make_query(qname, rdtype)
+        query.flags &= ~dns.flags.RD
+        report: Dict[str, Any] = {'name': name, 'address': address, 'latency_ms': None, 'rcode': None, 'error': None}
+        start = time.perf_counter()
+        try:
+            response, _ = await dns.asyncquery.udp_with_fallback(
+                query, address, timeout=DNS_TRACE_CONFIG['timeout'], port=self.port
+            )
+        except dns.exception.Timeout:
+            report['error'] = "timeout"
+            return report, None
+        except Exception as e:
+            report['error'] = str(e)
+            return report, None
+        report['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        report['rcode'] = dns.rcode.to_text(response.rcode())
+        if response.rcode() not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+            return report, None
+        return report, response
+
+    @staticmethod
+    def _referral(response, qname, zone: str) -> Optional[Tuple[str, Nameservers, int]]:
+        """(zone, nameservers, ttl) if response delegates qname to a zone below the current one."""
+        if response.answer or response.rcode() != dns.rcode.NOERROR:
+            return None
+        current = dns.name.from_text(zone)
+        for rrset in response.authority:
+            if rrset.rdtype != dns.rdatatype.NS:
+                continue
+            # A cut that isn't strictly deeper would loop (or is a lame "upward" referral)
+            if rrset.name == current or not rrset.name.is_subdomain(current) or not qname.is_subdomain(rrset.name):
+                continue
+            glue = {}
+            for additional in response.additional:
+                if additional.rdtype == dns.rdatatype.A and len(additional):
+                    glue.setdefault(additional.name, str(additional[0]))
+            nameservers = sorted((ns.target.to_text(), glue.get(ns.target)) for ns in rrset)
+            return rrset.name.to_text(), nameservers, rrset.ttl
+        return None
+
+
+delegation_cache = DelegationCache()
+dns_tracer = IterativeTracer(cache=delegation_cache)
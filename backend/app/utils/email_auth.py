@@ -0,0 +1,535 @@
+"""
+SPF, DMARC and DKIM checks for a domain.
+
+SPF (RFC 7208) is walked as a tree: a record's include: and redirect=
+targets, and the hosts behind its a and mx mechanisms, are all looked up
+concurrently, then the next level starts. Records and addresses are
+memoized per check, so an include shared by several branches (such as
+_spf.google.com) is fetched once, and the shared DNS cache sits behind
+that. Lookups are still counted per occurrence, the way a receiver
+evaluating the record would count them:
+
+  * more than 10 DNS-querying terms (include, a, mx, ptr, exists,
+    redirect) or more than 2 void lookups is a permerror
+  * the walk stops following includes well past the limit, so a
+    pathological tree can't make us send unbounded queries
+
+The tree is flattened to the CIDR sets that get an SPF pass, honouring
+term order: addresses matched by an earlier term (say -ip4:) are never
+passed by a later one. ptr, exists and macro terms depend on the
+connecting host and can't be flattened; they are listed instead.
+
+DMARC (RFC 7489) and DKIM (RFC 6376) records are parsed into their tags,
+with warnings for the common mistakes.
+"""
+
+import asyncio
+import base64
+import ipaddress
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.dns_cache import NOERROR, resolve
+from app.utils.lazy import lazy_import
+
+dns = lazy_import("dns", "dns.exception")
+
+logger = logging.getLogger(__name__)
+
+EMAIL_AUTH_CONFIG = {
+    'lookup_limit': 10,       # RFC 7208 4.6.4: DNS-querying terms per evaluation
+    'void_lookup_limit': 2,   # Lookups answered NXDOMAIN or empty
+    'mx_limit': 10,           # MX hosts per mx mechanism
+    'max_lookups': 40,        # Stop following the tree here, limit or not
+    'timeout': 5.0,
+    'dkim_selectors': [
+        "default", "google", "selector1", "selector2", "k1", "k2", "s1", "s2", "dkim", "mail", "smtp"
+    ],
+    'max_selectors': 20
+}
+
+LOOKUP_TERMS = {"include", "a", "mx", "ptr", "exists", "redirect"}
+
+_TERM = re.compile(
+    r'^(?P<qualifier>[+\-~?]?)(?P<name>[a-z0-9]+)(?::(?P<value>[^/]+))?(?:/(?P<cidr4>\d+))?(?://(?P<cidr6>\d+))?$',
+    re.IGNORECASE
+)
+_MODIFIER = re.compile(r'^(?P<name>[a-z][a-z0-9_.\-]*)=(?P<value>.*)$', re.IGNORECASE)
+
+_EVERYTHING = [ipaddress.ip_network("0.0.0.0/0"), ipaddress.ip_network("::/0")]
+
+
+class SPFError(Exception):
+    """An SPF evaluation error; result is "permerror" or "temperror"."""
+
+    def __init__(self, result: str, message: str):
+        super().__init__(message)
+        self.result = result
+
+
+class SPFTerm(NamedTuple):
+    qualifier: str            # "+", "-", "~" or "?"
+    name: str                 # Mechanism or modifier name, lower case
+    value: Optional[str]
+    cidr4: Optional[int] = None
+    cidr6: Optional[int] = None
+    modifier: bool = False
+
+    @property
+    def flattenable(self) -> bool:
+        return self.name not in ("ptr", "exists") and '%' not in (self.value or "")
+
+
+def is_spf(text: str) -> bool:
+    return text.lower() == "v=spf1" or text.lower().startswith("v=spf1 ")
+
+
+def parse_spf(text: str) -> List[SPFTerm]:
+    """Terms of an SPF record, in order; syntax errors raise a permerror SPFError."""
+    terms = []
+    for token in text.split()[1:]:
+        modifier = _MODIFIER.match(token)
+        if modifier:
+            terms.append(SPFTerm("+", modifier.group("name").lower(), modifier.group("value"), modifier=True))
+            continue
+        match = _TERM.match(token)
+        name = match.group("name").lower() if match else None
+        if name not in ("all", "include", "a", "mx", "ptr", "ip4", "ip6", "exists"):
+            raise SPFError("permerror", f"Unknown SPF term: {token}")
+        value = match.group("value")
+        cidr4 = int(match.group("cidr4")) if match.group("cidr4") else None
+        cidr6 = int(match.group("cidr6")) if match.group("cidr6") else None
+        if name in ("include", "exists") and not value:
+            raise SPFError("permerror", f"{name} needs a domain: {token}")
+        if name in ("ip4", "ip6"):
+            try:
+                network = ipaddress.ip_network(f"{value}/{cidr4}" if cidr4 is not None else value, strict=False)
+            except ValueError:
+                raise SPFError("permerror", f"Invalid address in {token}")
+            if network.version != int(name[-1]):
+                raise SPFError("permerror", f"Wrong address family in {token}")
+            value, cidr4 = str(network), None
+        if (cidr4 is not None and cidr4 > 32) or (cidr6 is not None and cidr6 > 128):
+            raise SPFError("permerror", f"Invalid prefix length in {token}")
+        terms.append(SPFTerm(match.group("qualifier") or "+", name, value, cidr4, cidr6))
+    return terms
+
+
+def _subtract(networks: List[Any], removed: List[Any]) -> List[Any]:
+    """networks minus removed, as a list of networks."""
+    result = list(networks)
+    for cut in removed:
+        remaining = []
+        for network in result:
+            if network.version != cut.version or not network.overlaps(cut):
+                remaining.append(network)
+            elif not network.subnet_of(cut):
+                remaining.extend(network.address_exclude(cut))
+        result = remaining
+    return result
+
+
+def _collapse(networks: List[Any]) -> Dict[str, List[str]]:
+    return {
+        f"ip{version}": [
+            str(network) for network in ipaddress.collapse_addresses(n for n in networks if n.version == version)
+        ]
+        for version in (4, 6)
+    }
+
+
+class SPFEvaluator:
+    """One SPF check: the memoized lookups and counters behind it."""
+
+    def __init__(self):
+        self.walked = 0         # Lookup terms followed so far, across branches
+        self.dns_queries = 0
+        self.memo_hits = 0
+        self._memo: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def _memoized(self, name: str, rdtype: str) -> asyncio.Future:
+        """Shared lookup of name/rdtype; concurrent and later callers await the same one."""
+        key = (name.lower().rstrip('.'), rdtype)
+        future = self._memo.get(key)
+        if future is None:
+            future = self._memo[key] = asyncio.ensure_future(self._lookup(*key))
+        else:
+            self.memo_hits += 1
+        return future
+
+    async def _lookup(self, name: str, rdtype: str) -> Tuple[List[str], bool]:
+        """(values, void) for name/rdtype; timeouts and failures raise a temperror."""
+        self.dns_queries += 1
+        try:
+            answer = await resolve(name, rdtype, lifetime=EMAIL_AUTH_CONFIG['timeout'])
+        except dns.exception.DNSException as e:
+            raise SPFError("temperror", f"{rdtype} lookup for {name} failed: {e or type(e).__name__}")
+        if rdtype == "TXT":
+            values = [b"".join(rdata.strings).decode("utf-8", "replace") for rdata in answer]
+        elif rdtype == "MX":
+            values = [str(rdata.exchange).rstrip('.') for rdata in sorted(answer, key=lambda mx: mx.preference)]
+        else:
+            values = [str(rdata) for rdata in answer]
+        return values, answer.status != NOERROR or not values
+
+    async def spf_record(self, domain: str) -> Tuple[Optional[str], bool]:
+        """The domain's SPF record (None without one) and whether the lookup was void."""
+        records, void = await self._memoized(domain, "TXT")
+        spf = [record for record in records if is_spf(record)]
+        if len(spf) > 1:
+            raise SPFError("permerror", f"{domain} has {len(spf)} SPF records")
+        return (spf[0] if spf else None), void
+
+    async def _networks(self, term: SPFTerm, domain: str) -> Tuple[List[Any], int]:
+        """Networks an a or mx mechanism matches, and its void lookup count."""
+        target = term.value or domain
+        hosts, void = [target], 0
+        if term.name == "mx":
+            hosts, mx_void = await self._memoized(target, "MX")
+            void += mx_void
+            if len(hosts) > EMAIL_AUTH_CONFIG['mx_limit']:
+                raise SPFError("permerror", f"{target} has {len(hosts)} MX hosts (limit {EMAIL_AUTH_CONFIG['mx_limit']})")
+        answers = await asyncio.gather(*(
+            self._memoized(host, rdtype) for host in hosts for rdtype in ("A", "AAAA")
+        ))
+        networks = []
+        for addresses, _ in answers:
+            for address in addresses:
+                prefix = term.cidr4 if ':' not in address else term.cidr6
+                networks.append(ipaddress.ip_network(address if prefix is None else f"{address}/{prefix}", strict=False))
+        if term.name == "a" and all(answer_void for _, answer_void in answers):
+            void += 1
+        return networks, void
+
+    async def evaluate(self, domain: str, path: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        """
+        Evaluate domain's record and everything it references.
+
+        Returns the tree node: the record, subtree lookup counts, child
+        nodes, errors, unflattenable terms and "passes" (the networks
+        that evaluate to pass, before collapsing).
+        """
+        domain = domain.lower().rstrip('.')
+        node = {
+            "domain": domain, "record": None, "lookups": 0, "void_lookups": 0,
+            "includes": [], "redirect": None, "all": None, "unflattenable": [], "error": None, "result": None,
+            "passes": []
+        }
+        try:
+            node["record"], void = await self.spf_record(domain)
+            if node["record"] is None:
+                node["void_lookups"] = int(void)
+                if path:
+                    raise SPFError("permerror", f"{domain} has no SPF record")
+                return node
+            terms = parse_spf(node["record"])
+        except SPFError as e:
+            node["error"], node["result"] = str(e), e.result
+            return node
+
+        # Mechanisms after "all" are never evaluated, and "all" makes redirect= moot
+        mechanisms, redirect, has_all = [], None, False
+        for term in terms:
+            if term.modifier:
+                redirect = term.value if term.name == "redirect" and redirect is None else redirect
+            elif not has_all:
+                mechanisms.append(term)
+                if term.name == "all":
+                    has_all, node["all"] = True, f"{term.qualifier}all"
+        if has_all:
+            redirect = None
+
+        own_lookups = sum(1 for term in mechanisms if term.name in LOOKUP_TERMS) + (redirect is not None)
+        self.walked += own_lookups
+        node["lookups"] = own_lookups
+        node["unflattenable"] = [self._text(term) for term in mechanisms if not term.flattenable]
+        if self.walked > EMAIL_AUTH_CONFIG['max_lookups']:
+            node["error"], node["result"] = "Too many DNS lookups to follow", "permerror"
+            return node
+
+        # Every reference on this level at once
+        def child(target: str):
+            if target.lower().rstrip('.') in path + (domain,):
+                return self._loop(target)
+            return self.evaluate(target, path + (domain,))
+
+        jobs = {}
+        for index, term in enumerate(mechanisms):
+            if term.flattenable and term.name == "include":
+                jobs[index] = child(term.value)
+            elif term.flattenable and term.name in ("a", "mx"):
+                jobs[index] = self._networks(term, domain)
+        if redirect is not None:
+            jobs["redirect"] = child(redirect) if '%' not in redirect else self._unflattenable(redirect)
+        results = dict(zip(jobs, await asyncio.gather(*jobs.values(), return_exceptions=True)))
+
+        decided, passes = [], []
+        for index, term in enumerate(mechanisms):
+            if not term.flattenable:
+                continue
+            networks = []
+            result = results.get(index)
+            if isinstance(result, SPFError):
+                node["error"], node["result"] = str(result), result.result
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            if term.name == "include":
+                node["includes"].append(result)
+                networks = result["passes"]
+            elif term.name in ("a", "mx"):
+                networks, void = result or ([], 0)
+                node["void_lookups"] += void
+            elif term.name in ("ip4", "ip6"):
+                networks = [ipaddress.ip_network(term.value)]
+            elif term.name == "all":
+                networks = _EVERYTHING
+            new = _subtract(networks, decided)
+            if term.qualifier == "+":
+                passes.extend(new)
+            decided.extend(new)
+
+        if redirect is not None:
+            result = results["redirect"]
+            if isinstance(result, BaseException):
+                raise result
+            node["redirect"] = result
+            passes.extend(_subtract(result["passes"], decided))
+
+        for subtree in node["includes"] + ([node["redirect"]] if node["redirect"] else []):
+            node["lookups"] += subtree["lookups"]
+            node["void_lookups"] += subtree["void_lookups"]
+        node["passes"] = passes
+        return node
+
+    async def _loop(self, target: str) -> Dict[str, Any]:
+        return {
+            "domain": target, "record": None, "lookups": 0, "void_lookups": 0, "includes": [], "redirect": None,
+            "all": None, "unflattenable": [], "error": "Include loop", "result": "permerror", "passes": []
+        }
+
+    async def _unflattenable(self, target: str) -> Dict[str, Any]:
+        node = await self._loop(target)
+        node.update(error=None, result=None, unflattenable=[f"redirect={target}"])
+        return node
+
+    @staticmethod
+    def _text(term: SPFTerm) -> str:
+        qualifier = "" if term.qualifier == "+" else term.qualifier
+        return f"{qualifier}{term.name}" + (f":{term.value}" if term.value else "")
+
+
+def _walk(node: Dict[str, Any]):
+    yield node
+    for subtree in node["includes"] + ([node["redirect"]] if node["redirect"] else []):
+        yield from _walk(subtree)
+
+
+def _public(node: Dict[str, Any]) -> Dict[str, Any]:
+    """The tree without the intermediate pass sets."""
+    result = {key: value for key, value in node.items() if key != "passes"}
+    result["includes"] = [_public(subtree) for subtree in node["includes"]]
+    result["redirect"] = _public(node["redirect"]) if node["redirect"] else None
+    return result
+
+
+async def check_spf(domain: str) -> Dict[str, Any]:
+    """Evaluate and flatten domain's SPF record."""
+    evaluator = SPFEvaluator()
+    tree = await evaluator.evaluate(domain)
+    errors = [f"{node['domain']}: {node['error']}" for node in _walk(tree) if node["error"]]
+    results = {node["result"] for node in _walk(tree) if node["result"]}
+    if tree["lookups"] > EMAIL_AUTH_CONFIG['lookup_limit']:
+        errors.append(f"{tree['lookups']} DNS lookups (limit {EMAIL_AUTH_CONFIG['lookup_limit']})")
+        results.add("permerror")
+    if tree["void_lookups"] > EMAIL_AUTH_CONFIG['void_lookup_limit']:
+        errors.append(f"{tree['void_lookups']} void lookups (limit {EMAIL_AUTH_CONFIG['void_lookup_limit']})")
+        results.add("permerror")
+
+    if tree["record"] is None and not errors:
+        status = "none"
+    else:
+        status = "permerror" if "permerror" in results else "temperror" if "temperror" in results else "valid"
+    unflattenable = [term for node in _walk(tree) for term in node["unflattenable"]]
+    passes_all = any(node["all"] == "+all" for node in _walk(tree))
+    return {
+        "status": status,
+        "record": tree["record"],
+        "lookups": tree["lookups"],
+        "lookup_limit": EMAIL_AUTH_CONFIG['lookup_limit'],
+        "void_lookups": tree["void_lookups"],
+        "errors": errors,
+        "flattened": dict(_collapse(tree["passes"]), complete=not unflattenable, unflattenable=unflattenable),
+        "warnings": ["+all lets any host send mail for the domain"] if passes_all else [],
+        "dns_queries": evaluator.dns_queries,
+        "memoized_lookups": evaluator.memo_hits,
+        "tree": _public(tree)
+    }
+
+
+def parse_tags(text: str) -> Dict[str, str]:
+    """tag=value; pairs as used by DMARC and DKIM records (tags lower-cased)."""
+    tags = {}
+    for part in text.split(';'):
+        if '=' in part:
+            tag, value = part.split('=', 1)
+            tags[tag.strip().lower()] = re.sub(r'\s+', '', value) if tag.strip().lower() == "p" else value.strip()
+    return tags
+
+
+def parse_dmarc(text: str) -> Dict[str, Any]:
+    """The policy in a DMARC record, with defaults applied and problems listed."""
+    tags = parse_tags(text)
+    warnings = []
+    policy = tags.get("p", "").lower()
+    if policy not in ("none", "quarantine", "reject"):
+        warnings.append(f"Invalid or missing p= policy: {tags.get('p')!r}")
+        policy = "none" if tags.get("rua") else None
+    elif policy == "none":
+        warnings.append("p=none only monitors; nothing is quarantined or rejected")
+    try:
+        percentage = int(tags.get("pct", "100"))
+    except ValueError:
+        warnings.append(f"Invalid pct= value: {tags['pct']!r}")
+        percentage = 100
+    if percentage < 100:
+        warnings.append(f"Policy applies to {percentage}% of failing mail")
+    if not tags.get("rua"):
+        warnings.append("No rua= address: aggregate reports won't be sent anywhere")
+
+    def uris(tag: str) -> List[str]:
+        return [uri.strip() for uri in tags.get(tag, "").split(',') if uri.strip()]
+
+    alignment = {"r": "relaxed", "s": "strict"}
+    return {
+        "record": text,
+        "policy": policy,
+        "subdomain_policy": tags.get("sp", "").lower() or policy,
+        "percentage": percentage,
+        "dkim_alignment": alignment.get(tags.get("adkim", "r").lower(), "relaxed"),
+        "spf_alignment": alignment.get(tags.get("aspf", "r").lower(), "relaxed"),
+        "rua": uris("rua"),
+        "ruf": uris("ruf"),
+        "failure_options": tags.get("fo", "0"),
+        "tags": tags,
+        "warnings": warnings
+    }
+
+
+async def check_dmarc(domain: str) -> Dict[str, Any]:
+    name = f"_dmarc.{domain.lower().rstrip('.')}"
+    answer = await resolve(name, "TXT", lifetime=EMAIL_AUTH_CONFIG['timeout'])
+    records = [b"".join(rdata.strings).decode("utf-8", "replace") for rdata in answer]
+    records = [record for record in records if record.replace(' ', '').lower().startswith("v=dmarc1")]
+    if not records:
+        return {"found": False, "name": name}
+    if len(records) > 1:
+        return {"found": True, "name": name, "error": f"{len(records)} DMARC records; receivers ignore them all"}
+    return dict(found=True, name=name, **parse_dmarc(records[0]))
+
+
+def _der_element(data: bytes, pos: int) -> Tuple[int, int, int]:
+    """(tag, start, end) of the DER element at pos."""
+    tag, length = data[pos], data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    if pos + length > len(data):
+        raise ValueError("Truncated DER")
+    return tag, pos, pos + length
+
+
+def rsa_key_bits(der: bytes) -> Optional[int]:
+    """Modulus size of an RSA public key (SubjectPublicKeyInfo or bare RSAPublicKey), or None."""
+    try:
+        tag, start, _ = _der_element(der, 0)
+        tag, start, end = _der_element(der, start)
+        if tag == 0x30:
+            # SubjectPublicKeyInfo: skip the algorithm; the key is in the BIT STRING after it
+            tag, start, end = _der_element(der, end)
+            if tag != 0x03:
+                return None
+            der = der[start + 1:end]
+            tag, start, _ = _der_element(der, 0)
+            tag, start, end = _der_element(der, start)
+        if tag != 0x02:
+            return None
+        modulus = der[start:end].lstrip(b"\0")
+        return (len(modulus) - 1) * 8 + modulus[0].bit_length() if modulus else None
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_dkim(text: str) -> Dict[str, Any]:
+    """Key type, size and flags of a DKIM key record, with problems listed."""
+    tags = parse_tags(text)
+    key_type = tags.get("k", "rsa").lower()
+    public_key = tags.get("p", "")
+    flags = [flag.strip() for flag in tags.get("t", "").split(':') if flag.strip()]
+    warnings = []
+    key_bits = None
+    if "p" not in tags:
+        warnings.append("No p= public key")
+    elif not public_key:
+        warnings.append("Key revoked (empty p=)")
+    else:
+        try:
+            der = base64.b64decode(public_key, validate=True)
+            key_bits = rsa_key_bits(der) if key_type == "rsa" else len(der) * 8
+        except ValueError:
+            warnings.append("p= is not valid base64")
+        if key_type == "rsa" and key_bits is not None and key_bits < 1024:
+            warnings.append(f"{key_bits}-bit RSA keys are too short (RFC 8301 requires 1024, 2048 is advised)")
+    if "y" in flags:
+        warnings.append("t=y: the domain is testing DKIM")
+    return {
+        "record": text,
+        "key_type": key_type,
+        "key_bits": key_bits,
+        "revoked": "p" in tags and not public_key,
+        "testing": "y" in flags,
+        "hash_algorithms": [alg.strip() for alg in tags["h"].split(':')] if tags.get("h") else None,
+        "tags": {tag: value for tag, value in tags.items() if tag != "p"},
+        "warnings": warnings
+    }
+
+
+async def check_dkim(domain: str, selectors: List[str]) -> List[Dict[str, Any]]:
+    """Look every selector up at once; rows for the ones that exist first, in selector order."""
+    domain = domain.lower().rstrip('.')
+
+    async def one(selector: str) -> Dict[str, Any]:
+        name = f"{selector}._domainkey.{domain}"
+        try:
+            answer = await resolve(name, "TXT", lifetime=EMAIL_AUTH_CONFIG['timeout'])
+        except dns.exception.DNSException as e:
+            return {"selector": selector, "name": name, "found": False, "error": str(e) or type(e).__name__}
+        records = [b"".join(rdata.strings).decode("utf-8", "replace") for rdata in answer]
+        records = [record for record in records if "p=" in record.replace(' ', '')]
+        if not records:
+            return {"selector": selector, "name": name, "found": False}
+        return dict(selector=selector, name=name, found=True, **parse_dkim(records[0]))
+
+    rows = await asyncio.gather(*(one(selector) for selector in selectors))
+    return sorted(rows, key=lambda row: not row["found"])
+
+
+async def check_email_auth(domain: str, dkim_selectors: Optional[List[str]] = None) -> Dict[str, Any]:
+    """SPF, DMARC and DKIM for domain, checked concurrently."""
+    selectors = list(dict.fromkeys(dkim_selectors or EMAIL_AUTH_CONFIG['dkim_selectors']))
+    spf, dmarc, dkim = await asyncio.gather(
+        check_spf(domain), check_dmarc(domain), check_dkim(domain, selectors), return_exceptions=True
+    )
+    for name, result in (("SPF", spf), ("DMARC", dmarc)):
+        if isinstance(result, BaseException):
+            logger.warning(f"{name} check for {domain} failed: {result}")
+    return {
+        "domain": domain,
+        "spf": spf if not isinstance(spf, BaseException) else {"status": "temperror", "errors": [str(spf)]},
+        "dmarc": dmarc if not isinstance(dmarc, BaseException) else {"found": False, "error": str(dmarc)},
+        "dkim": dkim if not isinstance(dkim, BaseException) else [],
+        "dkim_selectors_checked": selectors
+    }
@@ -0,0 +1,213 @@
+"""
+Latency probing for speed tests.
+
+Probes are small async callables that time one round trip and return the
+RTT in milliseconds: an HTTP request on a kept-alive connection, or a TCP
+connect when the server has nothing cheap to fetch. sample_latency takes N
+sequential samples for the idle ping/jitter/loss figures; LatencyProber
+runs a probe at a fixed interval in the background, which is how loaded
+latency (bufferbloat) is sampled while the throughput streams saturate the
+link. Probes use their own connection so they never queue behind
+throughput data on the same stream.
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+Probe = Callable[[], Awaitable[float]]
+
+LATENCY_CONFIG = {
+    'samples': 10,           # Probes per idle latency measurement
+    'sample_timeout': 2.0,   # A probe slower than this counts as lost
+    'probe_interval': 0.1,   # Seconds between loaded-latency probes
+    'probe_timeout': 3.0     # Loaded RTTs can legitimately reach seconds on bloated links
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linearly interpolated percentile of values (0-100)."""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = pct / 100 * (len(ordered) - 1)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_percentiles(rtts: List[float], lost: int = 0) -> Optional[Dict[str, float]]:
+    """Summarize RTT samples in ms as min/p50/p90/p99/max plus sample and loss counts."""
+    if not rtts:
+        return None
+    return {
+        'min': round(min(rtts), 2),
+        'p50': round(percentile(rtts, 50), 2),
+        'p90': round(percentile(rtts, 90), 2),
+        'p99': round(percentile(rtts, 99), 2),
+        'max': round(max(rtts), 2),
+        'samples': len(rtts),
+        'lost': lost
+    }
+
+
+def http_probe(client: httpx.AsyncClient, url: str, method: str = "GET") -> Probe:
+    """
+    Probe that times a request for url on client's kept-alive connection.
+
+    Error statuses fail the probe: a fast 503 from an overloaded server is
+    not a round trip to the content we meant to time.
+    """
+    async def probe() -> float:
+        start = time.perf_counter()
+        response = await client.request(method, url)
+        await response.aclose()
+        if response.status_code >= 400:
+            raise httpx.HTTPStatusError(
+                f"Latency probe got HTTP {response.status_code}", request=response.request, response=response
+            )
+        return (time.perf_counter() - start) * 1000
+    return probe
+
+
+def tcp_connect_probe(host: str, port: int) -> Probe:
+    """Probe that times a TCP handshake to host:port (one round trip)."""
+    async def probe() -> float:
+        start = time.perf_counter()
+        _, writer = await asyncio.open_connection(host, port)
+        elapsed = (time.perf_counter() - start) * 1000
+        writer.close()
+        return elapsed
+    return probe
+
+
+def summarize_latency(rtts: List[float], attempts: int) -> Optional[Dict[str, Any]]:
+    """
+    Ping, jitter and loss from sequential RTT samples.
+
+    ping is the median, jitter the mean absolute difference between
+    successive samples (as in RFC 3550 without smoothing), loss a percentage.
+    """
+    if not rtts:
+        return None
+    jitter = statistics.fmean(abs(b - a) for a, b in zip(rtts, rtts[1:])) if len(rtts) > 1 else 0.0
+    lost = attempts - len(rtts)
+    return {
+        'ping': round(statistics.median(rtts), 2),
+        'min': round(min(rtts), 2),
+        'jitter': round(jitter, 2),
+        'loss': round(lost / attempts * 100, 1),
+        'samples': len(rtts),
+        'percentiles': latency_percentiles(rtts, lost)
+    }
+
+
+async def sample_latency(probe: Probe, count: int = LATENCY_CONFIG['samples'],
+                         timeout: float = LATENCY_CONFIG['sample_timeout']) -> Optional[Dict[str, Any]]:
+    """Take count sequential probe samples; None if every probe failed."""
+    rtts = []
+    for _ in range(count):
+        try:
+            rtts.append(await asyncio.wait_for(probe(), timeout))
+        except Exception as e:
+            logger.debug(f"Latency probe failed: {e}")
+    return summarize_latency(rtts, count)
+
+
+async def sample_http_latency(url: str, count: int = LATENCY_CONFIG['samples'],
+                              timeout: float = LATENCY_CONFIG['sample_timeout'],
+                              method: str = "GET") -> Optional[Dict[str, Any]]:
+    """
+    Sample HTTP round trips to url on one kept-alive connection.
+
+    The first request only opens the connection and is excluded, so the
+    samples reflect request/response round trips rather than TCP/TLS setup.
+    """
+    async with probe_client(timeout) as client:
+        try:
+            await client.request(method, url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Latency probe connection to {url} failed: {e}")
+            return None
+        return await sample_latency(http_probe(client, url, method), count, timeout)
+
+
+async def sample_tcp_latency(host: str, port: int, count: int = LATENCY_CONFIG['samples'],
+                             timeout: float = LATENCY_CONFIG['sample_timeout']) -> Optional[Dict[str, Any]]:
+    """Sample TCP connect times to host:port."""
+    return await sample_latency(tcp_connect_probe(host, port), count, timeout)
+
+
+def probe_client(timeout: float) -> httpx.AsyncClient:
+    """Single-connection client for latency probes, separate from any throughput pool."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout),
+        limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+        headers={'Accept-Encoding': 'identity'}
+    )
+
+
+class LatencyProber:
+    """
+    Samples a probe at a fixed interval until stopped.
+
+    Use as an async context manager around the work that loads the link:
+
+        async with LatencyProber(probe) as prober:
+            await saturate_link()
+        prober.summary()
+    """
+
+    def __init__(self, probe: Probe, interval: float = LATENCY_CONFIG['probe_interval'],
+                 timeout: float = LATENCY_CONFIG['probe_timeout']):
+        self.probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.rtts: List[float] = []
+        self.lost = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def _run(self):
+        # wait_for() can swallow a cancel that races with the probe finishing
+        # (Python < 3.12), so the loop also checks a flag instead of relying
+        # on cancellation alone
+        while not self._stopping:
+            started = time.monotonic()
+            try:
+                self.rtts.append(await asyncio.wait_for(self.probe(), self.timeout))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.lost += 1
+                logger.debug(f"Latency probe failed: {e}")
+            # Fixed schedule, but never more than one probe in flight
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def __aenter__(self) -> "LatencyProber":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        return latency_percentiles(self.rtts, self.lost)
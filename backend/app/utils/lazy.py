@@ -0,0 +1,99 @@
+"""
+Deferred imports for heavy dependencies.
+
+Routers bind speedtest, geopy, whois, dnspython, aiohttp and bcrypt
+through lazy_import() instead of importing them, so the API process can
+serve its first request without loading them all. A dependency is
+imported on the first attribute access - normally the first request to a
+router that needs it - and the time that took is recorded for
+diagnostics. numpy is not deferred: result_store and throughput_analysis
+build module-level tables with it, so it loads with the speed-test router.
+
+    dns = lazy_import("dns", "dns.resolver", "dns.exception")
+    ...
+    resolver = dns.resolver.Resolver()   # dns.resolver is imported here
+
+Attribute lookups go to the real module on every access, so patching
+(e.g. patch('speedtest.Speedtest')) keeps working. Code that needs a
+module at import time - annotations, module-level constants - must use
+string annotations or compute the value on first use instead.
+"""
+
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Tuple
+
+_registry: Dict[Tuple[str, ...], "LazyModule"] = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """Module proxy that imports its target on first attribute access."""
+
+    def __init__(self, name: str, submodules: Tuple[str, ...] = ()):
+        self._name = name
+        self._submodules = submodules
+        self._module: Optional[ModuleType] = None
+        self._load_ms: Optional[float] = None
+        # importlib.util.LazyLoader is not thread-safe before Python 3.12;
+        # a plain lock around import_module is
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(self._name)
+                for submodule in self._submodules:
+                    importlib.import_module(submodule)
+                self._load_ms = (time.perf_counter() - start) * 1000
+                self._module = module
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str, *submodules: str) -> LazyModule:
+    """
+    Proxy for module name, imported together with submodules on first use.
+
+    Listing submodules lets call sites keep the dotted form
+    (dns.resolver.Resolver) that `import dns.resolver` would give them.
+    Proxies are shared, so each dependency is only timed once.
+    """
+    key = (name, *submodules)
+    with _registry_lock:
+        proxy = _registry.get(key)
+        if proxy is None:
+            proxy = _registry[key] = LazyModule(name, tuple(submodules))
+        return proxy
+
+
+def lazy_stats() -> Dict[str, Dict[str, Any]]:
+    """Load state and import time (ms) of every lazily imported module."""
+    with _registry_lock:
+        proxies = list(_registry.values())
+    return {
+        ",".join((proxy._name, *proxy._submodules)): {
+            'loaded': proxy.loaded,
+            'load_ms': round(proxy._load_ms, 2) if proxy._load_ms is not None else None
+        }
+        for proxy in proxies
+    }
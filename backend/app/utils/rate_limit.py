@@ -0,0 +1,167 @@
+"""
+Per-client rate limiting for expensive endpoints.
+
+Each client (an IPv4 address or IPv6 /64 by default) is tracked with the
+generic cell rate algorithm (GCRA): one "theoretical arrival time" per
+limit, so checks and rejections are O(1) and a client costs a few dozen
+bytes. Clients live in an LRU that is bounded in size and drops entries
+once they have been idle longer than the largest window, at which point
+their state is indistinguishable from a new client.
+
+Client addresses come from the socket peer. The proxy headers are only
+believed when the peer is one of TRUSTED_PROXIES (addresses or CIDRs,
+comma-separated), since anyone else can set them to whatever they like.
+"""
+
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+
+def _parse_networks(value: str) -> List[ipaddress._BaseNetwork]:
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(',') if part.strip()]
+
+
+# Reverse proxies allowed to tell us the client address (the local one by default)
+TRUSTED_PROXIES = _parse_networks(os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1"))
+
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def get_client_ip(request: Request) -> str:
+    """Get the client IP, honouring the proxy/CDN headers only from a trusted proxy."""
+    peer = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(peer):
+        return peer
+
+    cf_connecting_ip = request.headers.get("CF-Connecting-IP")
+    real_ip = request.headers.get("X-Real-IP")
+    forwarded_for = request.headers.get("X-Forwarded-For")
+
+    if cf_connecting_ip:
+        return cf_connecting_ip.strip()
+    if real_ip:
+        return real_ip.strip()
+    if forwarded_for:
+        # Each proxy appends the peer it saw: the last hop we don't run is the client
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        for hop in reversed(hops):
+            if not is_trusted_proxy(hop):
+                return hop
+        if hops:
+            return hops[0]
+    return peer
+
+
+def get_client_prefix(request: Request, ipv4_prefix: int = 32, ipv6_prefix: int = 64) -> str:
+    """
+    Get the rate-limit key for a request.
+
+    IPv6 clients usually control a whole /64, so keying on the full address
+    would let them rotate around any per-address limit.
+    """
+    client_ip = get_client_ip(request)
+    try:
+        address = ipaddress.ip_address(client_ip)
+    except ValueError:
+        return client_ip
+
+    prefix = ipv4_prefix if address.version == 4 else ipv6_prefix
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class GCRALimiter:
+    """Per-client GCRA rate limiter with bounded memory."""
+
+    def __init__(self, limits: List[Tuple[float, int]], max_clients: int = 100_000):
+        """
+        Args:
+            limits: (window_seconds, max_requests) pairs that must all hold.
+                Each allows a burst of max_requests, refilling evenly over
+                the window.
+            max_clients: Maximum number of clients tracked before the least
+                recently seen ones are evicted
+        """
+        self.limits = sorted(limits)
+        self.max_clients = max_clients
+        self.max_window = max(window for window, _ in self.limits)
+        # Emission interval per limit: the steady-state spacing between requests
+        self._intervals = [window / max_requests for window, max_requests in self.limits]
+        self._clients: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        """Drop idle clients from the LRU head and enforce the size bound."""
+        while self._clients:
+            key = next(iter(self._clients))
+            idle = now - self._last_seen[key]
+            if idle <= self.max_window and len(self._clients) <= self.max_clients:
+                break
+            del self._clients[key]
+            del self._last_seen[key]
+
+    def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Record a request for key if every limit allows it.
+
+        Returns (allowed, retry_after_seconds). Rejected requests are not
+        counted, so a client hammering the endpoint doesn't extend its own
+        penalty.
+        """
+        now = time.time() if now is None else now
+
+        with self._lock:
+            arrival_times = self._clients.get(key)
+            if arrival_times is None:
+                arrival_times = [now] * len(self.limits)
+                self._clients[key] = arrival_times
+            else:
+                self._clients.move_to_end(key)
+            self._last_seen[key] = now
+
+            new_times = []
+            retry_after = 0.0
+            for tat, interval, (window, _) in zip(arrival_times, self._intervals, self.limits):
+                new_tat = max(tat, now) + interval
+                # The request fits if it doesn't push the schedule more than a window ahead
+                retry_after = max(retry_after, new_tat - window - now)
+                new_times.append(new_tat)
+
+            if retry_after > 1e-9:
+                self._evict(now)
+                return False, retry_after
+
+            arrival_times[:] = new_times
+            self._evict(now)
+            return True, 0.0
+
+    def retry_after_header(self, retry_after: float) -> Dict[str, str]:
+        """Build the Retry-After header for a rejection."""
+        return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+    def reset(self):
+        """Forget all clients."""
+        with self._lock:
+            self._clients.clear()
+            self._last_seen.clear()
+
+    def stats(self) -> Dict[str, object]:
+        """Configuration and occupancy for diagnostics."""
+        return {
+            'limits': [{'window_seconds': window, 'max_requests': limit} for window, limit in self.limits],
+            'tracked_clients': len(self._clients),
+            'max_clients': self.max_clients
+        }
@@ -0,0 +1,123 @@
+"""
+Short-term reuse of expensive per-client measurements.
+
+Users often start the same test several times in a row. ReuseCache keeps
+the latest result per key (a client prefix) so a repeat request within
+the caller's window can be answered from it, and shares in-flight runs so
+a request arriving while a measurement for its key is still running waits
+for that one instead of starting another.
+
+A shared run is a task of its own with its own CancellationToken: it
+survives the request that started it disconnecting, and is only cancelled
+(child processes included) once every request waiting on it has gone.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.utils.cancellation import CancellationToken, run_with_token
+
+
+class _Flight:
+    """A shared in-flight run and the number of requests waiting on it."""
+
+    def __init__(self, task: asyncio.Task, token: CancellationToken):
+        self.task = task
+        self.token = token
+        self.waiters = 0
+
+
+class ReuseCache:
+    """Recent results and in-flight runs per key, with bounded memory."""
+
+    def __init__(self, max_window: float, max_entries: int = 10_000):
+        """
+        Args:
+            max_window: Longest age, in seconds, at which a result may still
+                be reused; older results are dropped
+            max_entries: Maximum number of keys with a stored result before
+                the least recently stored ones are evicted
+        """
+        self.max_window = max_window
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+
+    def _evict(self, now: float):
+        while self._results:
+            key, (stored_at, _) = next(iter(self._results.items()))
+            if now - stored_at <= self.max_window and len(self._results) <= self.max_entries:
+                break
+            del self._results[key]
+
+    def store(self, key: str, value: Any, now: Optional[float] = None):
+        """Remember value as the latest result for key."""
+        now = time.monotonic() if now is None else now
+        self._results.pop(key, None)
+        self._results[key] = (now, value)
+        self._evict(now)
+
+    def recent(self, key: str, max_age: float, now: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """(value, age_seconds) of the latest result for key if at most max_age old."""
+        now = time.monotonic() if now is None else now
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        age = now - stored_at
+        if age > min(max_age, self.max_window):
+            return None
+        return value, age
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a shared run for key is in progress."""
+        return key in self._inflight
+
+    def _finished(self, key: str, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not flight.task.cancelled() and flight.task.exception() is None:
+            self.store(key, flight.task.result())
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]], join: bool = True) -> Tuple[Any, bool]:
+        """
+        Run factory() for key, or wait for the run already in progress.
+
+        Returns (value, joined), where joined says the value came from a run
+        started by another request. With join=False a new run is always
+        started. Successful results are stored either way; failures are
+        raised to every waiter and not stored.
+        """
+        flight = self._inflight.get(key) if join else None
+        joined = flight is not None
+        if flight is None:
+            token = CancellationToken()
+            flight = _Flight(asyncio.create_task(run_with_token(token, factory())), token)
+            if key not in self._inflight:
+                self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._finished(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), joined
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to receive the result
+                flight.token.cancel()
+                flight.task.cancel()
+
+    def reset(self):
+        """Forget stored results (in-flight runs finish normally)."""
+        self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Configuration and occupancy for diagnostics."""
+        return {
+            'max_window_seconds': self.max_window,
+            'stored_results': len(self._results),
+            'max_entries': self.max_entries,
+            'in_flight': len(self._inflight)
+        }
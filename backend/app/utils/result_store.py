@@ -0,0 +1,318 @@
+"""
+Append-only columnar store for speed-test results.
+
+Every column lives in its own fixed-width binary file, so aggregations
+only read the columns they need. String columns (ISP, country, server,
+method) are dictionary-encoded to uint32 codes with the dictionaries kept
+in small side files. Queries walk the columns through memory maps in
+fixed-size batches, accumulating per-group histograms, so memory use is
+independent of the number of rows and percentiles come from the merged
+histograms rather than from sorting all values.
+"""
+
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = {
+    'timestamp': np.dtype('<f8'),
+    'download': np.dtype('<f4'),
+    'upload': np.dtype('<f4'),
+    'ping': np.dtype('<f4'),
+    'jitter': np.dtype('<f4')
+}
+STRING_COLUMNS = ('isp', 'country', 'server', 'method')
+CODE_DTYPE = np.dtype('<u4')
+
+METRICS = ('download', 'upload', 'ping', 'jitter')
+GROUP_COLUMNS = STRING_COLUMNS
+
+# Log-spaced histogram bins covering 0.01 .. 100,000 (Mbps or ms).
+# 2000 bins keep the relative error of interpolated percentiles below 1%.
+# Bin 0 sits in front of them for values below 0.01 - jitter is often
+# exactly 0 - and reports as 0 rather than as the lowest edge.
+HISTOGRAM_MIN = 1e-2
+HISTOGRAM_MAX = 1e5
+HISTOGRAM_BINS = 2000
+HISTOGRAM_SLOTS = HISTOGRAM_BINS + 1
+_LOG_MIN = math.log(HISTOGRAM_MIN)
+_LOG_SPAN = math.log(HISTOGRAM_MAX) - _LOG_MIN
+BIN_EDGES = np.exp(np.linspace(_LOG_MIN, _LOG_MIN + _LOG_SPAN, HISTOGRAM_BINS + 1))
+
+DEFAULT_BATCH_ROWS = 2_000_000
+MAX_TIME_BUCKETS = 10_000
+
+
+def _bin_index(values: np.ndarray) -> np.ndarray:
+    clipped = np.clip(values, HISTOGRAM_MIN, HISTOGRAM_MAX * 0.999999)
+    scaled = (np.log(clipped) - _LOG_MIN) * (HISTOGRAM_BINS / _LOG_SPAN)
+    return np.where(values < HISTOGRAM_MIN, 0, scaled.astype(np.int64) + 1)
+
+
+def histogram_percentiles(histogram: np.ndarray, percentiles: Sequence[float],
+                          bins: Optional[np.ndarray] = None) -> List[float]:
+    """
+    Interpolate percentiles from a histogram of HISTOGRAM_SLOTS slots.
+
+    Slot 0 counts values below HISTOGRAM_MIN and yields 0; slot i > 0 spans
+    BIN_EDGES[i - 1] .. BIN_EDGES[i]. With bins, histogram holds only the
+    counts of those (ascending) slots - the sparse form aggregate() keeps.
+    """
+    total = histogram.sum()
+    if total == 0:
+        return [None for _ in percentiles]
+    if bins is None:
+        bins = np.arange(len(histogram))
+
+    cumulative = np.cumsum(histogram)
+    results = []
+    for percentile in percentiles:
+        rank = percentile / 100.0 * total
+        index = int(np.searchsorted(cumulative, rank, side='left'))
+        index = min(index, len(histogram) - 1)
+        below = cumulative[index - 1] if index > 0 else 0
+        in_bin = histogram[index]
+        fraction = (rank - below) / in_bin if in_bin else 0.0
+        if bins[index] == 0:
+            results.append(0.0)
+            continue
+        low, high = BIN_EDGES[bins[index] - 1], BIN_EDGES[bins[index]]
+        # Geometric interpolation matches the log-spaced bins
+        results.append(float(low * (high / low) ** min(max(fraction, 0.0), 1.0)))
+    return results
+
+
+def _merge_counts(cells: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum the counts of repeated cells; returns the distinct cells in ascending order."""
+    unique_cells, inverse = np.unique(cells, return_inverse=True)
+    return unique_cells, np.bincount(inverse, weights=counts, minlength=len(unique_cells)).astype(np.int64)
+
+
+class ResultStore:
+    """Append-only columnar speed-test result store."""
+
+    def __init__(self, directory: str, batch_rows: int = DEFAULT_BATCH_ROWS):
+        self.directory = directory
+        self.batch_rows = batch_rows
+        self._lock = threading.Lock()
+        self._dictionaries: Optional[Dict[str, List[str]]] = None
+        self._codes: Dict[str, Dict[str, int]] = {}
+
+    def _column_path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.col")
+
+    def _dictionary_path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.dict")
+
+    def _column_dtype(self, column: str) -> np.dtype:
+        return NUMERIC_COLUMNS.get(column, CODE_DTYPE)
+
+    def _load_dictionaries(self):
+        if self._dictionaries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._dictionaries = {}
+        for column in STRING_COLUMNS:
+            values = []
+            path = self._dictionary_path(column)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    values = [line.rstrip('\n') for line in f]
+            self._dictionaries[column] = values
+            self._codes[column] = {value: code for code, value in enumerate(values)}
+
+    def _encode(self, column: str, value: Optional[str]) -> int:
+        value = (value or 'Unknown').replace('\n', ' ').strip() or 'Unknown'
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._dictionaries[column])
+            with open(self._dictionary_path(column), 'a', encoding='utf-8') as f:
+                f.write(value + '\n')
+            self._dictionaries[column].append(value)
+            codes[value] = code
+        return code
+
+    def row_count(self) -> int:
+        """Number of complete rows (a crash mid-append leaves a shorter column)."""
+        counts = []
+        for column in list(NUMERIC_COLUMNS) + list(STRING_COLUMNS):
+            path = self._column_path(column)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts.append(size // self._column_dtype(column).itemsize)
+        return min(counts)
+
+    def append(self, result: Dict[str, Any]):
+        """Append one result; missing numeric values are stored as NaN."""
+        with self._lock:
+            self._load_dictionaries()
+            rows = self.row_count()
+            for column, dtype in NUMERIC_COLUMNS.items():
+                value = result.get(column)
+                value = float('nan') if value is None else float(value)
+                self._write(column, rows, np.array([value], dtype=dtype))
+            for column in STRING_COLUMNS:
+                code = self._encode(column, result.get(column))
+                self._write(column, rows, np.array([code], dtype=CODE_DTYPE))
+
+    def _write(self, column: str, rows: int, value: np.ndarray):
+        path = self._column_path(column)
+        itemsize = self._column_dtype(column).itemsize
+        with open(path, 'ab') as f:
+            # Drop a torn trailing write from an earlier crash before appending
+            if f.tell() != rows * itemsize:
+                f.truncate(rows * itemsize)
+            f.write(value.tobytes())
+
+    def append_many(self, columns: Dict[str, np.ndarray], strings: Dict[str, List[str]]):
+        """
+        Bulk-append rows given as numeric arrays plus string value lists.
+
+        Used for imports and benchmarks; single results should use append().
+        """
+        with self._lock:
+            self._load_dictionaries()
+            rows = self.row_count()
+            for column, dtype in NUMERIC_COLUMNS.items():
+                self._write(column, rows, np.asarray(columns[column], dtype=dtype))
+            for column in STRING_COLUMNS:
+                values = strings[column]
+                unique, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+                mapping = np.array([self._encode(column, value) for value in unique], dtype=CODE_DTYPE)
+                self._write(column, rows, mapping[inverse])
+
+    def _memmap(self, column: str, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.empty(0, dtype=self._column_dtype(column))
+        return np.memmap(self._column_path(column), dtype=self._column_dtype(column), mode='r', shape=(rows,))
+
+    def aggregate(
+        self,
+        metric: str,
+        group_by: Optional[str] = None,
+        bucket_seconds: Optional[float] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        percentiles: Sequence[float] = (10, 50, 90),
+        min_count: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Compute count, mean and percentiles of a metric per group and/or time bucket.
+
+        Args:
+            metric: One of METRICS
+            group_by: Optional string column (isp, country, server, method)
+            bucket_seconds: Optional time bucket width
+            since/until: Optional timestamp bounds (inclusive/exclusive)
+            percentiles: Percentiles to report
+            min_count: Groups with fewer results are omitted
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if group_by is not None and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Unknown group_by column: {group_by}")
+        if bucket_seconds is not None and bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+
+        with self._lock:
+            self._load_dictionaries()
+            rows = self.row_count()
+            dictionary = list(self._dictionaries[group_by]) if group_by else None
+
+        timestamps = self._memmap('timestamp', rows)
+        values = self._memmap(metric, rows)
+        codes = self._memmap(group_by, rows) if group_by else None
+
+        origin = since
+        if bucket_seconds is not None and origin is None:
+            origin = float(np.nanmin(timestamps)) if rows else 0.0
+        if bucket_seconds is not None and until is not None:
+            if (until - origin) / bucket_seconds > MAX_TIME_BUCKETS:
+                raise ValueError(f"Too many time buckets (maximum {MAX_TIME_BUCKETS})")
+
+        # Sparse histograms: one (key * HISTOGRAM_SLOTS + slot) cell per occupied
+        # slot, so memory follows the data rather than groups x buckets x bins
+        cells = np.empty(0, dtype=np.int64)
+        cell_counts = np.empty(0, dtype=np.int64)
+        sums: Dict[int, float] = {}
+        n_buckets_seen = 0
+
+        for start in range(0, rows, self.batch_rows):
+            stop = min(start + self.batch_rows, rows)
+            ts = np.asarray(timestamps[start:stop])
+            vals = np.asarray(values[start:stop], dtype=np.float64)
+
+            mask = ~np.isnan(vals)
+            if since is not None:
+                mask &= ts >= since
+            if until is not None:
+                mask &= ts < until
+            if not mask.any():
+                continue
+
+            vals = vals[mask]
+            keys = np.zeros(len(vals), dtype=np.int64)
+            if bucket_seconds is not None:
+                buckets = np.floor((ts[mask] - origin) / bucket_seconds).astype(np.int64)
+                n_buckets_seen = max(n_buckets_seen, int(buckets.max()) + 1)
+                if n_buckets_seen > MAX_TIME_BUCKETS:
+                    raise ValueError(f"Too many time buckets (maximum {MAX_TIME_BUCKETS})")
+                keys = buckets
+            if codes is not None:
+                group_codes = np.asarray(codes[start:stop])[mask].astype(np.int64)
+                keys = group_codes * MAX_TIME_BUCKETS + keys
+
+            batch_cells, batch_counts = np.unique(keys * HISTOGRAM_SLOTS + _bin_index(vals), return_counts=True)
+            cells, cell_counts = _merge_counts(
+                np.concatenate([cells, batch_cells]), np.concatenate([cell_counts, batch_counts])
+            )
+
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            key_sums = np.bincount(inverse, weights=vals, minlength=len(unique_keys))
+            for key, key_sum in zip(unique_keys.tolist(), key_sums.tolist()):
+                sums[key] = sums.get(key, 0.0) + key_sum
+
+        # Cells are sorted, so each key's bins are one contiguous run
+        cell_keys = cells // HISTOGRAM_SLOTS
+        keys, starts = np.unique(cell_keys, return_index=True)
+        ends = np.append(starts[1:], len(cells))
+
+        groups = []
+        for key, first, last in zip(keys.tolist(), starts.tolist(), ends.tolist()):
+            histogram = cell_counts[first:last]
+            count = int(histogram.sum())
+            if count < min_count:
+                continue
+            entry: Dict[str, Any] = {}
+            if group_by:
+                entry[group_by] = dictionary[key // MAX_TIME_BUCKETS]
+            if bucket_seconds is not None:
+                entry['bucket_start'] = origin + (key % MAX_TIME_BUCKETS) * bucket_seconds
+            entry['count'] = count
+            entry['mean'] = round(sums[key] / count, 3)
+            bins = cells[first:last] % HISTOGRAM_SLOTS
+            for percentile, value in zip(percentiles, histogram_percentiles(histogram, percentiles, bins)):
+                entry[f"p{percentile:g}"] = round(value, 3) if value is not None else None
+            groups.append(entry)
+
+        return {
+            'metric': metric,
+            'group_by': group_by,
+            'bucket_seconds': bucket_seconds,
+            'rows_scanned': rows,
+            'groups': groups
+        }
+
+
+def _default_directory() -> str:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.getenv("SPEED_RESULTS_DIR", os.path.join(backend_dir, "data", "speed_results"))
+
+
+result_store = ResultStore(_default_directory())
@@ -0,0 +1,60 @@
+"""
+Payload helpers for the self-hosted speed-test endpoints.
+
+The download endpoint streams slices of a single pre-generated random buffer,
+so serving a response never allocates or copies per chunk and the data can't
+be compressed away by proxies or the client stack.
+"""
+
+import os
+import threading
+from typing import AsyncIterator, Iterator
+
+# 8 MiB of random data is large enough that repeated slices look random to
+# any compression layer, and small enough to keep resident permanently.
+PAYLOAD_BUFFER_SIZE = 8 * 1024 * 1024
+PAYLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Hard limits per request to keep the endpoints from being used for abuse
+MAX_DOWNLOAD_BYTES = 1_000_000_000
+MAX_UPLOAD_BYTES = 1_000_000_000
+
+_payload_buffer = None
+_payload_lock = threading.Lock()
+
+
+def get_payload_buffer() -> memoryview:
+    """Return the shared incompressible buffer, generating it on first use."""
+    global _payload_buffer
+    if _payload_buffer is None:
+        with _payload_lock:
+            if _payload_buffer is None:
+                _payload_buffer = memoryview(os.urandom(PAYLOAD_BUFFER_SIZE))
+    return _payload_buffer
+
+
+def iter_payload(total_bytes: int, chunk_size: int = PAYLOAD_CHUNK_SIZE) -> Iterator[memoryview]:
+    """
+    Yield memoryview slices of the shared buffer totalling exactly total_bytes.
+
+    Slices wrap around the buffer, so no chunk is ever copied or allocated.
+    """
+    buffer = get_payload_buffer()
+    buffer_size = len(buffer)
+    chunk_size = max(1, min(chunk_size, buffer_size))
+    offset = 0
+    remaining = total_bytes
+
+    while remaining > 0:
+        size = min(chunk_size, remaining, buffer_size - offset)
+        yield buffer[offset:offset + size]
+        remaining -= size
+        offset += size
+        if offset >= buffer_size:
+            offset = 0
+
+
+async def aiter_payload(total_bytes: int, chunk_size: int = PAYLOAD_CHUNK_SIZE) -> AsyncIterator[memoryview]:
+    """Async variant of iter_payload for streaming responses and request bodies."""
+    for chunk in iter_payload(total_bytes, chunk_size):
+        yield chunk
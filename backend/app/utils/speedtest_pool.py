@@ -0,0 +1,179 @@
+"""
+Warm speedtest-cli contexts.
+
+A cold speedtest.Speedtest() spends seconds on the network before it
+measures anything: the constructor downloads the configuration XML,
+get_servers() the server list, and get_best_server() pings the closest
+servers three times each. None of that depends on the user - every test
+runs from this host - so SpeedtestPool does it in a background thread and
+keeps the result as a snapshot (config, servers, closest servers and the
+best server with its latency), refreshed on an interval.
+
+Speedtest objects are stateful (results, opener, shutdown event), so one
+is never shared between tests: acquire() builds a fresh one from the
+newest snapshot, which touches no network.
+"""
+
+import copy
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.lazy import lazy_import
+
+speedtest = lazy_import("speedtest")
+
+logger = logging.getLogger(__name__)
+
+
+class SpeedtestSnapshot:
+    """Everything a Speedtest learns from speedtest.net before measuring."""
+
+    def __init__(self, st, secure: bool):
+        self.secure = secure
+        self.config: Dict[str, Any] = copy.deepcopy(st.config)
+        self.lat_lon: Tuple[float, float] = st.lat_lon
+        self.servers: Dict[float, List[Dict[str, Any]]] = copy.deepcopy(st.servers)
+        self.closest: List[Dict[str, Any]] = copy.deepcopy(st.closest)
+        self.best: Dict[str, Any] = copy.deepcopy(st.best)
+        self.created_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+_warm_class = None
+
+
+def _warm_speedtest_class():
+    """Speedtest subclass configured from a snapshot (defined once speedtest is loaded)."""
+    global _warm_class
+    if _warm_class is None:
+        class WarmSpeedtest(speedtest.Speedtest):
+            def __init__(self, snapshot: SpeedtestSnapshot, shutdown_event=None):
+                self._snapshot = snapshot
+                super().__init__(secure=snapshot.secure, shutdown_event=shutdown_event)
+                self.servers = copy.deepcopy(snapshot.servers)
+                self.closest = copy.deepcopy(snapshot.closest)
+                self._best = copy.deepcopy(snapshot.best)
+                self.results.server = self._best
+                self.results.ping = self._best['latency']
+
+            def get_config(self):
+                # Called by the constructor; the snapshot replaces the download
+                self.config.update(copy.deepcopy(self._snapshot.config))
+                self.lat_lon = self._snapshot.lat_lon
+                return self.config
+
+        _warm_class = WarmSpeedtest
+    return _warm_class
+
+
+def build_snapshot(secure: bool = True) -> SpeedtestSnapshot:
+    """Fetch config, servers and best server, falling back to plain HTTP like the test does."""
+    try:
+        st = speedtest.Speedtest(secure=secure)
+        st.get_servers()
+    except Exception as e:
+        if not secure:
+            raise
+        logger.warning(f"Warm speedtest-cli refresh over HTTPS failed, retrying over HTTP: {e}")
+        return build_snapshot(secure=False)
+    st.get_best_server()
+    return SpeedtestSnapshot(st, secure)
+
+
+class SpeedtestPool:
+    """Background-refreshed speedtest-cli snapshot and the contexts built from it."""
+
+    def __init__(self, refresh_interval: float = 600, max_age: float = 1800,
+                 builder: Callable[[], SpeedtestSnapshot] = build_snapshot):
+        """
+        Args:
+            refresh_interval: Seconds between background refreshes
+            max_age: Snapshots older than this are not handed out (a refresh
+                that keeps failing must not pin a stale best server forever)
+            builder: Produces a snapshot; blocking, run on the refresh thread
+        """
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._builder = builder
+        self._snapshot: Optional[SpeedtestSnapshot] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.refresh_failures = 0
+        self.last_refresh_seconds: Optional[float] = None
+
+    def refresh(self) -> bool:
+        """Build a new snapshot now; keeps the old one if that fails."""
+        start = time.monotonic()
+        try:
+            snapshot = self._builder()
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning(f"Warm speedtest-cli refresh failed: {e}")
+            return False
+        self.last_refresh_seconds = round(time.monotonic() - start, 2)
+        with self._lock:
+            self._snapshot = snapshot
+        logger.info(f"Warm speedtest-cli context refreshed in {self.last_refresh_seconds}s "
+                    f"(best server {snapshot.best.get('sponsor')}, {snapshot.best.get('latency')} ms)")
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def start(self):
+        """Start refreshing in a daemon thread (a blocked fetch never holds up shutdown)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="speedtest-warm-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def snapshot(self) -> Optional[SpeedtestSnapshot]:
+        """Newest snapshot, if one exists and is fresh enough."""
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None or snapshot.age > self.max_age:
+            return None
+        return snapshot
+
+    def acquire(self, shutdown_event=None):
+        """
+        A ready-to-measure Speedtest built from the newest snapshot, or None.
+
+        None means the caller has to build a cold one itself.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _warm_speedtest_class()(snapshot, shutdown_event=shutdown_event)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot age and hit counts for diagnostics."""
+        snapshot = self.snapshot()
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'snapshot_age_seconds': round(snapshot.age, 1) if snapshot else None,
+            'best_server': snapshot.best.get('sponsor') if snapshot else None,
+            'best_server_latency_ms': snapshot.best.get('latency') if snapshot else None,
+            'refresh_interval_seconds': self.refresh_interval,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'refresh_failures': self.refresh_failures,
+            'hits': self.hits,
+            'misses': self.misses
+        }
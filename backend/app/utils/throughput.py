@@ -0,0 +1,330 @@
+"""
+Multi-stream HTTP throughput engine for speed tests.
+
+Opens several parallel HTTP streams against a download URL (or upload
+sink), samples the aggregate byte counter in fixed time slices and stops
+at a time budget instead of a byte count. The sampled counter goes through
+throughput_analysis, which trims the slow-start ramp and reports the
+stable-phase mean with its spread and stability flags. A phase ends early
+once the recent slice rates have converged, so fast stable links don't
+spend the whole budget and slow links aren't asked for more data than the
+estimate needs.
+"""
+
+import asyncio
+import logging
+import math
+import statistics
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import httpx
+
+from app.utils.speed_payload import aiter_payload
+from app.utils.throughput_analysis import analyze_counter, counter_from_slices, series
+from app.utils.latency import LatencyProber, http_probe, probe_client, sample_http_latency, LATENCY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Default engine settings - callers can override any key per run
+THROUGHPUT_CONFIG = {
+    'streams': 6,               # Parallel HTTP streams
+    'slice_interval': 0.25,     # Seconds per throughput sample
+    'time_budget': 10.0,        # Maximum seconds per phase
+    'min_duration': 4.0,        # Never stop a phase before this
+    'convergence_window': 6,    # Recent slices the stop rule looks at
+    'convergence_threshold': 0.03,  # Relative CI half-width / window-to-window change to stop at
+    'ramp_time': 2.0,           # Seconds of TCP slow-start the early-stop rule ignores
+    'trim_fraction': 0.0,       # Fraction trimmed from each end of the stable slice rates (0 = bytes over time)
+    'request_bytes': 250_000_000,  # Object size per request (re-requested until the budget ends)
+    'upload_request_bytes': 25_000_000,  # Largest body per upload request
+    'upload_min_request_bytes': 256 * 1024,  # First (and smallest) body per upload stream
+    'upload_request_seconds': 0.5,  # Upload bodies are sized to take about this long
+    'upload_chunk_size': 256 * 1024,
+    'latency_samples': 10,
+    'loaded_latency_url': None,  # Probed on its own connection during each phase when set
+    'connect_timeout': 10.0,
+    'read_timeout': 15.0
+}
+
+
+class ByteCounter:
+    """Aggregate byte counter shared by all streams of one phase."""
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, count: int):
+        self.total += count
+
+
+def _merge_config(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = dict(THROUGHPUT_CONFIG)
+    if config:
+        merged.update(config)
+    return merged
+
+
+def _format_url(url: str, request_bytes: int) -> str:
+    """Fill the {bytes} placeholder of a download/upload URL template."""
+    return url.replace("{bytes}", str(request_bytes))
+
+
+def _slice_rate(sample: Dict[str, float]) -> float:
+    return sample['bytes'] * 8 / sample['duration'] / 1_000_000
+
+
+def relative_precision(rates: List[float]) -> Optional[float]:
+    """Half-width of the 95% confidence interval of the mean, relative to the mean."""
+    if len(rates) < 2:
+        return None
+    mean = statistics.fmean(rates)
+    if mean <= 0:
+        return None
+    return 1.96 * statistics.stdev(rates) / math.sqrt(len(rates)) / mean
+
+
+def has_converged(stable_rates: List[float], window: int, threshold: float) -> bool:
+    """
+    True once the last window of rates is both tight and level.
+
+    The confidence interval alone can be fooled by a rate that is still
+    climbing smoothly, so the mean of the last window must also agree with
+    the window before it.
+    """
+    if len(stable_rates) < 2 * window:
+        return False
+    recent = stable_rates[-window:]
+    previous = stable_rates[-2 * window:-window]
+    precision = relative_precision(recent)
+    if precision is None or precision > threshold:
+        return False
+    recent_mean = statistics.fmean(recent)
+    return abs(recent_mean - statistics.fmean(previous)) / recent_mean <= threshold
+
+
+async def _sample_slices(counter: ByteCounter, start: float, deadline: float,
+                         config: Dict[str, Any], workers: List[asyncio.Task]) -> Tuple[List[Dict[str, float]], bool]:
+    """
+    Record the bytes transferred in each time slice.
+
+    Stops at the deadline, when every worker has finished, or once the
+    post-ramp slice rates have converged. Returns (samples, converged).
+    """
+    interval = config['slice_interval']
+    samples = []
+    stable_rates = []
+    last_time = start
+    last_total = 0
+
+    while True:
+        now = time.monotonic()
+        if now >= deadline or all(worker.done() for worker in workers):
+            return samples, False
+        await asyncio.sleep(min(interval, deadline - now))
+
+        now = time.monotonic()
+        total = counter.total
+        duration = now - last_time
+        if duration > 0:
+            sample = {
+                'time': now - start,
+                'duration': duration,
+                'bytes': total - last_total
+            }
+            samples.append(sample)
+            if sample['time'] > config['ramp_time']:
+                stable_rates.append(_slice_rate(sample))
+            if sample['time'] >= config['min_duration'] and has_converged(
+                    stable_rates, config['convergence_window'], config['convergence_threshold']):
+                return samples, True
+        last_time = now
+        last_total = total
+
+
+def summarize_samples(samples: List[Dict[str, float]], config: Dict[str, Any],
+                      converged: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Turn raw slice samples into a throughput result, discarding the ramp-up.
+
+    precision is the 95% confidence half-width of the stable slice rates in
+    percent of their mean (None with fewer than two stable slices). The
+    full analysis and the raw counter series are included for reporting.
+    Returns None when there are no samples or the counter never advanced.
+    """
+    if not samples:
+        return None
+
+    times, totals = counter_from_slices(samples)
+    analysis = analyze_counter(times, totals, {'trim_fraction': config['trim_fraction']})
+    if analysis is None:
+        return None
+
+    return {
+        'mbps': analysis['mbps'],
+        'total_bytes': int(totals[-1]),
+        'duration': round(samples[-1]['time'], 3),
+        'streams': config['streams'],
+        'slices_total': analysis['slices'],
+        'slices_used': analysis['stable_slices'],
+        'precision': analysis['precision'],
+        'converged': converged,
+        'slice_rates': [round(_slice_rate(s), 3) for s in samples],
+        'analysis': analysis,
+        'samples': series(times, totals)
+    }
+
+
+async def _download_worker(client: httpx.AsyncClient, url: str, counter: ByteCounter, deadline: float):
+    """Keep one stream busy until the deadline, re-requesting when an object completes."""
+    while time.monotonic() < deadline:
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise httpx.HTTPStatusError(
+                    f"Download returned HTTP {response.status_code}",
+                    request=response.request,
+                    response=response
+                )
+            async for chunk in response.aiter_raw():
+                counter.add(len(chunk))
+                if time.monotonic() >= deadline:
+                    return
+
+
+async def _run_phase(worker_factory, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Run streams produced by worker_factory for the time budget and summarize the slices.
+
+    With loaded_latency_url set, RTT is probed alongside the streams and
+    reported as the phase's 'latency' percentiles.
+    """
+    counter = ByteCounter()
+    prober = None
+    probes = None
+    if config['loaded_latency_url']:
+        probes = probe_client(LATENCY_CONFIG['probe_timeout'])
+        prober = LatencyProber(http_probe(probes, config['loaded_latency_url']))
+
+    start = time.monotonic()
+    deadline = start + config['time_budget']
+
+    workers = [asyncio.create_task(worker_factory(counter, deadline)) for _ in range(config['streams'])]
+    if prober:
+        prober.start()
+    try:
+        samples, converged = await _sample_slices(counter, start, deadline, config, workers)
+    finally:
+        if prober:
+            await prober.stop()
+            await probes.aclose()
+        for worker in workers:
+            worker.cancel()
+        outcomes = await asyncio.gather(*workers, return_exceptions=True)
+
+    errors = [o for o in outcomes if isinstance(o, Exception) and not isinstance(o, asyncio.CancelledError)]
+    if errors and counter.total == 0:
+        logger.warning(f"All throughput streams failed: {errors[0]}")
+        return None
+    for error in errors:
+        logger.debug(f"Throughput stream ended with error: {error}")
+
+    if converged:
+        logger.info(f"Throughput converged after {samples[-1]['time']:.1f}s")
+    result = summarize_samples(samples, config, converged)
+    if result is not None and prober:
+        result['latency'] = prober.summary()
+    return result
+
+
+def _client(config: Dict[str, Any]) -> httpx.AsyncClient:
+    timeout = httpx.Timeout(config['read_timeout'], connect=config['connect_timeout'])
+    limits = httpx.Limits(max_connections=config['streams'], max_keepalive_connections=config['streams'])
+    return httpx.AsyncClient(timeout=timeout, limits=limits, headers={'Accept-Encoding': 'identity'})
+
+
+async def measure_download(url: str, config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Measure download throughput from url over parallel streams.
+
+    url may contain a {bytes} placeholder that is filled with request_bytes.
+    Returns None if no data could be transferred.
+    """
+    config = _merge_config(config)
+    target = _format_url(url, config['request_bytes'])
+    logger.info(f"Measuring download from {target} with {config['streams']} streams for {config['time_budget']}s")
+
+    async with _client(config) as client:
+        return await _run_phase(
+            lambda counter, deadline: _download_worker(client, target, counter, deadline),
+            config
+        )
+
+
+def _acknowledged_bytes(response: httpx.Response, sent: int) -> int:
+    """Bytes the sink confirms: its own bytes_received when it reports one, else the whole body."""
+    try:
+        reported = response.json().get('bytes_received')
+    except (ValueError, AttributeError):
+        reported = None
+    if isinstance(reported, int) and not isinstance(reported, bool):
+        return max(0, min(reported, sent))
+    return sent
+
+
+async def _upload_worker(client: httpx.AsyncClient, url: str, counter: ByteCounter,
+                         deadline: float, config: Dict[str, Any]):
+    """
+    Keep one stream uploading until the deadline, crediting each body once the sink has answered.
+
+    Bytes that the transport has accepted may still sit in socket buffers,
+    so nothing is counted before the response. Each body is sized to take
+    about upload_request_seconds at the rate the stream last achieved, which
+    keeps the counter fine-grained without a request per chunk on fast links.
+    """
+    request_bytes = config['upload_min_request_bytes']
+    while time.monotonic() < deadline:
+        sent_at = time.monotonic()
+        response = await client.post(
+            url,
+            content=aiter_payload(request_bytes, config['upload_chunk_size']),
+            headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(request_bytes)}
+        )
+        if response.status_code >= 400:
+            raise httpx.HTTPStatusError(
+                f"Upload returned HTTP {response.status_code}",
+                request=response.request,
+                response=response
+            )
+        acknowledged = _acknowledged_bytes(response, request_bytes)
+        counter.add(acknowledged)
+
+        elapsed = time.monotonic() - sent_at
+        if elapsed > 0:
+            target = int(acknowledged / elapsed * config['upload_request_seconds'])
+            request_bytes = max(config['upload_min_request_bytes'], min(config['upload_request_bytes'], target))
+
+
+async def measure_upload(url: str, config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Measure upload throughput to a sink URL over parallel streams.
+
+    The sink can be this backend's /speed-test/upload endpoint or any
+    external endpoint that accepts and discards POST bodies. Bytes count
+    once the sink has answered; a bytes_received field in a JSON answer is
+    taken as the sink's own count.
+    Returns None if no data could be transferred.
+    """
+    config = _merge_config(config)
+    logger.info(f"Measuring upload to {url} with {config['streams']} streams for {config['time_budget']}s")
+
+    async with _client(config) as client:
+        return await _run_phase(
+            lambda counter, deadline: _upload_worker(client, url, counter, deadline, config),
+            config
+        )
+
+
+async def measure_latency(url: str, config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Measure idle HTTP round-trip latency against url on a single kept-alive connection."""
+    config = _merge_config(config)
+    return await sample_http_latency(url, config['latency_samples'], config['connect_timeout'])
@@ -0,0 +1,212 @@
+"""
+Time-series analysis of speed-test byte counters.
+
+Every engine can report its transfer as a byte counter sampled over time:
+the HTTP engine's aggregate counter, speedtest-cli's worker reads, or the
+Ookla CLI's progress events. analyze_counter turns such a series into
+per-slice rates and then:
+
+  * ignores idle samples before the first and after the last byte
+  * trims the TCP slow-start ramp with MSER (marginal standard error
+    rule): the truncation point is the one that minimises the standard
+    error of the remaining mean, searched over the first half of the run
+  * reports the stable-phase mean, percentiles, spread and trend
+  * flags measurements that are too short, too noisy or still drifting,
+    so callers can tell a trustworthy number from a lucky one
+
+Raw series are kept per test in a bounded RawSeriesStore so they can be
+downloaded for debugging.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ANALYSIS_CONFIG = {
+    'trim_fraction': 0.0,        # Fraction of stable slice rates trimmed from each end before averaging
+    'min_stable_seconds': 2.0,   # Shorter stable phases are flagged 'short'
+    'min_stable_slices': 4,      # Fewer stable slices are flagged 'few_samples'
+    'max_cv': 0.25,              # Coefficient of variation above which a phase is 'noisy'
+    'max_trend': 0.15            # Relative drift of the fitted line across the phase ('trending')
+}
+
+
+def counter_from_slices(samples: Sequence[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Cumulative (time, bytes) counter from the throughput engine's slice samples."""
+    times = np.array([0.0] + [s['time'] for s in samples], dtype=np.float64)
+    totals = np.concatenate(([0.0], np.cumsum([s['bytes'] for s in samples], dtype=np.float64)))
+    return times, totals
+
+
+def slice_rates(times: np.ndarray, totals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rates in Mbps between successive counter samples.
+
+    Returns (durations, rates); samples that don't advance in time are dropped.
+    """
+    durations = np.diff(times)
+    transferred = np.diff(totals)
+    valid = durations > 0
+    durations = durations[valid]
+    return durations, transferred[valid] * 8 / durations / 1_000_000
+
+
+def active_window(times: np.ndarray, totals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Drop idle samples before the first and after the last byte moved.
+
+    Engines that sample around a blocking call (speedtest-cli) see setup
+    before the transfer and thread joins after it; neither is throughput.
+    """
+    if len(totals) < 2:
+        return times, totals
+    first = max(int(np.searchsorted(totals, totals[0], side='right')) - 1, 0)
+    last = int(np.searchsorted(totals, totals[-1], side='left'))
+    return times[first:last + 1], totals[first:last + 1]
+
+
+def mser_truncation(rates: np.ndarray) -> int:
+    """
+    Number of leading slices to discard as warm-up.
+
+    MSER picks d minimising sum((x[d:] - mean(x[d:]))**2) / (n - d)**2,
+    i.e. the standard error of the remaining mean, over d <= n / 2 so at
+    least half of the run is always kept.
+    """
+    n = len(rates)
+    if n < 4:
+        return 0
+    # Suffix sums give every candidate's SSE in one pass
+    suffix_sum = np.cumsum(rates[::-1])[::-1]
+    suffix_sq = np.cumsum((rates * rates)[::-1])[::-1]
+    candidates = np.arange(n // 2 + 1)
+    remaining = n - candidates
+    sse = suffix_sq[candidates] - suffix_sum[candidates] ** 2 / remaining
+    return int(np.argmin(np.maximum(sse, 0.0) / remaining ** 2))
+
+
+def trimmed_mean(values: Sequence[float], trim_fraction: float, weights: Optional[Sequence[float]] = None) -> float:
+    """
+    Mean of values after dropping trim_fraction of the lowest and highest entries.
+
+    Without trimming the mean is weighted by weights (slice durations), so
+    irregularly spaced samples average to bytes over time.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0.0
+    trim = int(len(values) * trim_fraction)
+    if trim and len(values) - 2 * trim > 0:
+        return float(np.sort(values)[trim:len(values) - trim].mean())
+    return float(np.average(values, weights=weights))
+
+
+def analyze_counter(times: Sequence[float], totals: Sequence[float],
+                    config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Analyze a cumulative byte counter sampled at times (seconds).
+
+    Returns None when there are fewer than two usable samples. precision is
+    the 95% confidence half-width of the stable mean and trend the fitted
+    change across the stable phase, both in percent of the mean.
+    """
+    config = dict(ANALYSIS_CONFIG, **(config or {}))
+    times, totals = active_window(np.asarray(times, dtype=np.float64), np.asarray(totals, dtype=np.float64))
+    durations, rates = slice_rates(times, totals)
+    if len(rates) == 0:
+        return None
+
+    ramp = mser_truncation(rates)
+    stable = rates[ramp:]
+    stable_durations = durations[ramp:]
+    ramp_seconds = float(durations[:ramp].sum())
+    stable_seconds = float(stable_durations.sum())
+
+    mean = trimmed_mean(stable, config['trim_fraction'], stable_durations)
+    stdev = float(stable.std(ddof=1)) if len(stable) > 1 else 0.0
+    cv = stdev / mean if mean > 0 else None
+    precision = 1.96 * stdev / np.sqrt(len(stable)) / mean if mean > 0 and len(stable) > 1 else None
+
+    trend = None
+    if len(stable) > 2 and mean > 0:
+        midpoints = np.cumsum(stable_durations) - stable_durations / 2
+        slope = np.polyfit(midpoints, stable, 1)[0]
+        trend = float(slope * stable_seconds / mean)
+
+    flags = []
+    if stable_seconds < config['min_stable_seconds']:
+        flags.append('short')
+    if len(stable) < config['min_stable_slices']:
+        flags.append('few_samples')
+    if cv is not None and cv > config['max_cv']:
+        flags.append('noisy')
+    if trend is not None and abs(trend) > config['max_trend']:
+        flags.append('trending')
+    if mean <= 0:
+        flags.append('no_data')
+
+    p10, p50, p90 = np.percentile(stable, [10, 50, 90])
+    return {
+        'mbps': round(mean, 3),
+        'p10': round(float(p10), 3),
+        'p50': round(float(p50), 3),
+        'p90': round(float(p90), 3),
+        'stdev': round(stdev, 3),
+        'cv': round(cv, 4) if cv is not None else None,
+        'precision': round(float(precision) * 100, 2) if precision is not None else None,
+        'trend': round(trend * 100, 2) if trend is not None else None,
+        'ramp_seconds': round(ramp_seconds, 3),
+        'stable_seconds': round(stable_seconds, 3),
+        'slices': int(len(rates)),
+        'stable_slices': int(len(stable)),
+        'unstable': bool(flags),
+        'flags': flags
+    }
+
+
+def series(times: Sequence[float], totals: Sequence[float]) -> Dict[str, List[float]]:
+    """JSON-friendly raw counter series."""
+    return {
+        'time': [round(float(t), 4) for t in times],
+        'bytes': [int(b) for b in totals]
+    }
+
+
+class RawSeriesStore:
+    """Raw counter series of recent tests, kept in memory for download."""
+
+    def __init__(self, max_tests: int = 500):
+        self.max_tests = max_tests
+        self._tests: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, test_id: str, method: Optional[str], phases: Dict[str, Dict[str, List[float]]]):
+        """Store the series of each phase ('download', 'upload') for test_id."""
+        with self._lock:
+            self._tests[test_id] = {
+                'test_id': test_id,
+                'method': method,
+                'timestamp': time.time(),
+                'phases': phases
+            }
+            while len(self._tests) > self.max_tests:
+                self._tests.popitem(last=False)
+
+    def get(self, test_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._tests.get(test_id)
+
+    def reset(self):
+        with self._lock:
+            self._tests.clear()
+
+
+def series_csv_rows(record: Dict[str, Any]):
+    """Yield CSV lines (phase,time_s,bytes) for a stored record."""
+    yield "phase,time_s,bytes\n"
+    for phase, data in record['phases'].items():
+        for t, b in zip(data['time'], data['bytes']):
+            yield f"{phase},{t},{b}\n"
@@ -0,0 +1,290 @@
+"""
+UDP echo measurement of packet loss, duplication, reordering and jitter.
+
+The HTTP "ping" can't see packet loss: TCP retransmits hide it. Here the
+prober sends sequenced datagrams at a fixed rate to a UDP echo responder,
+which stamps each one with its own clock and sends it straight back.
+
+Every datagram starts with a 24-byte header (network byte order), and
+the rest of it is padding up to the requested payload size:
+
+    magic      4s   b"WMIP"
+    sequence   I    0..count-1
+    sent_at    d    prober clock when sent
+    echoed_at  d    responder clock when echoed (0 on the way out)
+
+From the echoes the prober derives:
+
+  * loss: sequence numbers never echoed back before the drain timeout
+  * duplicates: extra copies of a sequence number
+  * reordering: first arrivals with a sequence number below one already
+    seen (RFC 4737 "reordered"), and how far back they were
+  * one-way jitter per direction: the RFC 3550 interarrival jitter of
+    echoed_at - sent_at (forward) and received_at - echoed_at (return).
+    The clocks aren't synchronised, but jitter only uses differences of
+    successive transits, so the constant offset cancels
+
+Per-packet work avoids allocation: the send buffer is reused, the
+responder echoes from one preallocated buffer, and arrivals go into
+preallocated arrays indexed by sequence number.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import struct
+import time
+from array import array
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.latency import latency_percentiles
+from app.utils.rate_limit import GCRALimiter
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WMIP"
+HEADER = struct.Struct("!4sIdd")
+# Header fields after the magic, unpacked without copying it out
+_FIELDS = struct.Struct("!Idd")
+_SENT_FIELDS = struct.Struct("!Id")
+_ECHOED_AT = struct.Struct("!d")
+_ECHOED_AT_OFFSET = 16
+
+UDP_PROBE_CONFIG = {
+    'max_count': 1000,
+    'max_rate': 500,                # Packets per second
+    'max_send_duration': 30.0,      # Seconds count packets at rate may take to send
+    'max_payload': 1400,            # Stays under common path MTUs
+    'drain_timeout': 1.0,           # Seconds to wait for echoes after the last send
+    # Probing private addresses from the server would let clients map its network
+    'allow_private_targets': os.getenv("UDP_PROBE_ALLOW_PRIVATE", "false").lower() == "true"
+}
+
+UDP_ECHO_CONFIG = {
+    'port': int(os.getenv("UDP_ECHO_PORT", "0")),   # 0 disables the responder
+    'host': os.getenv("UDP_ECHO_HOST", "0.0.0.0"),
+    # Per-source limits keep the responder from being used as a reflector
+    'limits': [(1.0, 500), (60.0, 6000)]
+}
+
+
+class UDPEchoResponder(asyncio.DatagramProtocol):
+    """Echoes probe datagrams back to their sender with a responder timestamp."""
+
+    def __init__(self, limiter: Optional[GCRALimiter] = None, max_payload: int = UDP_PROBE_CONFIG['max_payload']):
+        self.limiter = limiter
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.echoed = 0
+        self.dropped = 0
+        self._buffer = bytearray(max_payload)
+        self._view = memoryview(self._buffer)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        size = len(data)
+        if size < HEADER.size or size > len(self._buffer) or not data.startswith(MAGIC):
+            self.dropped += 1
+            return
+        if self.limiter is not None and not self.limiter.hit(addr[0])[0]:
+            self.dropped += 1
+            return
+        self._buffer[:size] = data
+        _ECHOED_AT.pack_into(self._buffer, _ECHOED_AT_OFFSET, time.perf_counter())
+        self.transport.sendto(self._view[:size], addr)
+        self.echoed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {'echoed': self.echoed, 'dropped': self.dropped}
+
+
+class UDPProbeStats:
+    """Arrival bookkeeping for one probe run, preallocated for count packets."""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.arrivals = bytearray(count)             # Copies seen per sequence (saturates at 255)
+        self.rtts = array('d', bytes(8 * count))     # First-arrival RTT per sequence, seconds
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.max_reorder_distance = 0
+        self.invalid = 0
+        self.highest_seq = -1
+        self.forward_jitter = 0.0
+        self.return_jitter = 0.0
+        self._forward_transit: Optional[float] = None
+        self._return_transit: Optional[float] = None
+
+    def record(self, data: bytes, received_at: float):
+        """Account for one echoed datagram received at received_at (prober clock)."""
+        if len(data) < HEADER.size or not data.startswith(MAGIC):
+            self.invalid += 1
+            return
+        seq, sent_at, echoed_at = _FIELDS.unpack_from(data, 4)
+        if seq >= self.count:
+            self.invalid += 1
+            return
+
+        seen = self.arrivals[seq]
+        if seen:
+            self.duplicates += 1
+            if seen < 255:
+                self.arrivals[seq] = seen + 1
+            return
+        self.arrivals[seq] = 1
+        self.received += 1
+        self.rtts[seq] = received_at - sent_at
+
+        if seq < self.highest_seq:
+            self.reordered += 1
+            self.max_reorder_distance = max(self.max_reorder_distance, self.highest_seq - seq)
+        else:
+            self.highest_seq = seq
+
+        # RFC 3550 interarrival jitter, J += (|D| - J) / 16, per direction
+        forward = echoed_at - sent_at
+        back = received_at - echoed_at
+        if self._forward_transit is not None:
+            self.forward_jitter += (abs(forward - self._forward_transit) - self.forward_jitter) / 16
+            self.return_jitter += (abs(back - self._return_transit) - self.return_jitter) / 16
+        self._forward_transit = forward
+        self._return_transit = back
+
+    def summary(self, sent: int) -> Dict[str, Any]:
+        """Loss, duplication, reordering, jitter (ms) and RTT percentiles over sent packets."""
+        rtts = [self.rtts[seq] * 1000 for seq in range(sent) if self.arrivals[seq]]
+        lost = sent - self.received
+        return {
+            'packets_sent': sent,
+            'packets_received': self.received,
+            'packets_lost': lost,
+            'loss_percent': round(lost / sent * 100, 2) if sent else 0.0,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'reorder_percent': round(self.reordered / self.received * 100, 2) if self.received else 0.0,
+            'max_reorder_distance': self.max_reorder_distance,
+            'jitter_forward_ms': round(self.forward_jitter * 1000, 3),
+            'jitter_return_ms': round(self.return_jitter * 1000, 3),
+            'rtt': latency_percentiles(rtts, lost),
+            'invalid': self.invalid
+        }
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, stats: UDPProbeStats):
+        self.stats = stats
+        self.errors = 0
+        self.all_received = asyncio.Event()
+
+    def datagram_received(self, data: bytes, addr):
+        self.stats.record(data, time.perf_counter())
+        if self.stats.received == self.stats.count:
+            self.all_received.set()
+
+    def error_received(self, exc):
+        # ICMP port unreachable and friends surface here on connected sockets
+        self.errors += 1
+
+
+async def resolve_target(host: str, port: int) -> Tuple[str, int]:
+    """Resolve host to a (ip, port) address, refusing non-public targets unless allowed."""
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+    if not infos:
+        raise ValueError(f"Could not resolve {host}")
+    address = infos[0][4][:2]
+    if not UDP_PROBE_CONFIG['allow_private_targets'] and not ipaddress.ip_address(address[0]).is_global:
+        raise ValueError(f"{host} resolves to a non-public address")
+    return address
+
+
+async def run_udp_probe(host: str, port: int, count: int = 100, rate: float = 50.0,
+                        payload_size: int = 64, drain_timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Send count sequenced datagrams at rate per second to a UDP echo responder.
+
+    Packets are scheduled against the start time, so a late wakeup sends
+    the packets that are due back to back rather than stretching the run.
+    Raises ValueError for a run longer than max_send_duration.
+    """
+    if rate <= 0 or count / rate > UDP_PROBE_CONFIG['max_send_duration']:
+        raise ValueError(f"Sending {count} packets at {rate}/s would take longer than "
+                         f"{UDP_PROBE_CONFIG['max_send_duration']:g} seconds")
+    payload_size = max(payload_size, HEADER.size)
+    drain_timeout = UDP_PROBE_CONFIG['drain_timeout'] if drain_timeout is None else drain_timeout
+    address = await resolve_target(host, port)
+
+    loop = asyncio.get_running_loop()
+    stats = UDPProbeStats(count)
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _ProbeProtocol(stats), remote_addr=address
+    )
+    buffer = bytearray(payload_size)
+    HEADER.pack_into(buffer, 0, MAGIC, 0, 0.0, 0.0)
+    interval = 1.0 / rate
+
+    try:
+        start = time.perf_counter()
+        for seq in range(count):
+            delay = start + seq * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            _SENT_FIELDS.pack_into(buffer, 4, seq, time.perf_counter())
+            transport.sendto(buffer)
+        send_duration = time.perf_counter() - start
+
+        try:
+            await asyncio.wait_for(protocol.all_received.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        transport.close()
+
+    result = stats.summary(count)
+    result.update({
+        'host': host,
+        'target_ip': address[0],
+        'port': address[1],
+        'rate': rate,
+        'payload_size': payload_size,
+        'send_duration': round(send_duration, 3),
+        'errors': protocol.errors
+    })
+    return result
+
+
+_responder: Optional[UDPEchoResponder] = None
+
+
+async def start_echo_responder(host: Optional[str] = None, port: Optional[int] = None) -> Optional[UDPEchoResponder]:
+    """Start the process-wide echo responder (no-op when the configured port is 0)."""
+    global _responder
+    port = UDP_ECHO_CONFIG['port'] if port is None else port
+    if _responder is not None or not port:
+        return _responder
+    loop = asyncio.get_running_loop()
+    limiter = GCRALimiter(UDP_ECHO_CONFIG['limits'])
+    _, _responder = await loop.create_datagram_endpoint(
+        lambda: UDPEchoResponder(limiter), local_addr=(host or UDP_ECHO_CONFIG['host'], port)
+    )
+    logger.info(f"UDP echo responder listening on {_responder.transport.get_extra_info('sockname')}")
+    return _responder
+
+
+def stop_echo_responder():
+    global _responder
+    if _responder is not None:
+        _responder.transport.close()
+        _responder = None
+
+
+def echo_responder_status() -> Dict[str, Any]:
+    """Whether the responder runs, where, and how much it has echoed."""
+    if _responder is None:
+        return {'enabled': False}
+    host, port = _responder.transport.get_extra_info('sockname')[:2]
+    return {'enabled': True, 'host': host, 'port': port, **_responder.stats()}
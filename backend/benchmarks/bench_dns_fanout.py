@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the raw UDP DNS fan-out engine.
+
+Starts a minimal responder in a separate process - it turns every query
+around as an NXDOMAIN, like a DNSBL saying "not listed" - and sends
+--queries unique DNSBL-style names through DNSFanout from this process,
+with up to --concurrency in flight. Reports:
+
+  * completed queries per second, and the CPU time this process used
+    (the engine runs on one core: one thread, one event loop)
+  * reply latency percentiles
+  * timeouts, retransmits and unmatched replies
+
+For comparison --baseline also runs a slice of the same names through
+dnspython's async resolver, one query object per lookup.
+
+Exits non-zero when throughput is below --min-qps.
+
+Usage:
+    python benchmarks/bench_dns_fanout.py --queries 50000 --concurrency 2000 --min-qps 10000
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.utils.dns_fanout import DNSFanout  # noqa: E402
+from app.utils.latency import latency_percentiles  # noqa: E402
+
+
+def _responder(port_pipe, host: str):
+    """Answer every query with NXDOMAIN, echoing the question (blocking loop, own process)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind((host, 0))
+    port_pipe.send(sock.getsockname()[1])
+    recvfrom, sendto = sock.recvfrom, sock.sendto
+    while True:
+        data, addr = recvfrom(512)
+        if len(data) < 12:
+            continue
+        reply = bytearray(data)
+        reply[2] = 0x80 | (data[2] & 0x79) | 0x04    # QR, opcode and RD kept, AA
+        reply[3] = 0x80 | 0x03                       # RA, NXDOMAIN
+        sendto(reply, addr)
+
+
+def _names(count: int):
+    return [f"{i & 255}.{(i >> 8) & 255}.{(i >> 16) & 255}.10.zen.spamhaus.org" for i in range(count)]
+
+
+async def run_fanout(names, host: str, port: int, concurrency: int, sockets: int):
+    engine = DNSFanout(sockets=sockets, timeout=2.0, retries=1, max_inflight=concurrency)
+    latencies = []
+
+    async def one(name):
+        reply = await engine.query(name, "A", [host], port=port)
+        if reply.error is None:
+            latencies.append(reply.latency_ms)
+
+    cpu_start, start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(one(name) for name in names))
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    stats = engine.stats()
+    engine.close()
+    return elapsed, cpu, latencies, stats
+
+
+async def run_baseline(names, host: str, port: int, concurrency: int):
+    import dns.asyncresolver
+    import dns.resolver
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(name):
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        resolver.nameservers = [host]
+        resolver.port = port
+        async with limit:
+            try:
+                await resolver.resolve(name, "A", lifetime=2.0)
+            except dns.resolver.NXDOMAIN:
+                pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(name) for name in names))
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50_000)
+    parser.add_argument("--concurrency", type=int, default=2000)
+    parser.add_argument("--sockets", type=int, default=4)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--min-qps", type=float, default=10_000)
+    parser.add_argument("--baseline", type=int, default=0, metavar="N",
+                        help="Also resolve the first N names with dnspython's resolver")
+    args = parser.parse_args()
+
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    responder = multiprocessing.Process(target=_responder, args=(sender, args.host), daemon=True)
+    responder.start()
+    port = receiver.recv()
+
+    try:
+        names = _names(args.queries)
+        elapsed, cpu, latencies, stats = asyncio.run(
+            run_fanout(names, args.host, port, args.concurrency, args.sockets)
+        )
+        qps = len(names) / elapsed
+        print(f"DNSFanout: {len(names)} queries in {elapsed:.2f}s = {qps:,.0f} queries/s "
+              f"(CPU {cpu:.2f}s, {cpu / len(names) * 1e6:.1f} us/query)")
+        percentiles = latency_percentiles(latencies)
+        print("  latency ms: " + ", ".join(f"{key} {value}" for key, value in percentiles.items()))
+        print(f"  sockets {stats['sockets']}, timeouts {stats['timeouts']}, retransmits {stats['retransmits']}, "
+              f"unmatched {stats['unmatched_replies']}")
+
+        if args.baseline:
+            baseline = asyncio.run(run_baseline(names[:args.baseline], args.host, port, args.concurrency))
+            print(f"dnspython resolver: {args.baseline} queries in {baseline:.2f}s = "
+                  f"{args.baseline / baseline:,.0f} queries/s")
+    finally:
+        responder.terminate()
+
+    if qps < args.min_qps:
+        print(f"FAIL: {qps:,.0f} queries/s is below {args.min_qps:,.0f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
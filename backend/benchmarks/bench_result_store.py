@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the speed-test result history store.
+
+Fills a temporary store with synthetic results and times grouped
+percentile queries over it, reporting rows scanned per second.
+
+Usage:
+    python benchmarks/bench_result_store.py --rows 20000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.utils.result_store import ResultStore
+
+FILL_BATCH = 1_000_000
+ISPS = [f"ISP {i}" for i in range(200)]
+COUNTRIES = ["US", "DE", "GB", "FR", "UA", "PL", "JP", "BR", "IN", "CA"]
+
+
+def _fill(store: ResultStore, rows: int):
+    rng = np.random.default_rng(1)
+    start_ts = time.time() - 365 * 86400
+    for offset in range(0, rows, FILL_BATCH):
+        n = min(FILL_BATCH, rows - offset)
+        download = rng.lognormal(mean=4.0, sigma=1.0, size=n)
+        store.append_many(
+            {
+                'timestamp': start_ts + np.sort(rng.uniform(0, 365 * 86400, n)),
+                'download': download,
+                'upload': download * rng.uniform(0.1, 1.0, n),
+                'ping': rng.gamma(2.0, 10.0, n),
+                'jitter': rng.gamma(1.5, 2.0, n)
+            },
+            {
+                'isp': [ISPS[i] for i in rng.integers(0, len(ISPS), n)],
+                'country': [COUNTRIES[i] for i in rng.integers(0, len(COUNTRIES), n)],
+                'server': ["Server"] * n,
+                'method': ["Official Ookla CLI"] * n
+            }
+        )
+
+
+def _time(label: str, rows: int, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:7.2f}s  {rows / elapsed / 1e6:7.1f}M rows/s  {len(result['groups'])} groups")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Synthetic rows to generate")
+    parser.add_argument("--dir", help="Existing store directory to query instead of generating one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(args.dir or tmp)
+        if not args.dir:
+            start = time.perf_counter()
+            _fill(store, args.rows)
+            print(f"Filled {args.rows} rows in {time.perf_counter() - start:.2f}s")
+        rows = store.row_count()
+
+        _time("download overall", rows, lambda: store.aggregate('download'))
+        _time("download by isp", rows, lambda: store.aggregate('download', group_by='isp'))
+        _time("ping by country", rows, lambda: store.aggregate('ping', group_by='country'))
+        _time("download by country per day", rows,
+              lambda: store.aggregate('download', group_by='country', bucket_seconds=86400))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the speed-test fallback chain.
+
+Runs _perform_accurate_speed_test and its individual methods against local
+stand-ins instead of the internet:
+
+  * benchmarks/fake_ookla_cli.py replaces the Ookla CLI binary
+  * benchmarks/shaped_speed_server.py provides a bandwidth-shaped
+    __down/__up server plus a fake speedtest.net config, server list and
+    test files for speedtest-cli
+
+and reports, per method, the wall-clock and CPU overhead the backend adds,
+the accuracy against the shaped ground truth, and how concurrent tests
+behave when they share one bottleneck.
+
+Usage:
+    python benchmarks/bench_speed_chain.py --down-mbps 200 --up-mbps 50 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+FAKE_OOKLA = os.path.join(BENCH_DIR, "fake_ookla_cli.py")
+sys.path.insert(0, BACKEND_DIR)
+
+# Must be set before the speed-test module resolves the CLI path
+os.environ["OOKLA_CLI_PATH"] = FAKE_OOKLA
+
+import speedtest
+from app.api.v1 import speed_test
+
+MISSING_CLI = os.path.join(BENCH_DIR, "no-such-cli")
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_shaped_server(port: int, args) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "shaped_speed_server.py"), "--port", str(port),
+        "--down-mbps", str(args.down_mbps), "--up-mbps", str(args.up_mbps),
+        "--latency-ms", str(args.latency_ms)
+    ])
+
+
+async def _wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Shaped server did not start in time")
+
+
+def _redirect_speedtest_net(port: int):
+    """Send speedtest-cli's config and server-list requests to the local stand-in."""
+    original = speedtest.build_request
+
+    def build_request(url, data=None, headers=None, bump='0', secure=False):
+        if "speedtest.net" in url:
+            path = url.split("speedtest.net", 1)[1]
+            url = f"http://127.0.0.1:{port}{path}"
+        return original(url, data=data, headers=headers, bump=bump, secure=secure)
+
+    speedtest.build_request = build_request
+
+
+def _configure_http_fallback(port: int, time_budget: float):
+    base = f"http://127.0.0.1:{port}"
+    speed_test.SPEED_TEST_CONFIG.update({
+        'http_download_url': base + "/__down?bytes={bytes}",
+        'http_upload_url': base + "/__up",
+        'http_latency_url': base + "/__down?bytes=0",
+        'http_time_budget': time_budget
+    })
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def _timed(coro_factory):
+    speed_test.rate_limiter.reset()
+    cpu = _cpu_seconds()
+    start = time.perf_counter()
+    result = await coro_factory()
+    return result, time.perf_counter() - start, _cpu_seconds() - cpu
+
+
+def _error(measured, expected) -> str:
+    if not measured or not expected:
+        return "n/a"
+    return f"{(measured - expected) / expected * 100:+.1f}%"
+
+
+def _report(name: str, result, wall: float, cpu: float, expected_down: float, expected_up: float,
+            expected_ping: float):
+    if not result:
+        print(f"{name:<16} FAILED after {wall:.2f}s")
+        return
+    print(
+        f"{name:<16} wall {wall:6.2f}s  cpu {cpu:5.2f}s  "
+        f"down {result['download_speed']:8.1f} ({_error(result['download_speed'], expected_down)})  "
+        f"up {result['upload_speed']:7.1f} ({_error(result['upload_speed'], expected_up)})  "
+        f"ping {result['ping']:6.1f} ({_error(result['ping'], expected_ping)})"
+    )
+
+
+async def run(args):
+    port = _free_port()
+    server = _start_shaped_server(port, args)
+    try:
+        await _wait_for_port(port)
+        _redirect_speedtest_net(port)
+        _configure_http_fallback(port, args.time_budget)
+
+        os.environ.update({
+            "FAKE_OOKLA_DOWNLOAD_MBPS": str(args.down_mbps),
+            "FAKE_OOKLA_UPLOAD_MBPS": str(args.up_mbps),
+            "FAKE_OOKLA_LATENCY_MS": str(args.latency_ms),
+            "FAKE_OOKLA_DURATION": "0"
+        })
+
+        print(f"Ground truth: down {args.down_mbps} Mbps, up {args.up_mbps} Mbps, RTT {args.latency_ms} ms\n")
+
+        # Ookla path: the fake CLI answers instantly, so wall time is pure backend overhead
+        speed_test.OOKLA_CLI_PATH = FAKE_OOKLA
+        walls, cpus = [], []
+        for _ in range(args.repeat):
+            result, wall, cpu = await _timed(lambda: speed_test._perform_accurate_speed_test(None))
+            walls.append(wall)
+            cpus.append(cpu)
+        _report("ookla (fake)", result, min(walls), min(cpus), args.down_mbps, args.up_mbps, args.latency_ms)
+
+        # speedtest-cli and HTTP engine against the shaped server
+        speed_test.OOKLA_CLI_PATH = MISSING_CLI
+        if not args.skip_speedtest_cli:
+            result, wall, cpu = await _timed(lambda: speed_test._perform_accurate_speed_test(None))
+            _report("speedtest-cli", result, wall, cpu, args.down_mbps, args.up_mbps, args.latency_ms)
+
+            # Again from a warm context: config, servers and best server prefetched
+            speed_test.speedtest_pool.refresh()
+            result, wall, cpu = await _timed(lambda: speed_test._perform_accurate_speed_test(None))
+            _report("speedtest (warm)", result, wall, cpu, args.down_mbps, args.up_mbps, args.latency_ms)
+
+        result, wall, cpu = await _timed(speed_test._run_http_fallback_test)
+        _report("http engine", result, wall, cpu, args.down_mbps, args.up_mbps, args.latency_ms)
+
+        # Concurrency: Ookla tests should overlap in the executor rather than queue
+        os.environ["FAKE_OOKLA_DURATION"] = "1"
+        speed_test.OOKLA_CLI_PATH = FAKE_OOKLA
+        results, wall, _ = await _timed(lambda: asyncio.gather(
+            *(speed_test._perform_accurate_speed_test(None) for _ in range(args.concurrency))
+        ))
+        ok = sum(1 for r in results if r and r.get('success'))
+        print(f"\n{args.concurrency} concurrent ookla tests (1s each): {ok} ok in {wall:.2f}s")
+
+        # Concurrent HTTP engines share the bottleneck: rates should sum to the shaped link
+        results, wall, _ = await _timed(lambda: asyncio.gather(
+            *(speed_test._run_http_fallback_test() for _ in range(args.concurrency))
+        ))
+        downs = [r['download_speed'] for r in results if r]
+        ups = [r['upload_speed'] for r in results if r]
+        print(
+            f"{args.concurrency} concurrent http tests: {len(downs)} ok in {wall:.2f}s, "
+            f"download sum {sum(downs):.1f} Mbps ({_error(sum(downs), args.down_mbps)}), "
+            f"upload sum {sum(ups):.1f} Mbps ({_error(sum(ups), args.up_mbps)})"
+        )
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--down-mbps", type=float, default=200.0)
+    parser.add_argument("--up-mbps", type=float, default=50.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--time-budget", type=float, default=8.0, help="Maximum seconds per HTTP phase")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of the instant fake-Ookla path")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--skip-speedtest-cli", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
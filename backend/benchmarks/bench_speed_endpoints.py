@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the self-hosted speed-test endpoints.
+
+Starts the API under uvicorn on a loopback port and drives
+/api/v1/speed-test/download and /api/v1/speed-test/upload with several
+parallel raw-socket streams, so the client side costs as little CPU as
+possible and the numbers reflect what the backend can push.
+
+Usage:
+    python benchmarks/bench_speed_endpoints.py --streams 4 --duration 5
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.utils.speed_payload import iter_payload
+
+REQUEST_BYTES = 1_000_000_000
+READ_SIZE = 1024 * 1024
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port: int) -> subprocess.Popen:
+    env = os.environ.copy()
+    env.setdefault("SUPABASE_URL", "http://localhost")
+    env.setdefault("SUPABASE_ANON_KEY", "benchmark")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+
+async def _wait_for_server(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+async def _download_stream(port: int, deadline: float, counter: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = (
+        f"GET /api/v1/speed-test/download?bytes={REQUEST_BYTES} HTTP/1.1\r\n"
+        f"Host: 127.0.0.1:{port}\r\nConnection: close\r\n\r\n"
+    )
+    writer.write(request.encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    try:
+        while time.monotonic() < deadline:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            counter[0] += len(data)
+    finally:
+        writer.close()
+
+
+async def _upload_stream(port: int, deadline: float, counter: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = (
+        f"POST /api/v1/speed-test/upload HTTP/1.1\r\n"
+        f"Host: 127.0.0.1:{port}\r\nContent-Type: application/octet-stream\r\n"
+        f"Content-Length: {REQUEST_BYTES}\r\nConnection: close\r\n\r\n"
+    )
+    writer.write(request.encode())
+    try:
+        for chunk in iter_payload(REQUEST_BYTES):
+            if time.monotonic() >= deadline:
+                break
+            writer.write(chunk)
+            await writer.drain()
+            counter[0] += len(chunk)
+    finally:
+        writer.close()
+
+
+async def _run_phase(stream_fn, port: int, streams: int, duration: float) -> float:
+    counter = [0]
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(
+        *(stream_fn(port, deadline, counter) for _ in range(streams)),
+        return_exceptions=True
+    )
+    elapsed = time.monotonic() - start
+    return counter[0] * 8 / elapsed / 1_000_000_000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=4, help="Parallel streams per phase")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per phase")
+    parser.add_argument("--port", type=int, default=0, help="Use an already running server on this port")
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if not port:
+        port = _free_port()
+        server = _start_server(port)
+
+    try:
+        await _wait_for_server(port)
+        download_gbps = await _run_phase(_download_stream, port, args.streams, args.duration)
+        upload_gbps = await _run_phase(_upload_stream, port, args.streams, args.duration)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print(f"Streams:  {args.streams}")
+    print(f"Download: {download_gbps:.2f} Gbps")
+    print(f"Upload:   {upload_gbps:.2f} Gbps")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
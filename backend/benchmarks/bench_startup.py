@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark and import profiler for the API process.
+
+Imports app.main in fresh interpreters and reports:
+
+  * the median wall-clock time of `import app.main` over --runs cold starts
+  * a per-module import profile from `python -X importtime`, by module
+    (self time) and by top-level package (cumulative)
+  * which heavy dependencies were imported eagerly - these are meant to be
+    loaded on first use (see app/utils/lazy.py)
+
+Exits non-zero when the median exceeds --budget-ms or a lazy dependency
+was imported at startup, so CI can run it as a regression check.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 1500 --top 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that routers import lazily; none may be loaded by app.main
+LAZY_MODULES = ["speedtest", "geopy", "whois", "dns.resolver", "aiohttp", "bcrypt", "dateutil"]
+
+_TIMED_IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Blog storage needs these to import; nothing connects during startup
+    env.setdefault("SUPABASE_URL", "http://localhost:1")
+    env.setdefault("SUPABASE_ANON_KEY", "startup-benchmark")
+    return env
+
+
+def timed_import() -> Tuple[float, List[str]]:
+    """(milliseconds, eagerly loaded lazy modules) of one cold import of app.main."""
+    result = subprocess.run(
+        [sys.executable, "-c", _TIMED_IMPORT], cwd=BACKEND_DIR, env=_env(),
+        capture_output=True, text=True, check=True
+    )
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data["ms"], data["loaded"]
+
+
+def import_profile() -> List[Tuple[str, float, float]]:
+    """(module, self_ms, cumulative_ms) for every module app.main imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=BACKEND_DIR, env=_env(),
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        rows.append((fields[2].strip(), int(fields[0]) / 1000, int(fields[1]) / 1000))
+    return rows
+
+
+def by_package(rows: List[Tuple[str, float, float]]) -> List[Tuple[str, float]]:
+    """Total self time per top-level package, largest first."""
+    totals: Dict[str, float] = defaultdict(float)
+    for module, self_ms, _ in rows:
+        totals[module.split(".")[0]] += self_ms
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold imports to time")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")),
+                        help="Maximum median import time (default: $STARTUP_BUDGET_MS or 1500)")
+    parser.add_argument("--top", type=int, default=15, help="Modules and packages to list in the profile")
+    args = parser.parse_args()
+
+    rows = import_profile()
+    print(f"Slowest modules by self time (of {len(rows)} imported):")
+    for module, self_ms, cumulative_ms in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"  {self_ms:8.1f} ms self  {cumulative_ms:8.1f} ms cumulative  {module}")
+    print("Slowest top-level packages:")
+    for package, total_ms in by_package(rows)[:args.top]:
+        print(f"  {total_ms:8.1f} ms  {package}")
+
+    timings = []
+    eager = set()
+    for _ in range(args.runs):
+        ms, loaded = timed_import()
+        timings.append(ms)
+        eager.update(loaded)
+    median = statistics.median(timings)
+    print(f"import app.main: median {median:.0f} ms, min {min(timings):.0f} ms, "
+          f"max {max(timings):.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup instead of on first use: {', '.join(sorted(eager))}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: startup exceeds budget by {median - args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
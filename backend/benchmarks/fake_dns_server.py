@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Local stand-in DNS server for tests and the offline benchmarks.
+
+Answers UDP queries from an in-memory zone, optionally after a fixed
+delay (plus up to `jitter` seconds of random extra delay, so replies
+come back out of order) to emulate a slow or distant resolver:
+
+  * a name and type in the zone get their records (authoritative)
+  * a name in the zone without the type gets an empty NOERROR (NoAnswer)
+  * any other name gets NXDOMAIN
+
+Negative answers carry the enclosing zone's SOA in the authority section,
+with negative_ttl as its MINIMUM, so resolvers can cache them (RFC 2308).
+
+Delegations turn the server into a parent zone: a name at or below a
+delegated zone gets a non-authoritative referral - the zone's NS records
+in the authority section, and glue A records for the nameservers that
+have an address:
+
+    {"com.": [("a.gtld-servers.net.", "127.0.0.2")]}
+
+With tcp=True it also serves DNS over TCP on the same port; with
+truncate=True every UDP response is cut down to an empty TC answer, so
+clients have to retry over TCP.
+
+validating=True plays a DNSSEC-validating resolver: answers to queries
+with the DO or AD bit carry AD, and names in `bogus` get SERVFAIL.
+
+The zone maps names to {type: [rdata, ...]}:
+
+    {"example.com.": {"A": ["93.184.216.34"], "MX": ["10 mail.example.com."]}}
+
+Use it in-process (FakeDNSServer, inside a running event loop) or run it
+on its own.
+
+Usage:
+    python benchmarks/fake_dns_server.py --port 5353 --delay-ms 50
+"""
+
+import argparse
+import asyncio
+import random
+from typing import Dict, List, Optional, Tuple
+
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+Zone = Dict[str, Dict[str, List[str]]]
+Delegations = Dict[str, List[Tuple[str, Optional[str]]]]
+
+SAMPLE_ZONE: Zone = {
+    "example.com.": {
+        "A": ["93.184.216.34"],
+        "AAAA": ["2606:2800:220:1:248:1893:25c8:1946"],
+        "MX": ["10 mail.example.com."],
+        "NS": ["a.iana-servers.net.", "b.iana-servers.net."],
+        "TXT": ['"v=spf1 -all"']
+    },
+    "mail.example.com.": {"A": ["93.184.216.35"]}
+}
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, server: "FakeDNSServer"):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            query = dns.message.from_wire(data)
+        except Exception:
+            return
+        self.server.queries += 1
+        response = self.server.respond(query)
+        if self.server.truncate:
+            response = dns.message.make_response(query)
+            response.flags |= dns.flags.TC
+        wire = response.to_wire()
+        delay = self.server.delay + (random.uniform(0, self.server.jitter) if self.server.jitter else 0.0)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, wire, addr)
+        else:
+            self.transport.sendto(wire, addr)
+
+
+class FakeDNSServer:
+    """UDP DNS server answering from an in-memory zone."""
+
+    def __init__(self, zone: Optional[Zone] = None, delay: float = 0.0, ttl: int = 300,
+                 negative_ttl: Optional[int] = 60, delegations: Optional[Delegations] = None,
+                 tcp: bool = False, truncate: bool = False, validating: bool = False,
+                 bogus: Optional[List[str]] = None, jitter: float = 0.0):
+        self.zone = {name.lower(): types for name, types in (zone if zone is not None else SAMPLE_ZONE).items()}
+        self.delegations = {
+            dns.name.from_text(cut): nameservers for cut, nameservers in (delegations or {}).items()
+        }
+        self.delay = delay
+        self.jitter = jitter
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl  # None leaves the SOA out
+        self.tcp = tcp
+        self.truncate = truncate
+        self.validating = validating
+        self.bogus = {name.lower() for name in (bogus or [])}
+        self.queries = 0
+        self.tcp_queries = 0
+        self._transport = None
+        self._tcp_server = None
+
+    def respond(self, query: "dns.message.Message") -> "dns.message.Message":
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        question = query.question[0]
+        if self._refer(response, question.name):
+            return response
+        if self.validating and question.name.to_text().lower() in self.bogus:
+            response.set_rcode(dns.rcode.SERVFAIL)
+            return response
+        if self.validating and (query.flags & dns.flags.AD or query.ednsflags & dns.flags.DO):
+            response.flags |= dns.flags.AD
+        types = self.zone.get(question.name.to_text().lower())
+        if types is None:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+            self._add_soa(response, question.name)
+            return response
+        values = types.get(dns.rdatatype.to_text(question.rdtype))
+        if values:
+            response.answer.append(dns.rrset.from_text_list(
+                question.name, self.ttl, "IN", question.rdtype, values
+            ))
+        else:
+            self._add_soa(response, question.name)
+        return response
+
+    def _refer(self, response: "dns.message.Message", qname: "dns.name.Name") -> bool:
+        cuts = [cut for cut in self.delegations if qname.is_subdomain(cut)]
+        if not cuts:
+            return False
+        cut = max(cuts, key=len)
+        nameservers = self.delegations[cut]
+        response.flags &= ~dns.flags.AA
+        response.authority.append(dns.rrset.from_text_list(
+            cut, self.ttl, "IN", "NS", [name for name, _ in nameservers]
+        ))
+        for name, address in nameservers:
+            if address:
+                response.additional.append(dns.rrset.from_text(name, self.ttl, "IN", "A", address))
+        return True
+
+    def _add_soa(self, response: "dns.message.Message", qname: "dns.name.Name"):
+        if self.negative_ttl is None:
+            return
+        # The shortest zone name enclosing qname stands in for the zone apex
+        apexes = [dns.name.from_text(name) for name in self.zone]
+        apex = min((name for name in apexes if qname.is_subdomain(name)), key=len, default=dns.name.root)
+        response.authority.append(dns.rrset.from_text(
+            apex, self.ttl, "IN", "SOA",
+            f"{dns.name.from_text('ns1', apex)} {dns.name.from_text('hostmaster', apex)} "
+            f"1 3600 600 86400 {self.negative_ttl}"
+        ))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(self), local_addr=(host, port))
+        if self.tcp:
+            self._tcp_server = await asyncio.start_server(self._serve_tcp, host, self.address[1])
+        return self.address
+
+    async def _serve_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+                query = dns.message.from_wire(await reader.readexactly(length))
+                self.tcp_queries += 1
+                if self.delay > 0:
+                    await asyncio.sleep(self.delay)
+                wire = self.respond(query).to_wire()
+                writer.write(len(wire).to_bytes(2, "big") + wire)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._transport.get_extra_info("sockname")[:2]
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            self._tcp_server = None
+
+
+async def _serve(args):
+    server = FakeDNSServer(delay=args.delay_ms / 1000)
+    host, port = await server.start(args.host, args.port)
+    print(f"Fake DNS server on {host}:{port} ({len(server.zone)} names, {args.delay_ms} ms delay)")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5353)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(_serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Local stand-in DNS-over-TLS and DNS-over-HTTPS servers for tests.
+
+Both answer from a FakeDNSServer's zone (and honour its delay and jitter),
+and count what the client did with its connections:
+
+  * FakeDoTServer speaks RFC 7858: length-prefixed DNS messages on a TLS
+    stream. Each query is answered as soon as it's ready, so pipelined
+    queries can be answered out of order
+  * FakeDoHServer speaks RFC 8484 over HTTP/2 only (ALPN "h2"): POST
+    application/dns-message. Streams are answered concurrently
+
+Certificates come from self_signed_certificate(), which needs the
+openssl command line tool; clients trust the certificate file as a CA.
+
+Usage:
+    python benchmarks/fake_encrypted_dns.py --dot-port 8853 --doh-port 8443
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import ssl
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Optional, Tuple
+
+import dns.message
+import h2.config
+import h2.connection
+import h2.events
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_dns_server import FakeDNSServer  # noqa: E402
+
+
+def self_signed_certificate(directory: str, hostname: str = "localhost") -> Tuple[str, str]:
+    """Write a one-day certificate for hostname and 127.0.0.1; returns (certfile, keyfile)."""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+        "-nodes", "-keyout", keyfile, "-out", certfile, "-days", "1", "-subj", f"/CN={hostname}",
+        "-addext", f"subjectAltName=DNS:{hostname},IP:127.0.0.1"
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def _server_context(certfile: str, keyfile: str, alpn: Optional[str] = None) -> ssl.SSLContext:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    if alpn:
+        context.set_alpn_protocols([alpn])
+    return context
+
+
+class _EncryptedServer:
+    """Connection and query counters, shared by both servers."""
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self.max_inflight = 0  # Most queries outstanding on one connection
+        self._server = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.sockets[0].getsockname()[:2]
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _answer(self, dns_server: FakeDNSServer, query) -> bytes:
+        delay = dns_server.delay
+        if dns_server.jitter:
+            delay += random.uniform(0, dns_server.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        dns_server.queries += 1
+        return dns_server.respond(query).to_wire()
+
+
+class FakeDoTServer(_EncryptedServer):
+    """DNS over TLS from a FakeDNSServer's zone."""
+
+    def __init__(self, dns_server: FakeDNSServer, certfile: str, keyfile: str):
+        super().__init__()
+        self.dns_server = dns_server
+        self.context = _server_context(certfile, keyfile, "dot")
+        self.writers = []
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        self._server = await asyncio.start_server(self._serve, host, port, ssl=self.context)
+        return self.address
+
+    def drop_connections(self):
+        """Close every client connection, as a server shedding idle clients would."""
+        for writer in self.writers:
+            writer.close()
+        self.writers.clear()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.writers.append(writer)
+        inflight = set()
+
+        async def reply(query):
+            wire = await self._answer(self.dns_server, query)
+            if not writer.is_closing():
+                writer.write(len(wire).to_bytes(2, "big") + wire)
+
+        try:
+            while True:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+                query = dns.message.from_wire(await reader.readexactly(length))
+                self.queries += 1
+                task = asyncio.create_task(reply(query))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+                self.max_inflight = max(self.max_inflight, len(inflight))
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            for task in inflight:
+                task.cancel()
+            writer.close()
+
+
+class FakeDoHServer(_EncryptedServer):
+    """DNS over HTTPS (HTTP/2 only) from a FakeDNSServer's zone."""
+
+    def __init__(self, dns_server: FakeDNSServer, certfile: str, keyfile: str, path: str = "/dns-query"):
+        super().__init__()
+        self.dns_server = dns_server
+        self.path = path
+        self.context = _server_context(certfile, keyfile, "h2")
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        self._server = await asyncio.start_server(self._serve, host, port, ssl=self.context)
+        return self.address
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        requests: Dict[int, Tuple[dict, bytearray]] = {}
+        inflight = set()
+
+        async def respond(stream_id: int, headers: dict, body: bytes):
+            if headers.get(":method") != "POST" or headers.get(":path") != self.path:
+                status, wire = "404", b""
+            else:
+                status, wire = "200", await self._answer(self.dns_server, dns.message.from_wire(body))
+            conn.send_headers(stream_id, [
+                (":status", status), ("content-type", "application/dns-message"), ("content-length", str(len(wire)))
+            ])
+            conn.send_data(stream_id, wire, end_stream=True)
+            writer.write(conn.data_to_send())
+
+        try:
+            while data := await reader.read(65536):
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        requests[event.stream_id] = (dict(event.headers), bytearray())
+                    elif isinstance(event, h2.events.DataReceived):
+                        requests[event.stream_id][1].extend(event.data)
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        headers, body = requests.pop(event.stream_id)
+                        self.queries += 1
+                        task = asyncio.create_task(respond(event.stream_id, headers, bytes(body)))
+                        inflight.add(task)
+                        task.add_done_callback(inflight.discard)
+                        self.max_inflight = max(self.max_inflight, len(inflight))
+                writer.write(conn.data_to_send())
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            for task in inflight:
+                task.cancel()
+            writer.close()
+
+
+async def _serve(args):
+    directory = tempfile.mkdtemp()
+    certfile, keyfile = self_signed_certificate(directory)
+    dns_server = FakeDNSServer(delay=args.delay_ms / 1000)
+    dot_host, dot_port = await FakeDoTServer(dns_server, certfile, keyfile).start(args.host, args.dot_port)
+    doh_host, doh_port = await FakeDoHServer(dns_server, certfile, keyfile).start(args.host, args.doh_port)
+    print(f"DoT on {dot_host}:{dot_port}, DoH on https://localhost:{doh_port}/dns-query")
+    print(f"Trust {certfile} (DNS_TLS_CA_FILE)")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--dot-port", type=int, default=8853)
+    parser.add_argument("--doh-port", type=int, default=8443)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(_serve(args))
+
+
+if __name__ == "__main__":
+    main()
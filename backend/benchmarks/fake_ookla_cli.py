@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the Ookla speedtest CLI used by the offline benchmarks.
+
+Accepts the same flags the backend passes and prints JSON shaped like the
+real CLI's --format=json output, or with --format=jsonl an event stream
+whose --progress=yes events follow a TCP slow-start ramp towards the
+reported bandwidth. The reported figures and the simulated
+test duration come from environment variables, so a benchmark can compare
+what the backend returns against a known ground truth:
+
+    FAKE_OOKLA_DOWNLOAD_MBPS  (default 250)
+    FAKE_OOKLA_UPLOAD_MBPS    (default 50)
+    FAKE_OOKLA_LATENCY_MS     (default 12)
+    FAKE_OOKLA_DURATION       seconds to sleep before answering (default 0)
+
+Point the backend at it with OOKLA_CLI_PATH=benchmarks/fake_ookla_cli.py.
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import time
+
+SERVERS = [
+    {"id": 10001, "host": "speedtest.kyiv.example:8080", "port": 8080, "name": "Benchmark Kyiv",
+     "location": "Kyiv", "country": "UA"},
+    {"id": 10002, "host": "speedtest.lviv.example:8080", "port": 8080, "name": "Benchmark Lviv",
+     "location": "Lviv", "country": "UA"},
+    {"id": 20001, "host": "speedtest.nyc.example:8080", "port": 8080, "name": "Benchmark New York",
+     "location": "New York, NY", "country": "US"}
+]
+
+
+def _env(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _phase(mbps: float, elapsed_ms: int, latency: float) -> dict:
+    bandwidth = int(mbps * 1_000_000 / 8)
+    return {
+        "bandwidth": bandwidth,
+        "bytes": bandwidth * elapsed_ms // 1000,
+        "elapsed": elapsed_ms,
+        "latency": {
+            "iqm": round(latency * 3.1, 3),
+            "low": round(latency * 0.9, 3),
+            "high": round(latency * 9.4, 3),
+            "jitter": round(latency * 0.4, 3)
+        }
+    }
+
+
+PROGRESS_INTERVAL_MS = 100
+RAMP_TAU = 0.6  # Seconds for the simulated slow start to reach ~63% of the link rate
+
+
+def _progress(kind: str, mbps: float, elapsed_ms: int):
+    """Progress events for one phase, cumulative bytes following a ramp-up."""
+    rate = mbps * 1_000_000 / 8
+    rng = random.Random(kind)
+    total = 0.0
+    for ms in range(PROGRESS_INTERVAL_MS, elapsed_ms + 1, PROGRESS_INTERVAL_MS):
+        t = ms / 1000
+        ramp = 1 - math.exp(-t / RAMP_TAU)
+        total += rate * ramp * PROGRESS_INTERVAL_MS / 1000 * rng.uniform(0.97, 1.03)
+        yield {"type": kind, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+               kind: {"bandwidth": int(total / t), "bytes": int(total), "elapsed": ms,
+                      "progress": round(ms / elapsed_ms, 3)}}
+
+
+def main():
+    args = sys.argv[1:]
+    if "--servers" in args or "-L" in args:
+        print(json.dumps({"type": "serverList", "servers": SERVERS}))
+        return 0
+
+    server = SERVERS[0]
+    for arg in args:
+        if arg.startswith("--server-id="):
+            wanted = int(arg.split("=", 1)[1])
+            server = next((s for s in SERVERS if s["id"] == wanted), server)
+    if "--server-id" in args:
+        wanted = int(args[args.index("--server-id") + 1])
+        server = next((s for s in SERVERS if s["id"] == wanted), server)
+
+    time.sleep(_env("FAKE_OOKLA_DURATION", 0))
+
+    latency = _env("FAKE_OOKLA_LATENCY_MS", 12)
+    result = {
+        "type": "result",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "ping": {"jitter": round(latency * 0.05, 3), "latency": latency,
+                 "low": round(latency * 0.95, 3), "high": round(latency * 1.1, 3)},
+        "download": _phase(_env("FAKE_OOKLA_DOWNLOAD_MBPS", 250), 10_000, latency),
+        "upload": _phase(_env("FAKE_OOKLA_UPLOAD_MBPS", 50), 10_000, latency),
+        "packetLoss": 0,
+        "isp": "Benchmark ISP",
+        "interface": {"internalIp": "10.0.0.2", "name": "eth0", "isVpn": False, "externalIp": "198.51.100.7"},
+        "server": dict(server, ip="203.0.113.10"),
+        "result": {"id": f"fake-{random.randrange(1 << 32):08x}", "url": "", "persisted": False}
+    }
+    if "--format=jsonl" not in args:
+        print(json.dumps(result))
+        return 0
+
+    print(json.dumps({"type": "testStart", "isp": result["isp"], "server": result["server"]}))
+    if "--progress=yes" in args:
+        for kind in ("download", "upload"):
+            for event in _progress(kind, _env(f"FAKE_OOKLA_{kind.upper()}_MBPS", 250 if kind == "download" else 50),
+                                   result[kind]["elapsed"]):
+                print(json.dumps(event))
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Bandwidth-shaped local speed-test server for the offline benchmarks.
+
+Serves the endpoints the speed-test fallback chain talks to, with all
+connections sharing one token bucket per direction, like a real
+bottleneck link:
+
+    GET  /__down?bytes=N                 Cloudflare-style download
+    POST /__up                           Cloudflare-style upload sink
+    GET  /speedtest-config.php           speedtest.net client config
+    GET  /speedtest-servers-static.php   speedtest.net server list (this server)
+    GET  /speedtest/latency.txt          speedtest.net latency probe
+    GET  /speedtest/randomNxN.jpg        speedtest.net download files
+    POST /speedtest/upload.php           speedtest.net upload sink
+
+Every response is delayed by --latency-ms to emulate a round trip.
+
+Usage:
+    python benchmarks/shaped_speed_server.py --port 8089 --down-mbps 200 --up-mbps 50
+"""
+
+import argparse
+import asyncio
+import re
+import time
+from urllib.parse import urlsplit, parse_qs
+
+CHUNK_SIZE = 16 * 1024
+PAYLOAD = bytes(CHUNK_SIZE)
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class TokenBucket:
+    """Shared byte budget refilled at a fixed rate."""
+
+    def __init__(self, mbps: float, burst_bytes: int = 64 * 1024):
+        self.rate = mbps * 1_000_000 / 8
+        self.burst = burst_bytes
+        self.tokens = float(burst_bytes)
+        self.updated = time.monotonic()
+
+    async def consume(self, count: int):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= count:
+                self.tokens -= count
+                return
+            await asyncio.sleep((count - self.tokens) / self.rate)
+
+
+def _config_xml(port: int) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><settings>'
+        '<client ip="127.0.0.1" lat="50.45" lon="30.52" isp="Benchmark ISP" isprating="3.7" '
+        'rating="0" ispdlavg="0" ispulavg="0" loggedin="0" country="UA" />'
+        '<server-config threadcount="4" ignoreids="" notonmap="" forcepingid="" preferredserverid="" />'
+        '<download testlength="10" initialtest="250K" mintestsize="250K" threadsperurl="4" />'
+        '<upload testlength="10" ratio="5" initialtest="0" mintestsize="32K" threads="2" '
+        'maxchunksize="512K" maxchunkcount="50" threadsperurl="4" />'
+        '</settings>'
+    ).encode()
+
+
+def _servers_xml(port: int) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><settings><servers>'
+        f'<server url="http://127.0.0.1:{port}/speedtest/upload.php" lat="50.45" lon="30.52" '
+        f'name="Kyiv" country="Ukraine" cc="UA" sponsor="Benchmark" id="10001" host="127.0.0.1:{port}" />'
+        '</servers></settings>'
+    ).encode()
+
+
+class ShapedServer:
+    def __init__(self, port: int, down_mbps: float, up_mbps: float, latency_ms: float):
+        self.port = port
+        self.down = TokenBucket(down_mbps)
+        self.up = TokenBucket(up_mbps)
+        self.latency = latency_ms / 1000
+
+    async def _send_body(self, writer: asyncio.StreamWriter, size: int):
+        remaining = size
+        while remaining > 0:
+            n = min(CHUNK_SIZE, remaining)
+            await self.down.consume(n)
+            writer.write(PAYLOAD[:n])
+            await writer.drain()
+            remaining -= n
+
+    async def _drain_body(self, reader: asyncio.StreamReader, size: int) -> int:
+        received = 0
+        while received < size:
+            data = await reader.read(min(CHUNK_SIZE, size - received))
+            if not data:
+                break
+            received += len(data)
+            # Not reading again until the bytes are paid for lets TCP backpressure throttle the sender
+            await self.up.consume(len(data))
+        return received
+
+    async def _respond(self, writer, status: str, body: bytes = b"", length: int = None,
+                       content_type: str = "text/plain"):
+        length = len(body) if length is None else length
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {length}\r\n"
+            f"Cache-Control: no-store\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                url = urlsplit(target)
+                body_length = int(headers.get("content-length", 0))
+                received = await self._drain_body(reader, body_length) if body_length else 0
+                await asyncio.sleep(self.latency)
+
+                path = url.path
+                if path == "/__down":
+                    size = int(parse_qs(url.query).get("bytes", ["0"])[0])
+                    await self._respond(writer, "200 OK", length=size, content_type="application/octet-stream")
+                    await self._send_body(writer, size)
+                elif path in ("/__up", "/speedtest/upload.php"):
+                    body = f"size={received}".encode() if path.endswith(".php") else b"{}"
+                    await self._respond(writer, "200 OK", body)
+                elif path == "/speedtest-config.php":
+                    await self._respond(writer, "200 OK", _config_xml(self.port), content_type="text/xml")
+                elif path.startswith("/speedtest-servers"):
+                    await self._respond(writer, "200 OK", _servers_xml(self.port), content_type="text/xml")
+                elif path == "/speedtest/latency.txt":
+                    await self._respond(writer, "200 OK", b"test=test\n")
+                elif re.fullmatch(r"/speedtest/random(\d+)x\d+\.jpg", path):
+                    side = int(re.fullmatch(r"/speedtest/random(\d+)x\d+\.jpg", path).group(1))
+                    # Roughly the size of the real JPEG files (random4000x4000.jpg is ~31MB)
+                    size = side * side * 2
+                    await self._respond(writer, "200 OK", length=size, content_type="image/jpeg")
+                    await self._send_body(writer, size)
+                else:
+                    await self._respond(writer, "404 Not Found", b"not found")
+
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            return
+        finally:
+            writer.close()
+
+
+async def serve(port: int, down_mbps: float, up_mbps: float, latency_ms: float, ready=None):
+    """Run the server until cancelled; ready (an asyncio.Event) is set once listening."""
+    shaped = ShapedServer(port, down_mbps, up_mbps, latency_ms)
+    server = await asyncio.start_server(shaped.handle, "127.0.0.1", port, limit=MAX_HEADER_BYTES)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--down-mbps", type=float, default=200.0)
+    parser.add_argument("--up-mbps", type=float, default=50.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.port, args.down_mbps, args.up_mbps, args.latency_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
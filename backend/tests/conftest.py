@@ -10,6 +10,9 @@ from typing import AsyncGenerator, Generator
 # Add the app directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+# No background speedtest.net fetches while tests patch speedtest-cli
+os.environ.setdefault("SPEEDTEST_WARM_POOL", "false")
+
 from app.main import app
 
 @pytest.fixture(scope="session")
@@ -130,6 +133,24 @@ def setup_test_environment():
     if 'DISABLE_RELOAD' in os.environ:
         del os.environ['DISABLE_RELOAD']
 
+@pytest.fixture(autouse=True)
+def reset_speed_test_limiters():
+    """Give every test a fresh upstream quota, per-client budget and reuse cache."""
+    from app.api.v1.speed_test import rate_limiter, client_rate_limiter, speed_result_cache
+    rate_limiter.reset()
+    client_rate_limiter.reset()
+    speed_result_cache.reset()
+    yield
+
+@pytest.fixture(autouse=True)
+def isolated_result_store(tmp_path, monkeypatch):
+    """Keep recorded speed-test results out of the real history store."""
+    from app.utils.result_store import result_store
+    monkeypatch.setattr(result_store, "directory", str(tmp_path / "speed_results"))
+    monkeypatch.setattr(result_store, "_dictionaries", None)
+    monkeypatch.setattr(result_store, "_codes", {})
+    yield result_store
+
 @pytest.fixture
 def mock_file_system():
     """Mock file system operations."""
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.cancellation import (
+    CancellationToken, current_token, run_in_thread, run_subprocess, run_until_disconnected
+)
+
+
+def _request(disconnect_after: float = None) -> Request:
+    """Request whose client disconnects after disconnect_after seconds (never if None)."""
+    scope = {
+        "type": "http", "method": "POST", "path": "/test", "headers": [],
+        "query_string": b"", "server": ("test", 80), "scheme": "http"
+    }
+
+    async def receive():
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    return Request(scope, receive)
+
+
+async def _reaped(pid: int, timeout: float = 2.0) -> bool:
+    """Whether pid is gone within timeout (the executor thread reaps it shortly after the kill)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+class TestCancellation:
+    """Test suite for client-disconnect cancellation."""
+
+    @pytest.mark.unit
+    def test_token_runs_callbacks_once(self):
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append("a"))
+        unregister = token.add_callback(lambda: calls.append("b"))
+        unregister()
+        token.cancel()
+        token.cancel()
+        assert calls == ["a"]
+
+        # Late registrations fire immediately
+        token.add_callback(lambda: calls.append("late"))
+        assert calls == ["a", "late"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_completed_work_returns_result(self):
+        async def work():
+            assert current_token() is not None
+            return await run_in_thread(lambda: current_token() is not None)
+
+        assert await run_until_disconnected(_request(), work()) is True
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_disconnect_kills_child_process(self, tmp_path):
+        pid_file = tmp_path / "child.pid"
+        child = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"
+
+        start = time.monotonic()
+        with pytest.raises(HTTPException) as exc_info:
+            await run_until_disconnected(
+                _request(disconnect_after=0.5),
+                run_in_thread(run_subprocess, [sys.executable, "-c", child], 60)
+            )
+
+        assert exc_info.value.status_code == 499
+        assert time.monotonic() - start < 5
+        assert await _reaped(int(pid_file.read_text()))
+
+    @pytest.mark.unit
+    def test_run_subprocess_without_token(self):
+        result = run_subprocess([sys.executable, "-c", "print('ok')"], capture_output=True, text=True, timeout=10)
+        assert result.returncode == 0
+        assert result.stdout.strip() == "ok"
+
@@ -0,0 +1,94 @@
+import os
+import sys
+
+import httpx
+import pytest
+
+from app.utils import dns_benchmark
+from app.utils.dns_benchmark import benchmark_resolver, parse_resolver
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+@pytest.fixture
+def local_names(monkeypatch):
+    """Point the probe names at the stand-in servers' zone."""
+    config = dns_benchmark.DNS_BENCHMARK_CONFIG
+    monkeypatch.setitem(config, "cached_names", ["example.com", "mail.example.com"])
+    monkeypatch.setitem(config, "uncached_zones", ["example.com"])
+    monkeypatch.setitem(config, "dnssec_signed", "example.com")
+    monkeypatch.setitem(config, "dnssec_bogus", "bogus.example.com")
+    monkeypatch.setitem(config, "timeout", 0.5)
+
+
+class TestDNSBenchmark:
+    """Test suite for the resolver latency benchmark."""
+
+    @pytest.mark.unit
+    def test_parse_resolver(self):
+        assert parse_resolver("1.1.1.1") == ("1.1.1.1", 53)
+        assert parse_resolver("9.9.9.9:5353") == ("9.9.9.9", 5353)
+        assert parse_resolver("2606:4700:4700:0::1111") == ("2606:4700:4700::1111", 53)
+        assert parse_resolver("[2606:4700:4700::1111]:853") == ("2606:4700:4700::1111", 853)
+        with pytest.raises(ValueError):
+            parse_resolver("resolver.example")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_validating_resolver(self, local_names):
+        server = FakeDNSServer(validating=True, bogus=["bogus.example.com."])
+        host, port = await server.start()
+        try:
+            result = await benchmark_resolver(host, port, probes=8)
+        finally:
+            server.close()
+
+        assert result["cached"]["samples"] == 8
+        assert result["uncached"]["samples"] == 8
+        assert result["uncached"]["p50"] <= result["uncached"]["p99"]
+        assert result["timeout_rate"] == 0.0
+        assert result["dnssec"] == {"authenticated_data": True, "rejects_bogus": True, "validating": True}
+        # Warm-up, cached and uncached probes, and the two DNSSEC probes
+        assert server.queries == 2 + 8 + 8 + 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_non_validating_and_unresponsive(self, local_names):
+        plain = FakeDNSServer()
+        plain_host, plain_port = await plain.start()
+        slow = FakeDNSServer(delay=2.0)
+        slow_host, slow_port = await slow.start()
+        try:
+            plain_result = await benchmark_resolver(plain_host, plain_port, probes=4)
+            slow_result = await benchmark_resolver(slow_host, slow_port, probes=4)
+        finally:
+            plain.close()
+            slow.close()
+
+        assert not plain_result["dnssec"]["validating"]
+        assert slow_result["timeout_rate"] == 100.0
+        assert slow_result["cached"] is None
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_benchmark_endpoint(self, local_names, monkeypatch):
+        from app.main import app
+
+        server = FakeDNSServer()
+        host, port = await server.start()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                body = {"resolvers": [f"{host}:{port}"], "probes": 3, "include_system": False}
+                refused = await client.post("/api/v1/dns-benchmark", json=body)
+                monkeypatch.setitem(dns_benchmark.DNS_BENCHMARK_CONFIG, "allow_private_resolvers", True)
+                response = await client.post("/api/v1/dns-benchmark", json=body)
+        finally:
+            server.close()
+
+        assert refused.status_code == 400
+        assert response.status_code == 200
+        data = response.json()
+        assert data["fastest"] == host
+        assert data["resolvers"][0]["source"] == "user"
+        assert data["resolvers"][0]["uncached"]["samples"] == 3
@@ -0,0 +1,138 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+from collections import Counter
+
+import dns.asyncresolver
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils import dns_cache
+from app.utils.dns_bulk import BulkQuery, dedupe, parse_lines, run_bulk
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+@pytest_asyncio.fixture
+async def local_dns(monkeypatch):
+    """Shared resolver pointed at a local DNS server."""
+    server = FakeDNSServer()
+    host, port = await server.start()
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    resolver.timeout = resolver.lifetime = 5
+    monkeypatch.setattr(dns_cache, "_resolver", resolver)
+    dns_cache.dns_cache.reset()
+    yield server
+    server.close()
+
+
+async def _api_post(path: str, **kwargs) -> httpx.Response:
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post(path, **kwargs)
+
+
+class TestDNSBulk:
+    """Test suite for bulk DNS resolution."""
+
+    @pytest.mark.unit
+    def test_dedupe_and_parse(self):
+        lines = [
+            "# portfolio", "domain,types,resolver", "",
+            "Example.com.,A;MX", "example.com,a", "mail.example.com,,9.9.9.9"
+        ]
+        queries = dedupe(parse_lines(lines, ["A"]))
+        assert queries == [
+            BulkQuery("example.com", "A", "system"),
+            BulkQuery("example.com", "MX", "system"),
+            BulkQuery("mail.example.com", "A", "9.9.9.9")
+        ]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_per_resolver_limit_and_fairness(self):
+        queries = [BulkQuery(f"d{i}.example", "A", "busy") for i in range(40)]
+        queries.append(BulkQuery("quiet.example", "A", "quiet"))
+        active, peak, order = Counter(), Counter(), []
+
+        async def query_fn(query):
+            active[query.resolver] += 1
+            peak[query.resolver] = max(peak[query.resolver], active[query.resolver])
+            await asyncio.sleep(0.01)
+            active[query.resolver] -= 1
+            order.append(query.resolver)
+            return {"domain": query.domain}
+
+        rows = [row async for row in run_bulk(queries, query_fn, concurrency=16, per_resolver=4)]
+
+        assert len(rows) == 41
+        assert peak["busy"] == 4
+        # The lone query for the other resolver isn't queued behind the busy one
+        assert order.index("quiet") < 4
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_slow_reader_applies_backpressure(self):
+        started = 0
+
+        async def query_fn(query):
+            nonlocal started
+            started += 1
+            return {"domain": query.domain}
+
+        queries = [BulkQuery(f"d{i}.example", "A", "system") for i in range(500)]
+        rows = run_bulk(queries, query_fn, concurrency=8, per_resolver=8)
+        await rows.__anext__()
+        await asyncio.sleep(0.05)
+
+        # Bounded by the result queue and the workers, not the input size
+        assert started <= 1 + 8 + 8
+        await rows.aclose()
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_bulk_endpoint_streams_ndjson(self, local_dns):
+        response = await _api_post("/api/v1/dns-lookup/bulk", json={
+            "record_types": ["A"],
+            "items": [
+                {"domain": "example.com", "record_types": ["A", "MX"]},
+                {"domain": "EXAMPLE.com"},
+                {"domain": "nothing.example.com"},
+                {"domain": "not a domain"}
+            ]
+        })
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = {(row["domain"], row["type"]): row for row in map(json.loads, response.text.splitlines())}
+        assert len(rows) == 4
+        assert rows[("example.com", "A")]["values"] == ["93.184.216.34"]
+        assert rows[("example.com", "MX")]["ttl"] == 300
+        assert rows[("nothing.example.com", "A")]["status"] == "NXDOMAIN"
+        assert rows[("not a domain", "A")]["status"] == "INVALID"
+        assert local_dns.queries == 3
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_bulk_upload_streams_csv(self, local_dns):
+        upload = "domain\nexample.com,A TXT\nmail.example.com\nexample.com,A,10.0.0.1\n"
+        response = await _api_post(
+            "/api/v1/dns-lookup/bulk/upload",
+            params={"format": "csv"},
+            files={"file": ("domains.csv", upload.encode(), "text/csv")}
+        )
+
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        values = {(row["domain"], row["type"], row["resolver"]): row for row in rows}
+        assert values[("example.com", "TXT", "system")]["values"] == "v=spf1 -all"
+        assert values[("mail.example.com", "A", "system")]["values"] == "93.184.216.35"
+        assert values[("example.com", "A", "10.0.0.1")]["status"] == "INVALID"
@@ -0,0 +1,125 @@
+import os
+import sys
+
+import dns.asyncresolver
+import pytest
+import pytest_asyncio
+
+from app.utils import dns_cache
+from app.utils.dns_cache import DNSCache, NODATA, NOERROR, NXDOMAIN, resolve
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+def _resolver(host: str, port: int) -> "dns.asyncresolver.Resolver":
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    resolver.timeout = resolver.lifetime = 5
+    return resolver
+
+
+@pytest_asyncio.fixture
+async def server(monkeypatch):
+    """Local DNS server (300 s positive, 60 s negative TTL) behind the shared resolver."""
+    server = FakeDNSServer(ttl=300, negative_ttl=60)
+    host, port = await server.start()
+    monkeypatch.setattr(dns_cache, "_resolver", _resolver(host, port))
+    monkeypatch.setattr(dns_cache, "dns_cache", DNSCache())
+    yield server
+    server.close()
+
+
+class TestDNSCache:
+    """Test suite for the shared TTL-honouring DNS cache."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_hit_skips_upstream_query(self, server):
+        first = await resolve("example.com", "A")
+        second = await resolve("EXAMPLE.com.", "a")
+
+        assert server.queries == 1
+        assert (first.status, first.from_cache) == (NOERROR, False)
+        assert second.from_cache
+        assert [str(rdata) for rdata in second] == ["93.184.216.34"]
+        assert dns_cache.dns_cache.stats()["hits"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_entries_expire_with_ttl(self, server):
+        answer = await resolve("example.com", "A")
+        assert answer.info() == {"status": NOERROR, "ttl": 300, "cached": False}
+
+        now = answer.expires_at - 300
+        assert answer.remaining(now + 120) == 180
+
+        cache = dns_cache.dns_cache
+        key = ("example.com", "A", dns_cache.resolver_key(dns_cache.get_resolver()))
+        assert cache.get(key, now + 299).remaining(now + 299) == 1
+        assert cache.get(key, now + 300) is None
+
+        await resolve("example.com", "A")
+        assert server.queries == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_ttl_floor_and_ceiling(self, server, monkeypatch):
+        monkeypatch.setitem(dns_cache.DNS_CACHE_CONFIG, "max_ttl", 30)
+        assert (await resolve("example.com", "A")).ttl == 30
+
+        server.ttl = 0
+        monkeypatch.setitem(dns_cache.DNS_CACHE_CONFIG, "min_ttl", 10)
+        answer = await resolve("mail.example.com", "A")
+        assert answer.ttl == 10
+        await resolve("mail.example.com", "A")
+        assert server.queries == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_negative_answers_cached_for_soa_minimum(self, server):
+        missing = await resolve("nothing.example.com", "A")
+        empty = await resolve("mail.example.com", "MX")
+        assert (missing.status, missing.ttl, len(missing)) == (NXDOMAIN, 60, 0)
+        assert (empty.status, empty.ttl, list(empty)) == (NODATA, 60, [])
+
+        assert (await resolve("nothing.example.com", "A")).from_cache
+        assert (await resolve("mail.example.com", "MX")).from_cache
+        assert server.queries == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_negative_answers_without_soa_not_cached(self, server):
+        server.negative_ttl = None
+        await resolve("nothing.example.com", "A")
+        await resolve("nothing.example.com", "A")
+        assert server.queries == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_resolvers_do_not_share_entries(self, server):
+        other = FakeDNSServer(zone={"example.com.": {"A": ["192.0.2.1"]}})
+        host, port = await other.start()
+        try:
+            default = await resolve("example.com", "A")
+            explicit = await resolve("example.com", "A", resolver=_resolver(host, port))
+        finally:
+            other.close()
+
+        assert [str(rdata) for rdata in default] == ["93.184.216.34"]
+        assert [str(rdata) for rdata in explicit] == ["192.0.2.1"]
+        assert (server.queries, other.queries) == (1, 1)
+
+    @pytest.mark.unit
+    def test_nameserver_resolvers_are_bounded(self, monkeypatch):
+        monkeypatch.setattr(dns_cache, "_nameserver_resolvers", dns_cache.OrderedDict())
+        monkeypatch.setitem(dns_cache.DNS_CACHE_CONFIG, "max_nameserver_resolvers", 4)
+        first = dns_cache.resolver_for("192.0.2.1")
+        for i in range(2, 10):
+            dns_cache.resolver_for(f"192.0.2.{i}")
+            # Kept in use, so never the least recently used
+            assert dns_cache.resolver_for("192.0.2.1") is first
+
+        assert len(dns_cache._nameserver_resolvers) == 4
+        assert ("192.0.2.2", 53) not in dns_cache._nameserver_resolvers
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import shutil
+import ssl
+import sys
+
+import dns.exception
+import dns.rcode
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils import dns_cache, dns_encrypted
+from app.utils.dns_encrypted import DoHClient, DoTConnection, tls_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+from fake_encrypted_dns import FakeDoHServer, FakeDoTServer, self_signed_certificate
+
+
+pytestmark = pytest.mark.skipif(shutil.which("openssl") is None, reason="needs openssl to make a certificate")
+
+NAMES = ["example.com", "mail.example.com", "nothing.example.com"]
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    return self_signed_certificate(str(tmp_path_factory.mktemp("tls")))
+
+
+@pytest_asyncio.fixture
+async def upstreams(certificate, monkeypatch):
+    """Local DoT and DoH servers, configured as the encrypted upstreams and trusted."""
+    certfile, keyfile = certificate
+    zone_server = FakeDNSServer(jitter=0.01)
+    dot = FakeDoTServer(zone_server, certfile, keyfile)
+    doh = FakeDoHServer(zone_server, certfile, keyfile)
+    dot_host, dot_port = await dot.start()
+    _, doh_port = await doh.start()
+
+    config = dns_encrypted.DNS_TRANSPORT_CONFIG
+    monkeypatch.setitem(config, "ca_file", certfile)
+    monkeypatch.setitem(config, "doh_url", f"https://localhost:{doh_port}/dns-query")
+    monkeypatch.setitem(config, "dot_server", dot_host)
+    monkeypatch.setitem(config, "dot_port", dot_port)
+    monkeypatch.setitem(config, "dot_hostname", "localhost")
+    monkeypatch.setattr(dns_encrypted, "_clients", {})
+    dns_cache.dns_cache.reset()
+    yield dot, doh
+    for client in dns_encrypted._clients.values():
+        if isinstance(client, DoHClient):
+            await client.close()
+        else:
+            client.close()
+    dot.close()
+    doh.close()
+
+
+class TestEncryptedDNS:
+    """Test suite for the DNS-over-TLS and DNS-over-HTTPS transports."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_dot_pipelines_on_one_connection(self, upstreams):
+        dot, _ = upstreams
+        client = DoTConnection(*dot.address, server_hostname="localhost")
+        try:
+            replies = await asyncio.gather(*(client.query(name, "A") for name in NAMES * 30))
+        finally:
+            client.close()
+
+        assert [reply.rcode() for reply in replies[:3]] == [dns.rcode.NOERROR, dns.rcode.NOERROR, dns.rcode.NXDOMAIN]
+        assert replies[1].answer[0][0].to_text() == "93.184.216.35"
+        assert dot.connections == 1
+        assert dot.queries == 90
+        # Queries were written without waiting for the replies before them
+        assert dot.max_inflight > 1
+        assert client.stats()["max_inflight"] > 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_dot_reconnects_after_server_close(self, upstreams):
+        dot, _ = upstreams
+        client = DoTConnection(*dot.address, server_hostname="localhost")
+        try:
+            await client.query("example.com", "A")
+            dot.drop_connections()
+            await asyncio.sleep(0.05)
+            reply = await client.query("example.com", "A")
+        finally:
+            client.close()
+
+        assert reply.answer[0][0].to_text() == "93.184.216.34"
+        assert client.connections == dot.connections == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_dot_rejects_untrusted_certificate(self, upstreams):
+        dot, _ = upstreams
+        client = DoTConnection(*dot.address, server_hostname="localhost", context=ssl.create_default_context())
+        with pytest.raises(dns.exception.DNSException):
+            await client.query("example.com", "A")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_doh_multiplexes_over_http2(self, upstreams):
+        _, doh = upstreams
+        client = DoHClient(f"https://localhost:{doh.address[1]}/dns-query", tls_context())
+        try:
+            replies = await asyncio.gather(*(client.query(name, "A") for name in NAMES * 30))
+        finally:
+            await client.close()
+
+        assert replies[0].answer[0][0].to_text() == "93.184.216.34"
+        assert replies[2].rcode() == dns.rcode.NXDOMAIN
+        assert client.stats()["http_version"] == "HTTP/2"
+        assert doh.queries == 90
+        assert doh.connections <= dns_encrypted.DNS_TRANSPORT_CONFIG["max_connections"]
+        assert doh.max_inflight > 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_resolve_selects_transport(self, upstreams, monkeypatch):
+        dot, doh = upstreams
+        dot_answer = await dns_cache.resolve("example.com", "A", transport="dot")
+        doh_answer = await dns_cache.resolve("example.com", "A", transport="doh")
+        assert [str(rdata) for rdata in dot_answer] == [str(rdata) for rdata in doh_answer] == ["93.184.216.34"]
+        assert (dot.queries, doh.queries) == (1, 1)
+
+        # Answers are cached per upstream; the global default applies to the system resolver
+        monkeypatch.setitem(dns_encrypted.DNS_TRANSPORT_CONFIG, "default", "dot")
+        assert (await dns_cache.resolve("example.com", "A")).from_cache
+        missing = await dns_cache.resolve("nothing.example.com", "A")
+        assert missing.status == dns_cache.NXDOMAIN
+        assert dot.queries == 2
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_dns_lookup_transport_parameter(self, upstreams):
+        from app.main import app
+
+        _, doh = upstreams
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/api/v1/dns-lookup", params={"domain": "example.com", "record_types": "A,MX", "transport": "doh"}
+            )
+            servers = await client.get("/api/v1/dns-servers")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["transport"] == "doh"
+        assert {record["value"] for record in data["records"]} == {"93.184.216.34", "10 mail.example.com."}
+        assert doh.queries == 2
+        assert doh.connections == 1
+        assert servers.json()["transport"]["clients"]["doh"]["queries"] == 2
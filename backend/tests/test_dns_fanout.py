@@ -0,0 +1,218 @@
+import asyncio
+import os
+import socket
+import sys
+
+import dns.asyncresolver
+import dns.message
+import dns.rcode
+import pytest
+import pytest_asyncio
+
+from app.api.v1.blacklist_check import check_dnsbl_real
+from app.utils import dns_cache
+from app.utils.dns_fanout import DNSFanout
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+DNSBL_ZONE = {
+    "2.0.0.127.zen.spamhaus.org.": {"A": ["127.0.0.2"]},
+    "zen.spamhaus.org.": {"NS": ["ns.zen.spamhaus.org."]}
+}
+
+
+class _ScriptedServer(asyncio.DatagramProtocol):
+    """Replies to each query with forged packets first, then the real answer."""
+
+    def __init__(self, server: FakeDNSServer):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        query = dns.message.from_wire(data)
+        answer = self.server.respond(query)
+        wrong_id = dns.message.from_wire(answer.to_wire())
+        wrong_id.id = (query.id + 1) % 65536
+        wrong_question = self.server.respond(dns.message.make_query("mail.example.com", "A"))
+        wrong_question.id = query.id
+        for forged in (wrong_id, wrong_question, answer):
+            self.transport.sendto(forged.to_wire(), addr)
+
+
+@pytest.fixture
+def engine():
+    engine = DNSFanout(sockets=2, timeout=1.0, retries=1)
+    yield engine
+    engine.close()
+
+
+@pytest_asyncio.fixture
+async def local_dns(monkeypatch):
+    """Shared resolver pointed at a local DNS server that also serves a DNSBL zone."""
+    server = FakeDNSServer(zone=dict(FakeDNSServer().zone, **DNSBL_ZONE))
+    host, port = await server.start()
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    resolver.timeout = resolver.lifetime = 2
+    monkeypatch.setattr(dns_cache, "_resolver", resolver)
+    dns_cache.dns_cache.reset()
+    yield server
+    server.close()
+
+
+class TestDNSFanout:
+    """Test suite for the raw UDP DNS fan-out engine."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_many_queries_share_socket_pool(self, engine):
+        server = FakeDNSServer()
+        host, port = await server.start()
+        try:
+            names = ["example.com", "mail.example.com", "nothing.example.com"] * 100
+            replies = await asyncio.gather(*(engine.query(name, "A", [host], port=port) for name in names))
+        finally:
+            server.close()
+
+        assert engine.stats()["sockets"] == 2
+        assert [reply.rcode for reply in replies[:3]] == [dns.rcode.NOERROR, dns.rcode.NOERROR, dns.rcode.NXDOMAIN]
+        assert replies[0].answer_count == 1
+        assert replies[1].message().answer[0][0].to_text() == "93.184.216.35"
+        assert all(reply.error is None for reply in replies)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_forged_replies_are_dropped(self, engine):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _ScriptedServer(FakeDNSServer()), local_addr=("127.0.0.1", 0)
+        )
+        try:
+            host, port = transport.get_extra_info("sockname")[:2]
+            reply = await engine.query("example.com", "A", [host], port=port)
+        finally:
+            transport.close()
+
+        assert reply.message().answer[0][0].to_text() == "93.184.216.34"
+        await asyncio.sleep(0.05)
+        assert engine.stats()["unmatched_replies"] >= 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_retransmit_moves_to_next_nameserver(self, engine):
+        server = FakeDNSServer()
+        _, port = await server.start("127.0.0.2")
+        # Nothing answers on 127.0.0.1 at that port
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", port))
+        try:
+            reply = await engine.query("example.com", "A", ["127.0.0.1", "127.0.0.2"], port=port)
+        finally:
+            silent.close()
+            server.close()
+
+        assert reply.nameserver == "127.0.0.2"
+        assert reply.latency_ms >= 500
+        assert engine.stats()["retransmits"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_retransmit_switches_address_family(self, engine):
+        server = FakeDNSServer()
+        _, port = await server.start("::1")
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", port))
+        try:
+            reply = await engine.query("example.com", "A", ["127.0.0.1", "::1"], port=port)
+        finally:
+            silent.close()
+            server.close()
+
+        assert reply.error is None
+        assert reply.nameserver == "::1"
+        assert engine.stats()["pending"] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_fanout_timeouts_are_reported_as_timeouts(self, monkeypatch, caplog):
+        from app.api.v1.dns_lookup import query_records
+        from app.api.v1.email_blacklist import check_domain_blacklist
+
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", 0))
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        resolver.nameservers = ["127.0.0.1"]
+        resolver.port = silent.getsockname()[1]
+        resolver.timeout = resolver.lifetime = 0.2
+        monkeypatch.setattr(dns_cache, "_resolver", resolver)
+        dns_cache.dns_cache.reset()
+        try:
+            with pytest.raises(Exception, match="DNS query timeout for A records"):
+                await query_records("example.com", "A", transport="fanout")
+            assert await check_domain_blacklist("example.com", "dbl.test") is None
+            assert "Timeout checking example.com against dbl.test" in caplog.text
+        finally:
+            silent.close()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_timeout_is_reported(self, engine):
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", 0))
+        try:
+            reply = await engine.query("example.com", "A", ["127.0.0.1"], port=silent.getsockname()[1], timeout=0.2)
+        finally:
+            silent.close()
+        assert reply.error == "timeout"
+        assert engine.stats()["timeouts"] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_sockets_move_to_new_ports(self):
+        engine = DNSFanout(sockets=1, timeout=1.0, rotate_after=5)
+        server = FakeDNSServer()
+        host, port = await server.start()
+        try:
+            await engine.query("example.com", "A", [host], port=port)
+            first = engine._slots[socket.AF_INET][0].sock
+            first_port = first.getsockname()[1]
+            for _ in range(11):
+                await engine.query("example.com", "A", [host], port=port)
+            current_port = engine._slots[socket.AF_INET][0].sock.getsockname()[1]
+        finally:
+            server.close()
+            engine.close()
+
+        assert engine.stats()["socket_rotations"] == 2
+        assert first.fileno() == -1
+        assert current_port != first_port
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_tcp_fallback_keeps_dnssec_flags(self, engine):
+        server = FakeDNSServer(tcp=True, truncate=True, validating=True)
+        host, port = await server.start()
+        try:
+            reply = await engine.query("example.com", "A", [host], port=port, dnssec=True)
+        finally:
+            server.close()
+
+        assert reply.transport == "tcp"
+        assert reply.authenticated
+        assert reply.message().answer[0][0].to_text() == "93.184.216.34"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_dnsbl_check_uses_fanout_and_cache(self, local_dns):
+        assert await check_dnsbl_real("127.0.0.2", "zen.spamhaus.org") == (True, "SBL - Spamhaus Block List")
+        assert (await check_dnsbl_real("127.0.0.3", "zen.spamhaus.org"))[0] is False
+        assert (await check_dnsbl_real("127.0.0.3", "zen.spamhaus.org"))[0] is False
+
+        # The NXDOMAIN "not listed" answer came with an SOA and was cached
+        assert local_dns.queries == 2
+        assert dns_cache.dns_cache.stats()["hits"] == 1
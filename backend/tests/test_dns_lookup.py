@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import time
+
+import dns.asyncresolver
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.api.v1 import dns_lookup
+from app.utils import dns_cache
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+SERVER_DELAY = 0.3
+
+
+@pytest_asyncio.fixture
+async def slow_dns(monkeypatch):
+    """Shared resolver pointed at a local DNS server that answers after SERVER_DELAY."""
+    server = FakeDNSServer(delay=SERVER_DELAY)
+    host, port = await server.start()
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    resolver.timeout = resolver.lifetime = 5
+    monkeypatch.setattr(dns_cache, "_resolver", resolver)
+    dns_cache.dns_cache.reset()
+    yield server
+    server.close()
+
+
+async def _max_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Largest delay, beyond interval, of a ticker on the event loop until stop is set."""
+    lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(lag, time.perf_counter() - start - interval)
+    return lag
+
+
+class TestDNSLookup:
+    """Test suite for the asynchronous DNS lookup path."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_lookup_does_not_block_event_loop(self, slow_dns):
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(_max_loop_lag(stop))
+
+        start = time.perf_counter()
+        response = await dns_lookup.dns_lookup(domain="example.com", record_types="A,AAAA,MX,TXT,NS")
+        elapsed = time.perf_counter() - start
+        stop.set()
+        lag = await monitor
+
+        # A blocking resolver would stall the loop for a full server delay per query
+        assert lag < SERVER_DELAY / 3
+        # Record types are queried concurrently, not one after another
+        assert elapsed < SERVER_DELAY * 2
+        assert slow_dns.queries == 5
+        assert {record.type for record in response.records} == {"A", "AAAA", "MX", "TXT", "NS"}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_missing_records_are_empty(self, slow_dns):
+        assert await dns_lookup.perform_dns_query("nothing.example.com", "A") == []
+        assert await dns_lookup.perform_dns_query("mail.example.com", "MX") == []
+
+        records = await dns_lookup.perform_dns_query("example.com", "TXT")
+        assert records[0].value == "v=spf1 -all"
+        assert records[0].ttl == 300
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_dns_lookup_endpoint(self, slow_dns):
+        from app.main import app
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/dns-lookup", params={"domain": "example.com", "record_types": "A,MX"})
+
+        assert response.status_code == 200
+        values = {(r["type"], r["value"]) for r in response.json()["records"]}
+        assert values == {("A", "93.184.216.34"), ("MX", "10 mail.example.com.")}
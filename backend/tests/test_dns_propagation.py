@@ -0,0 +1,99 @@
+import os
+import sys
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils import dns_propagation
+from app.utils.dns_fanout import DNSFanout
+from app.utils.dns_propagation import check_propagation
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+STALE_ZONE = {"example.com.": {"A": ["192.0.2.10"]}}
+
+
+@pytest_asyncio.fixture
+async def resolvers():
+    """Local stand-in resolvers: three updated, one stale, one truncating, one gone, one too slow."""
+    servers = {
+        "new-1": FakeDNSServer(),
+        "new-2": FakeDNSServer(),
+        "new-3": FakeDNSServer(ttl=120),
+        "stale": FakeDNSServer(zone=STALE_ZONE),
+        "truncating": FakeDNSServer(truncate=True, tcp=True),
+        "empty": FakeDNSServer(zone={}),
+        "slow": FakeDNSServer(delay=2.0)
+    }
+    entries = []
+    for name, server in servers.items():
+        host, port = await server.start()
+        entries.append({"name": name, "address": host, "port": port})
+    yield entries, servers
+    for server in servers.values():
+        server.close()
+
+
+class TestDNSPropagation:
+    """Test suite for the multi-resolver propagation checker."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_answer_matrix_and_grouping(self, resolvers, monkeypatch):
+        entries, servers = resolvers
+        monkeypatch.setitem(dns_propagation.DNS_PROPAGATION_CONFIG, "timeout", 0.5)
+        client = DNSFanout(sockets=1, retries=1)
+        try:
+            result = await check_propagation("example.com", "A", resolvers=entries, client=client)
+            assert client.stats()["sockets"] == 1
+        finally:
+            client.close()
+
+        rows = {row["name"]: row for row in result["resolvers"]}
+        assert rows["new-1"]["values"] == ["93.184.216.34"]
+        assert rows["new-3"]["ttl"] == 120
+        assert rows["stale"]["values"] == ["192.0.2.10"]
+        assert rows["empty"]["status"] == "NXDOMAIN"
+        assert rows["slow"]["status"] == "TIMEOUT"
+        assert rows["new-1"]["latency_ms"] is not None
+
+        # The truncated UDP reply was retried over TCP
+        assert rows["truncating"]["transport"] == "tcp"
+        assert rows["truncating"]["values"] == ["93.184.216.34"]
+        assert servers["truncating"].tcp_queries == 1
+
+        # Unanswered queries are retransmitted once
+        assert servers["slow"].queries == 2
+
+        assert [(group["values"], group["count"]) for group in result["groups"]] == [
+            (["93.184.216.34"], 4), (["192.0.2.10"], 1), ([], 1)
+        ]
+        assert not result["consistent"]
+        assert (result["responding"], result["total"]) == (6, 7)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_expected_value_sets_propagated_share(self, resolvers):
+        entries, _ = resolvers
+        entries = [entry for entry in entries if entry["name"] in ("new-1", "stale")]
+        result = await check_propagation("example.com", "A", resolvers=entries, expected="192.0.2.10")
+        assert result["propagated_percent"] == 50.0
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_propagation_endpoint(self, resolvers, monkeypatch):
+        from app.main import app
+
+        entries, _ = resolvers
+        monkeypatch.setattr(dns_propagation, "_resolvers", entries[:3])
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/dns-propagation", params={"domain": "example.com", "record_type": "MX"})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["consistent"]
+        assert data["groups"][0]["values"] == ["10 mail.example.com."]
+        assert data["propagated_percent"] == 100.0
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+import time
+
+import dns.asyncresolver
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils import dns_cache, dns_sweep
+from app.utils.dns_sweep import ReorderBuffer, sweep_ptr, sweep_range
+from app.utils.rate_limit import GCRALimiter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+# Every third address in 192.0.2.0/26 has a PTR record
+PTR_ZONE = {
+    f"{host}.2.0.192.in-addr.arpa.": {"PTR": [f"host-{host}.example.net."]} for host in range(0, 64, 3)
+}
+PTR_ZONE["2.0.192.in-addr.arpa."] = {"NS": ["ns.example.net."]}
+
+
+@pytest_asyncio.fixture
+async def ptr_server(monkeypatch):
+    """Shared resolver pointed at a local server whose replies come back out of order."""
+    server = FakeDNSServer(zone=PTR_ZONE, jitter=0.02)
+    host, port = await server.start()
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    resolver.timeout = resolver.lifetime = 2
+    monkeypatch.setattr(dns_cache, "_resolver", resolver)
+    monkeypatch.setattr(dns_sweep, "_pacer", GCRALimiter([(1.0, 10_000)]))
+    dns_cache.dns_cache.reset()
+    dns_sweep.ptr_cache.reset()
+    yield server
+    server.close()
+
+
+class TestDNSSweep:
+    """Test suite for the reverse-DNS range sweep."""
+
+    @pytest.mark.unit
+    def test_sweep_range(self):
+        block = sweep_range("192.0.2.77/24")
+        assert (str(block.network), block.offset, len(block), block.next_offset) == ("192.0.2.0/24", 0, 256, None)
+        assert str(block.address(255)) == "192.0.2.255"
+
+        # A /64 is swept a slice at a time
+        first = sweep_range("2001:db8::/64")
+        assert (len(first), first.next_offset) == (4096, 4096)
+        second = sweep_range("2001:db8::/64", offset=first.next_offset, limit=16)
+        assert str(second.address(0)) == "2001:db8::1000"
+
+        with pytest.raises(ValueError):
+            sweep_range("192.0.2.0/24", offset=256)
+        with pytest.raises(ValueError):
+            sweep_range("2001:db8::/64", limit=5000)
+        with pytest.raises(ValueError):
+            sweep_range("not-a-network")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_reorder_buffer(self):
+        buffer = ReorderBuffer(window=2)
+        await buffer.put(1, "b")
+        await buffer.put(0, "a")
+        assert [await buffer.get(), await buffer.get()] == ["a", "b"]
+
+        # Index 4 is a full window ahead of the reader (at 2) until it reads on
+        reserve = asyncio.create_task(buffer.reserve(4))
+        await asyncio.sleep(0.01)
+        assert not reserve.done()
+        await buffer.put(2, "c")
+        assert await buffer.get() == "c"
+        await asyncio.wait_for(reserve, 1)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_rows_stream_in_address_order(self, ptr_server):
+        block = sweep_range("192.0.2.0/26")
+        rows = [row async for row in sweep_ptr(block, concurrency=16, window=16)]
+
+        assert [row["ip"] for row in rows] == [f"192.0.2.{host}" for host in range(64)]
+        assert rows[3]["hostname"] == "host-3.example.net"
+        assert rows[3]["status"] == "success"
+        assert rows[4]["status"] == "no_record"
+        assert ptr_server.queries == 64
+
+        # The second sweep is answered from the PTR cache; the shared cache isn't touched
+        again = [row async for row in sweep_ptr(block)]
+        assert all(row["cached"] for row in again)
+        assert ptr_server.queries == 64
+        assert dns_cache.dns_cache.stats()["entries"] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_queries_are_rate_limited(self, ptr_server, monkeypatch):
+        # A burst of 2, then one query every 50 ms
+        monkeypatch.setattr(dns_sweep, "_pacer", GCRALimiter([(0.1, 2)]))
+        start = time.monotonic()
+        rows = [row async for row in sweep_ptr(sweep_range("192.0.2.0/26", limit=20))]
+        assert len(rows) == 20
+        assert time.monotonic() - start >= 0.8
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_sweep_endpoint(self, ptr_server):
+        from app.main import app
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/api/v1/reverse-dns/sweep", params={"cidr": "192.0.2.0/24", "limit": 8, "format": "csv"}
+            )
+            invalid = await client.get("/api/v1/reverse-dns/sweep", params={"cidr": "192.0.2.0/33"})
+
+        assert response.status_code == 200
+        assert response.headers["x-sweep-next-offset"] == "8"
+        lines = response.text.splitlines()
+        assert lines[0] == ",".join(dns_sweep.SWEEP_FIELDS)
+        assert len(lines) == 9
+        assert lines[1].startswith("192.0.2.0,host-0.example.net,host-0.example.net,success,")
+        assert invalid.status_code == 400
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+import pytest_asyncio
+
+from app.utils.dns_trace import DelegationCache, IterativeTracer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer, SAMPLE_ZONE
+
+
+@pytest_asyncio.fixture
+async def hierarchy():
+    """Root, com. and example.com. servers on three loopback addresses sharing one port."""
+    root = FakeDNSServer(zone={}, delegations={"com.": [("a.gtld.test.", "127.0.0.2")]})
+    _, port = await root.start("127.0.0.1")
+    tld = FakeDNSServer(zone={}, ttl=600, delegations={
+        "example.com.": [("ns1.example.com.", "127.0.0.3"), ("ns2.example.net.", None)]
+    })
+    await tld.start("127.0.0.2", port)
+    authoritative = FakeDNSServer(zone=SAMPLE_ZONE)
+    await authoritative.start("127.0.0.3", port)
+
+    tracer = IterativeTracer(root_hints=[("root.test.", "127.0.0.1")], port=port, cache=DelegationCache())
+    yield tracer, (root, tld, authoritative)
+    for server in (root, tld, authoritative):
+        server.close()
+
+
+class TestDNSTrace:
+    """Test suite for the iterative DNS trace engine."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_trace_follows_referrals_from_root(self, hierarchy):
+        tracer, servers = hierarchy
+        trace = await tracer.trace("example.com", "MX")
+
+        assert trace["status"] == "NOERROR"
+        assert trace["started_from"] == {"zone": ".", "cached": False}
+        assert [hop["zone"] for hop in trace["hops"]] == [".", "com.", "example.com."]
+        assert [hop["result"] for hop in trace["hops"]] == ["referral", "referral", "answer"]
+
+        delegation = trace["hops"][1]["referral"]
+        assert delegation["zone"] == "example.com."
+        assert delegation["nameservers"] == ["ns1.example.com.", "ns2.example.net."]
+        assert delegation["glue"] == ["127.0.0.3"]
+        assert delegation["ttl"] == 600
+
+        final = trace["hops"][-1]
+        assert final["authoritative"]
+        assert final["servers"][0]["latency_ms"] is not None
+        assert "10 mail.example.com." in final["answer"][0]
+        assert [server.queries for server in servers] == [1, 1, 1]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_later_traces_start_at_deepest_cached_cut(self, hierarchy):
+        tracer, (root, tld, authoritative) = hierarchy
+        await tracer.trace("example.com", "A")
+
+        trace = await tracer.trace("mail.example.com", "A")
+        assert trace["started_from"] == {"zone": "example.com.", "cached": True}
+        assert len(trace["hops"]) == 1
+        assert "93.184.216.35" in trace["answer"][0]
+        assert (root.queries, tld.queries) == (1, 1)
+
+        missing = await tracer.trace("nothing.example.com", "A")
+        assert missing["status"] == "NXDOMAIN"
+        assert missing["hops"][-1]["result"] == "nxdomain"
+
+    @pytest.mark.unit
+    def test_delegation_cache_expiry(self):
+        cache = DelegationCache()
+        cache.put("com.", [("a.gtld.test.", "192.0.2.1")], ttl=100, now=0)
+        cache.put("example.com.", [("ns1.example.com.", "192.0.2.2")], ttl=10, now=0)
+
+        assert cache.closest("www.example.com", now=5)[0] == "example.com."
+        assert cache.closest("www.example.com", now=10)[:1] == ("com.",)
+        assert cache.closest("example.org", now=5) is None
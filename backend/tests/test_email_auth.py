@@ -0,0 +1,159 @@
+import os
+import sys
+
+import dns.asyncresolver
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.utils import dns_cache
+from app.utils.email_auth import (
+    SPFError, check_dkim, check_dmarc, check_spf, parse_dkim, parse_dmarc, parse_spf, rsa_key_bits
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from fake_dns_server import FakeDNSServer
+
+
+RSA_1024_KEY = (
+    "MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDCcbiZOb0AEmz/FCZM33W8jE3dTzT9Zy6ZjKEFE69xT9JXO8PiIG4lt1KHyDXTp2KUea5W"
+    "D84+1WrHTEYxHXurq7WZgpojjrD5bz7t0CmKhyrWcqkc3jM+4/qcXQAtzSHiGbb9G7xrBAM44TFc/p6IuETF8fBqoNst5C8aB63bgwIDAQAB"
+)
+
+MAIL_ZONE = {
+    "example.com.": {
+        "TXT": ['"v=spf1 ip4:192.0.2.0/25 -ip4:198.51.100.7 include:_spf.shared.test include:relay.example.com" '
+                '" a:mail.example.com mx ~all"'],
+        "MX": ["10 mail.example.com."]
+    },
+    "mail.example.com.": {"A": ["93.184.216.35"]},
+    "_spf.shared.test.": {"TXT": ['"v=spf1 ip4:203.0.113.0/24 ip6:2001:db8::/32 -all"']},
+    "relay.example.com.": {"TXT": ['"v=spf1 include:_spf.shared.test ip4:198.51.100.0/24 exists:%{i}.x.test -all"']},
+    "_dmarc.example.com.": {"TXT": ['"v=DMARC1; p=reject; sp=quarantine; pct=50; '
+                                    'rua=mailto:a@example.com,mailto:b@example.com; adkim=s"']},
+    "google._domainkey.example.com.": {"TXT": [f'"v=DKIM1; k=rsa; t=y; p={RSA_1024_KEY[:120]}" "{RSA_1024_KEY[120:]}"']},
+    "old._domainkey.example.com.": {"TXT": ['"v=DKIM1; p="']},
+    # Eleven includes: one over the limit
+    "big.test.": {"TXT": ['"v=spf1 ' + " ".join(f"include:n{i}.test" for i in range(11)) + ' -all"']},
+    **{f"n{i}.test.": {"TXT": ['"v=spf1 -all"']} for i in range(11)},
+    "loop.test.": {"TXT": ['"v=spf1 include:loop2.test -all"']},
+    "loop2.test.": {"TXT": ['"v=spf1 redirect=loop.test"']},
+    "broken.test.": {"TXT": ['"v=spf1 include:missing.test -all"']}
+}
+
+
+@pytest_asyncio.fixture
+async def mail_dns(monkeypatch):
+    """Shared resolver pointed at a local server with SPF, DMARC and DKIM records."""
+    server = FakeDNSServer(zone=MAIL_ZONE)
+    host, port = await server.start()
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    resolver.timeout = resolver.lifetime = 2
+    monkeypatch.setattr(dns_cache, "_resolver", resolver)
+    dns_cache.dns_cache.reset()
+    yield server
+    server.close()
+
+
+class TestEmailAuth:
+    """Test suite for the SPF, DMARC and DKIM checks."""
+
+    @pytest.mark.unit
+    def test_parse_spf(self):
+        terms = parse_spf("v=spf1 a/24//64 -ip6:2001:db8::1/48 ?mx:mx.example.com redirect=_spf.example.com")
+        assert [(t.qualifier, t.name, t.value, t.cidr4, t.cidr6) for t in terms] == [
+            ("+", "a", None, 24, 64),
+            ("-", "ip6", "2001:db8::/48", None, None),
+            ("?", "mx", "mx.example.com", None, None),
+            ("+", "redirect", "_spf.example.com", None, None)
+        ]
+        assert terms[-1].modifier
+        with pytest.raises(SPFError):
+            parse_spf("v=spf1 ip4:2001:db8::/32")
+        with pytest.raises(SPFError):
+            parse_spf("v=spf1 bogus:example.com")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_spf_tree_is_flattened(self, mail_dns):
+        spf = await check_spf("example.com")
+
+        assert spf["status"] == "valid"
+        # include x2, a, mx at the top; one include in relay.example.com
+        assert spf["lookups"] == 6
+        assert spf["flattened"]["ip6"] == ["2001:db8::/32"]
+        ip4 = spf["flattened"]["ip4"]
+        assert "192.0.2.0/25" in ip4 and "203.0.113.0/24" in ip4 and "93.184.216.35/32" in ip4
+        # The earlier -ip4 keeps 198.51.100.7 out of relay's /24
+        assert "198.51.100.6/32" in ip4 and "198.51.100.8/29" in ip4
+        assert not any(network.startswith("198.51.100.7/") or network == "198.51.100.0/24" for network in ip4)
+        assert spf["flattened"]["unflattenable"] == ["exists:%{i}.x.test"]
+        assert not spf["flattened"]["complete"]
+
+        # The shared include was fetched once for both branches
+        assert spf["memoized_lookups"] >= 1
+        assert [node["domain"] for node in spf["tree"]["includes"]] == ["_spf.shared.test", "relay.example.com"]
+        assert spf["tree"]["includes"][1]["includes"][0]["domain"] == "_spf.shared.test"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_spf_errors(self, mail_dns):
+        too_many = await check_spf("big.test")
+        assert too_many["status"] == "permerror"
+        assert too_many["lookups"] == 11
+
+        loop = await check_spf("loop.test")
+        assert loop["status"] == "permerror"
+        assert any("loop" in error for error in loop["errors"])
+
+        broken = await check_spf("broken.test")
+        assert broken["status"] == "permerror"
+        assert broken["errors"] == ["missing.test: missing.test has no SPF record"]
+
+        assert (await check_spf("mail.example.com"))["status"] == "none"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_dmarc_and_dkim(self, mail_dns):
+        dmarc = await check_dmarc("example.com")
+        assert (dmarc["policy"], dmarc["subdomain_policy"], dmarc["percentage"]) == ("reject", "quarantine", 50)
+        assert dmarc["rua"] == ["mailto:a@example.com", "mailto:b@example.com"]
+        assert dmarc["dkim_alignment"] == "strict"
+        assert not (await check_dmarc("mail.example.com"))["found"]
+
+        rows = await check_dkim("example.com", ["selector1", "google", "old"])
+        assert [(row["selector"], row["found"]) for row in rows] == [
+            ("google", True), ("old", True), ("selector1", False)
+        ]
+        assert (rows[0]["key_bits"], rows[0]["testing"]) == (1024, True)
+        assert rows[1]["revoked"]
+
+    @pytest.mark.unit
+    def test_record_parsers(self):
+        assert rsa_key_bits(b"not der") is None
+        assert parse_dkim(f"v=DKIM1; p={RSA_1024_KEY}")["key_bits"] == 1024
+        assert parse_dkim("v=DKIM1; k=ed25519; p=11qYAYKxCrfVS/7TyWQHOg7hcvPapiMlrwIaaPcHURo=")["key_bits"] == 256
+        lenient = parse_dmarc("v=DMARC1; rua=mailto:r@example.com")
+        assert lenient["policy"] == "none"
+        assert lenient["warnings"]
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_email_auth_endpoint(self, mail_dns):
+        from app.main import app
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/api/v1/email-auth", params={"domain": "postmaster@example.com", "dkim_selectors": "google"}
+            )
+            invalid = await client.get("/api/v1/email-auth", params={"domain": "not a domain"})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["domain"] == "example.com"
+        assert data["spf"]["status"] == "valid"
+        assert data["dmarc"]["policy"] == "reject"
+        assert data["dkim"][0]["key_bits"] == 1024
+        assert invalid.status_code == 400
@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+import pytest
+from app.utils.latency import (
+    LatencyProber, http_probe, latency_percentiles, percentile, summarize_latency, sample_latency,
+    sample_tcp_latency
+)
+
+
+class TestLatencyProber:
+    """Test suite for latency sampling."""
+
+    @pytest.mark.unit
+    def test_percentile_interpolates(self):
+        assert percentile([10, 20, 30, 40, 50], 50) == 30
+        assert percentile([10, 20], 90) == pytest.approx(19)
+        assert percentile([7], 99) == 7
+
+    @pytest.mark.unit
+    def test_latency_percentiles(self):
+        stats = latency_percentiles([float(v) for v in range(1, 101)], lost=3)
+        assert stats['min'] == 1
+        assert stats['p50'] == pytest.approx(50.5)
+        assert stats['p90'] == pytest.approx(90.1)
+        assert stats['max'] == 100
+        assert stats['samples'] == 100
+        assert stats['lost'] == 3
+        assert latency_percentiles([]) is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_prober_samples_until_stopped(self):
+        calls = 0
+
+        async def probe():
+            nonlocal calls
+            calls += 1
+            if calls % 4 == 0:
+                raise ConnectionError("probe lost")
+            return 12.5
+
+        async with LatencyProber(probe, interval=0.01) as prober:
+            await asyncio.sleep(0.2)
+
+        count = calls
+        await asyncio.sleep(0.05)
+        assert calls == count  # No probes after stop
+        summary = prober.summary()
+        assert summary['p50'] == 12.5
+        assert summary['lost'] >= 1
+        assert summary['samples'] + summary['lost'] == count
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_prober_times_out_stalled_probes(self):
+        async def stalled():
+            await asyncio.sleep(10)
+            return 0.0
+
+        async with LatencyProber(stalled, interval=0.01, timeout=0.05) as prober:
+            await asyncio.sleep(0.2)
+
+        assert prober.rtts == []
+        assert prober.lost >= 2
+
+
+class TestLatencySampler:
+    """Test suite for idle ping/jitter/loss sampling."""
+
+    @pytest.mark.unit
+    def test_summarize_latency(self):
+        stats = summarize_latency([10.0, 14.0, 12.0, 12.0], attempts=5)
+        assert stats['ping'] == 12.0
+        assert stats['min'] == 10.0
+        # |14-10| + |12-14| + |12-12| over three differences
+        assert stats['jitter'] == 2.0
+        assert stats['loss'] == 20.0
+        assert summarize_latency([], attempts=3) is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_tcp_sampler_against_local_server(self):
+        async def handle(reader, writer):
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            stats = await sample_tcp_latency("127.0.0.1", port, count=5)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        assert stats['samples'] == 5
+        assert stats['loss'] == 0.0
+        assert stats['min'] <= stats['ping']
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_sampler_counts_lost_probes(self):
+        attempt = 0
+
+        async def flaky():
+            nonlocal attempt
+            attempt += 1
+            if attempt % 2:
+                raise ConnectionRefusedError()
+            return 5.0
+
+        stats = await sample_latency(flaky, count=4)
+        assert stats['samples'] == 2
+        assert stats['loss'] == 50.0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_http_error_statuses_are_lost_probes(self):
+        statuses = iter([200, 503, 304, 404])
+        transport = httpx.MockTransport(lambda request: httpx.Response(next(statuses)))
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            stats = await sample_latency(http_probe(client, "http://probe.test/"), count=4)
+        assert stats['samples'] == 2
+        assert stats['loss'] == 50.0
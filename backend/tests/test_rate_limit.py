@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import Mock
+from fastapi.testclient import TestClient
+from app.utils import rate_limit
+from app.utils.rate_limit import GCRALimiter, get_client_prefix
+
+
+def _request(host="203.0.113.5", headers=None):
+    request = Mock()
+    request.headers = headers or {}
+    request.client.host = host
+    return request
+
+
+class TestGCRALimiter:
+    """Test suite for the per-client GCRA limiter."""
+
+    @pytest.mark.unit
+    def test_limits_are_per_client(self):
+        limiter = GCRALimiter([(30, 2)])
+        assert limiter.hit("a", now=0)[0] is True
+        assert limiter.hit("a", now=1)[0] is True
+        allowed, retry_after = limiter.hit("a", now=2)
+        assert allowed is False
+        assert retry_after > 0
+        # Another client is unaffected
+        assert limiter.hit("b", now=2)[0] is True
+
+    @pytest.mark.unit
+    def test_retry_after_is_accurate(self):
+        limiter = GCRALimiter([(10, 1)])
+        assert limiter.hit("a", now=0)[0] is True
+        allowed, retry_after = limiter.hit("a", now=4)
+        assert allowed is False
+        assert retry_after == pytest.approx(6.0)
+        assert limiter.hit("a", now=4 + retry_after)[0] is True
+
+    @pytest.mark.unit
+    def test_rejections_are_not_counted(self):
+        limiter = GCRALimiter([(10, 1)])
+        limiter.hit("a", now=0)
+        for t in range(1, 9):
+            assert limiter.hit("a", now=t)[0] is False
+        assert limiter.hit("a", now=10)[0] is True
+
+    @pytest.mark.unit
+    def test_memory_is_bounded(self):
+        limiter = GCRALimiter([(60, 5)], max_clients=100)
+        for i in range(1000):
+            limiter.hit(f"client-{i}", now=i * 0.001)
+        assert limiter.stats()['tracked_clients'] == 100
+
+    @pytest.mark.unit
+    def test_idle_clients_expire(self):
+        limiter = GCRALimiter([(60, 5)])
+        limiter.hit("old", now=0)
+        limiter.hit("new", now=120)
+        assert limiter.stats()['tracked_clients'] == 1
+
+    @pytest.mark.unit
+    def test_client_prefix(self, monkeypatch):
+        assert get_client_prefix(_request("203.0.113.5")) == "203.0.113.5/32"
+        assert get_client_prefix(_request("2001:db8::1")) == "2001:db8::/64"
+        monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", rate_limit._parse_networks("10.0.0.0/8"))
+        proxied = {"X-Forwarded-For": "198.51.100.7, 10.0.0.1"}
+        assert get_client_prefix(_request("10.0.0.2", proxied)) == "198.51.100.7/32"
+
+    @pytest.mark.unit
+    def test_proxy_headers_need_a_trusted_peer(self):
+        spoofed = {"X-Forwarded-For": "198.51.100.7", "CF-Connecting-IP": "198.51.100.8", "X-Real-IP": "198.51.100.9"}
+        assert get_client_prefix(_request("203.0.113.5", spoofed)) == "203.0.113.5/32"
+        # A client can't hide behind a forged hop in front of our proxy's own entry
+        assert get_client_prefix(_request("::1", {"X-Forwarded-For": "198.51.100.7, 203.0.113.5"})) == "203.0.113.5/32"
+
+
+@pytest.mark.api
+def test_speed_test_returns_retry_after(client: TestClient):
+    """Clients over their budget get a 429 with a Retry-After hint."""
+    from app.api.v1.speed_test import client_rate_limiter, CLIENT_RATE_LIMITS
+    window, limit = CLIENT_RATE_LIMITS[0]
+    for _ in range(limit):
+        client_rate_limiter.hit("testclient")
+
+    response = client.post("/api/v1/speed-test")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    # Forged proxy headers from an untrusted peer don't buy a fresh budget
+    spoofed = client.post("/api/v1/speed-test", headers={"X-Forwarded-For": "198.51.100.7", "X-Real-IP": "198.51.100.8"})
+    assert spoofed.status_code == 429
+
+
+@pytest.mark.api
+def test_speed_test_config_endpoint(client: TestClient):
+    """The config endpoint reports the limiter state without errors."""
+    response = client.get("/api/v1/speed-test/config")
+    assert response.status_code == 200
+    data = response.json()
+    assert "interval" in data["rate_limiter"]
+    assert data["client_rate_limiter"]["limits"]
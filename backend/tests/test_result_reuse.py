@@ -0,0 +1,140 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.utils.cancellation import current_token
+from app.utils.result_reuse import ReuseCache
+
+
+class TestReuseCache:
+    """Test suite for per-key result reuse."""
+
+    @pytest.mark.unit
+    def test_recent_respects_window(self):
+        cache = ReuseCache(max_window=60)
+        cache.store("a", "result", now=100)
+        assert cache.recent("a", max_age=30, now=120) == ("result", 20)
+        assert cache.recent("a", max_age=10, now=120) is None
+        # Never older than the cache's own window, whatever the caller asks for
+        assert cache.recent("a", max_age=600, now=200) is None
+        assert cache.recent("b", max_age=30, now=120) is None
+
+    @pytest.mark.unit
+    def test_memory_is_bounded(self):
+        cache = ReuseCache(max_window=60, max_entries=10)
+        for i in range(100):
+            cache.store(f"client-{i}", i, now=i * 0.01)
+        assert cache.stats()['stored_results'] == 10
+        assert cache.recent("client-99", max_age=60, now=1) == (99, pytest.approx(0.01))
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_run(self):
+        cache = ReuseCache(max_window=60)
+        runs = 0
+
+        async def measure():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.1)
+            return "result"
+
+        results = await asyncio.gather(*(cache.run("a", measure) for _ in range(3)))
+        assert runs == 1
+        assert [value for value, _ in results] == ["result"] * 3
+        assert [joined for _, joined in results] == [False, True, True]
+        assert cache.recent("a", max_age=60)[0] == "result"
+        assert not cache.in_flight("a")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_join_false_starts_a_new_run(self):
+        cache = ReuseCache(max_window=60)
+        runs = 0
+
+        async def measure():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.05)
+            return runs
+
+        await asyncio.gather(cache.run("a", measure), cache.run("a", measure, join=False))
+        assert runs == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failures_are_shared_but_not_stored(self):
+        cache = ReuseCache(max_window=60)
+
+        async def measure():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("all methods failed")
+
+        results = await asyncio.gather(cache.run("a", measure), cache.run("a", measure), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.recent("a", max_age=60) is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_run_survives_first_waiter_leaving(self):
+        cache = ReuseCache(max_window=60)
+        tokens = []
+
+        async def measure():
+            tokens.append(current_token())
+            await asyncio.sleep(0.2)
+            return "result"
+
+        first = asyncio.create_task(cache.run("a", measure))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(cache.run("a", measure))
+        await asyncio.sleep(0.05)
+        first.cancel()
+
+        assert await second == ("result", True)
+        assert not tokens[0].cancelled
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_run_is_cancelled_when_everyone_leaves(self):
+        cache = ReuseCache(max_window=60)
+        tokens = []
+
+        async def measure():
+            tokens.append(current_token())
+            await asyncio.sleep(10)
+
+        waiters = [asyncio.create_task(cache.run("a", measure)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert tokens[0].cancelled
+        assert not cache.in_flight("a")
+        assert cache.recent("a", max_age=60) is None
+
+
+@pytest.mark.api
+def test_speed_test_reuses_recent_result(client: TestClient):
+    """A repeat test inside the requested window returns the previous result."""
+    measured = {
+        'download_speed': 120.0, 'upload_speed': 30.0, 'ping': 12.0, 'jitter': 1.0,
+        'server_location': 'Test Server', 'method': 'HTTP fallback', 'success': True
+    }
+    with patch('app.api.v1.speed_test.get_user_location', return_value=None), \
+         patch('app.api.v1.speed_test._perform_accurate_speed_test', return_value=measured) as perform:
+        first = client.post("/api/v1/speed-test?reuse=60")
+        second = client.post("/api/v1/speed-test?reuse=60")
+        fresh = client.post("/api/v1/speed-test?reuse=0")
+
+    assert first.status_code == second.status_code == fresh.status_code == 200
+    assert first.json()['reused'] is False
+    assert second.json()['reused'] is True
+    assert second.json()['result_age'] >= 0
+    assert second.json()['download_speed'] == 120.0
+    assert fresh.json()['reused'] is False
+    assert perform.call_count == 2
@@ -0,0 +1,130 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from app.utils.result_store import ResultStore
+
+
+def _bulk(store, n, seed=0):
+    rng = np.random.default_rng(seed)
+    download = rng.lognormal(mean=4.0, sigma=0.8, size=n)
+    isps = np.where(rng.random(n) < 0.5, "ISP A", "ISP B")
+    store.append_many(
+        {
+            'timestamp': np.arange(n, dtype=np.float64) * 60.0,
+            'download': download,
+            'upload': download / 4,
+            'ping': rng.uniform(5, 50, n),
+            'jitter': rng.uniform(0, 5, n)
+        },
+        {
+            'isp': isps.tolist(),
+            'country': ["DE"] * n,
+            'server': ["Frankfurt"] * n,
+            'method': ["Official Ookla CLI"] * n
+        }
+    )
+    return download, isps
+
+
+class TestResultStore:
+    """Test suite for the speed-test result history store."""
+
+    @pytest.mark.unit
+    def test_append_and_reopen(self, tmp_path):
+        store = ResultStore(str(tmp_path))
+        store.append({'timestamp': 1.0, 'download': 100.0, 'upload': 20.0, 'ping': 10.0,
+                      'jitter': 1.0, 'isp': 'ISP A', 'country': 'US', 'server': 'NYC', 'method': 'x'})
+        store.append({'timestamp': 2.0, 'download': 200.0, 'upload': None, 'ping': 12.0,
+                      'jitter': 2.0, 'isp': 'ISP B', 'country': 'US', 'server': 'NYC', 'method': 'x'})
+
+        reopened = ResultStore(str(tmp_path))
+        assert reopened.row_count() == 2
+        stats = reopened.aggregate('download', group_by='isp')
+        assert [g['isp'] for g in stats['groups']] == ['ISP A', 'ISP B']
+        # Missing values are skipped rather than counted as zero
+        assert reopened.aggregate('upload')['groups'][0]['count'] == 1
+
+    @pytest.mark.unit
+    def test_percentiles_match_numpy_across_batches(self, tmp_path):
+        store = ResultStore(str(tmp_path), batch_rows=7_000)
+        download, isps = _bulk(store, 50_000)
+
+        stats = store.aggregate('download', group_by='isp', percentiles=(10, 50, 90))
+        for group in stats['groups']:
+            values = download[isps == group['isp']]
+            assert group['count'] == len(values)
+            for p in (10, 50, 90):
+                assert group[f'p{p}'] == pytest.approx(np.percentile(values, p), rel=0.01)
+
+    @pytest.mark.unit
+    def test_time_buckets_and_bounds(self, tmp_path):
+        store = ResultStore(str(tmp_path))
+        _bulk(store, 600)
+
+        stats = store.aggregate('ping', bucket_seconds=3600, since=0, until=7200)
+        assert [g['bucket_start'] for g in stats['groups']] == [0, 3600]
+        assert [g['count'] for g in stats['groups']] == [60, 60]
+
+    @pytest.mark.unit
+    def test_fine_grouping_memory_follows_the_data(self, tmp_path):
+        store = ResultStore(str(tmp_path))
+        n = 2_000
+        download = np.random.default_rng(1).lognormal(mean=4.0, sigma=0.8, size=n)
+        store.append_many(
+            {'timestamp': np.arange(n, dtype=np.float64), 'download': download, 'upload': download / 4,
+             'ping': np.full(n, 10.0), 'jitter': np.full(n, 1.0)},
+            {'isp': ["ISP A"] * n, 'country': ["DE"] * n,
+             'server': [f"server-{i % 400}" for i in range(n)], 'method': ["x"] * n}
+        )
+
+        # 2000 group x bucket keys: dense histograms would need 32 MB
+        tracemalloc.start()
+        try:
+            stats = store.aggregate('download', group_by='server', bucket_seconds=100)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 10_000_000
+        assert sum(g['count'] for g in stats['groups']) == n
+        first = stats['groups'][0]
+        assert (first['server'], first['bucket_start'], first['count']) == ("server-0", 0, 1)
+        assert first['p50'] == pytest.approx(download[0], rel=0.01)
+
+    @pytest.mark.unit
+    def test_zero_values_report_zero(self, tmp_path):
+        store = ResultStore(str(tmp_path))
+        for i, jitter in enumerate([0.0, 0.0, 0.0, 2.0]):
+            store.append({'timestamp': float(i), 'download': 100.0, 'jitter': jitter})
+
+        group = store.aggregate('jitter', percentiles=(50, 90))['groups'][0]
+        assert group['p50'] == 0.0
+        assert group['p90'] == pytest.approx(2.0, rel=0.01)
+
+    @pytest.mark.unit
+    def test_torn_write_is_ignored(self, tmp_path):
+        store = ResultStore(str(tmp_path))
+        _bulk(store, 10)
+        with open(store._column_path('download'), 'ab') as f:
+            f.write(b'\x00\x01')
+        assert store.row_count() == 10
+        store.append({'timestamp': 1.0, 'download': 5.0})
+        assert store.row_count() == 11
+
+    @pytest.mark.unit
+    def test_rejects_unknown_metric(self, tmp_path):
+        with pytest.raises(ValueError):
+            ResultStore(str(tmp_path)).aggregate('bogus')
+
+
+@pytest.mark.api
+def test_history_stats_endpoint(client, isolated_result_store):
+    _bulk(isolated_result_store, 1000)
+    response = client.get("/api/v1/speed-test/history/stats?metric=download&group_by=isp&percentiles=50")
+    assert response.status_code == 200
+    data = response.json()
+    assert data['rows_scanned'] == 1000
+    assert {g['isp'] for g in data['groups']} == {'ISP A', 'ISP B'}
+    assert 'p50' in data['groups'][0]
+
+    assert client.get("/api/v1/speed-test/history/stats?group_by=nope").status_code == 400
@@ -1,7 +1,11 @@
 import pytest
+import itertools
 import json
+import os
 import subprocess
+import threading
 import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch, MagicMock, AsyncMock, call
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
@@ -58,7 +62,7 @@ class TestSpeedTestAPI:
         
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
              patch('httpx.AsyncClient') as mock_client:
             
             mock_path.return_value = "/path/to/speedtest.exe"
@@ -98,7 +102,7 @@ class TestSpeedTestAPI:
         
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
              patch('speedtest.Speedtest') as mock_speedtest, \
              patch('httpx.AsyncClient') as mock_client:
             
@@ -132,7 +136,7 @@ class TestSpeedTestAPI:
         """Test HTTP fallback speed test when all other methods fail."""
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
              patch('speedtest.Speedtest') as mock_speedtest, \
              patch('httpx.AsyncClient') as mock_client:
             
@@ -165,7 +169,7 @@ class TestSpeedTestAPI:
         """Test speed test when all methods fail."""
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
              patch('speedtest.Speedtest') as mock_speedtest, \
              patch('httpx.AsyncClient') as mock_client:
             
@@ -236,7 +240,7 @@ class TestSpeedTestAPI:
         """Test speed test with geolocation integration."""
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
              patch('httpx.AsyncClient') as mock_client:
             
             mock_path.return_value = "/path/to/speedtest.exe"
@@ -295,28 +299,30 @@ class TestSpeedTestAPI:
         results = []
         
         def make_request():
-            with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
-                 patch('os.path.exists') as mock_exists, \
-                 patch('subprocess.run') as mock_run, \
-                 patch('httpx.AsyncClient'):
-                
-                mock_path.return_value = "/path/to/speedtest.exe"
-                mock_exists.return_value = False
-                mock_run.side_effect = Exception("Simulated failure")
-                
-                response = client.post("/api/v1/speed-test")
-                results.append(response.status_code)
-        
-        # Start multiple threads
-        threads = []
-        for _ in range(3):
-            thread = threading.Thread(target=make_request)
-            threads.append(thread)
-            thread.start()
+            response = client.post("/api/v1/speed-test")
+            results.append(response.status_code)
         
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
+        # Patch once around all threads: patches entered and exited from several
+        # threads restore each other's mocks and leak them into later tests
+        with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
+             patch('os.path.exists') as mock_exists, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
+             patch('httpx.AsyncClient'):
+            
+            mock_path.return_value = "/path/to/speedtest.exe"
+            mock_exists.return_value = False
+            mock_run.side_effect = Exception("Simulated failure")
+            
+            # Start multiple threads
+            threads = []
+            for _ in range(3):
+                thread = threading.Thread(target=make_request)
+                threads.append(thread)
+                thread.start()
+            
+            # Wait for all threads to complete
+            for thread in threads:
+                thread.join()
         
         # All requests should complete (even if they fail)
         assert len(results) == 3
@@ -327,7 +333,7 @@ class TestSpeedTestAPI:
         """Test speed test timeout handling."""
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run:
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run:
             
             mock_path.return_value = "/path/to/speedtest.exe"
             mock_exists.return_value = True
@@ -353,6 +359,83 @@ class TestSpeedTestAPI:
         calculated_mbps = bandwidth_bps / 125000
         assert abs(calculated_mbps - expected_mbps) < 0.1
 
+    @pytest.mark.unit
+    def test_speedtest_cli_upload_keeps_library_figure(self, monkeypatch):
+        """Test upload send-buffer counts never replace speedtest-cli's upload figure."""
+        from app.api.v1 import speed_test
+        monkeypatch.setattr(speed_test.speedtest_pool, "acquire", lambda shutdown_event: None)
+        monkeypatch.setitem(speed_test.SPEED_TEST_CONFIG, "http_latency_url", None)
+
+        mock_st = Mock()
+        mock_st.servers = {}
+        mock_st.config = {}
+        mock_st.download.return_value = 150_000_000
+        mock_st.upload.return_value = 40_110_000
+        sent = itertools.count(0, 10_000_000)
+        mock_st.results.dict.return_value = {
+            'ping': 12.3,
+            'server': {'sponsor': 'Test', 'name': 'Kyiv', 'country': 'UA', 'id': '1'},
+            'client': {'isp': 'Test ISP'}
+        }
+        with patch('speedtest.Speedtest', return_value=mock_st), \
+             patch.object(speed_test._CountingOpener, "uploaded", lambda self: next(sent)):
+            result = speed_test._run_speedtest_cli_library_enhanced()
+
+        assert result['upload_speed'] == 40.11
+        assert result['raw_upload_bps'] == 40_110_000
+
+    @pytest.mark.integration
+    def test_speedtest_cli_measures_loaded_latency(self, monkeypatch):
+        """Test speedtest-cli phases are probed for loaded latency like the HTTP engine's."""
+        from app.api.v1 import speed_test
+
+        class LatencyHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(0.02)
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), LatencyHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        monkeypatch.setattr(speed_test.speedtest_pool, "acquire", lambda shutdown_event: None)
+        monkeypatch.setitem(speed_test.SPEED_TEST_CONFIG, "http_latency_url",
+                            f"http://127.0.0.1:{server.server_address[1]}/latency")
+
+        mock_st = Mock()
+        mock_st.servers = {}
+        mock_st.config = {}
+        mock_st.download.side_effect = lambda **kwargs: time.sleep(0.6) or 150_000_000
+        mock_st.upload.side_effect = lambda **kwargs: time.sleep(0.6) or 40_000_000
+        mock_st.results.dict.return_value = {
+            'ping': 12.3,
+            'server': {'sponsor': 'Test', 'name': 'Kyiv', 'country': 'UA', 'id': '1'},
+            'client': {'isp': 'Test ISP'}
+        }
+        try:
+            with patch('speedtest.Speedtest', return_value=mock_st):
+                result = speed_test._run_speedtest_cli_library_enhanced()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for phase in ('download_latency', 'upload_latency'):
+            assert result[phase]['samples'] >= 3
+            assert result[phase]['min'] >= 20
+
+    @pytest.mark.unit
+    def test_stable_mbps_falls_back_on_any_flag(self):
+        """Test a flagged counter analysis defers to the library's figure."""
+        from app.api.v1.speed_test import _stable_mbps
+        assert _stable_mbps({'mbps': 57.96, 'flags': []}, 40_110_000) == 57.96
+        assert _stable_mbps({'mbps': 57.96, 'flags': ['noisy']}, 40_110_000) == 40.11
+        assert _stable_mbps(None, 40_110_000) == 40.11
+
     @pytest.mark.unit
     def test_error_message_formatting(self):
         """Test error message formatting."""
@@ -380,7 +463,7 @@ class TestSpeedTestAPI:
         
         with patch('app.api.v1.speed_test.get_ookla_cli_path') as mock_path, \
              patch('os.path.exists') as mock_exists, \
-             patch('subprocess.run') as mock_run, \
+             patch('app.api.v1.speed_test.run_subprocess') as mock_run, \
              patch('httpx.AsyncClient') as mock_client:
             
             mock_path.return_value = "/path/to/speedtest.exe"
@@ -421,4 +504,56 @@ class TestSpeedTestAPI:
             assert data["ping"] == 25.8
             assert data["jitter"] == 2.1
             assert "Test Server" in data["server_location"]
-            assert data["isp"] == "Test ISP" 
\ No newline at end of file
+            assert data["isp"] == "Test ISP"
+
+    @pytest.mark.api
+    def test_speed_test_download_endpoint(self, client: TestClient):
+        """Test the self-hosted download endpoint streams the requested size."""
+        response = client.get("/api/v1/speed-test/download?bytes=3000000")
+        assert response.status_code == 200
+        assert response.headers["content-length"] == "3000000"
+        assert len(response.content) == 3000000
+        # Payload must not be trivially compressible
+        assert len(set(response.content[:4096])) > 200
+
+    @pytest.mark.api
+    def test_speed_test_download_endpoint_limits(self, client: TestClient):
+        """Test the download endpoint rejects oversized requests."""
+        response = client.get("/api/v1/speed-test/download?bytes=100000000000")
+        assert response.status_code == 422
+
+    @pytest.mark.api
+    def test_speed_test_upload_endpoint(self, client: TestClient):
+        """Test the upload sink counts and discards the request body."""
+        response = client.post("/api/v1/speed-test/upload", content=b"x" * 2_500_000)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["bytes_received"] == 2_500_000
+        assert data["throughput_mbps"] >= 0
+
+    @pytest.mark.unit
+    def test_ookla_cli_path_env_override(self, monkeypatch):
+        """Test OOKLA_CLI_PATH takes precedence over the default locations."""
+        monkeypatch.setenv("OOKLA_CLI_PATH", "/opt/ookla/speedtest")
+        assert get_ookla_cli_path() == "/opt/ookla/speedtest"
+
+    @pytest.mark.integration
+    def test_ookla_cli_with_fake_binary(self, monkeypatch):
+        """Test the Ookla path end to end against the benchmark stand-in CLI."""
+        from app.api.v1 import speed_test
+        fake_cli = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fake_ookla_cli.py")
+        monkeypatch.setattr(speed_test, "OOKLA_CLI_PATH", os.path.abspath(fake_cli))
+        monkeypatch.setenv("FAKE_OOKLA_DOWNLOAD_MBPS", "321")
+        monkeypatch.setenv("FAKE_OOKLA_UPLOAD_MBPS", "45")
+
+        result = speed_test._run_official_ookla_cli({'country_code': 'UA', 'lat': 50.45, 'lon': 30.52})
+        assert result['success']
+        assert result['download_speed'] == 321.0
+        assert result['upload_speed'] == 45.0
+        assert result['download_latency']['iqm'] is not None
+        assert 'p50' not in result['download_latency']
+        assert result['server_location'].startswith("Benchmark")
+        # Progress events feed the counter analysis; the ramp is trimmed
+        assert result['download_analysis']['mbps'] == pytest.approx(321, rel=0.02)
+        assert result['download_analysis']['ramp_seconds'] > 0
+        assert len(result['raw_samples']['upload']['bytes']) > 10
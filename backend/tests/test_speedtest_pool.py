@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.speedtest_pool import SpeedtestPool, SpeedtestSnapshot
+
+SERVER = {'id': '42', 'sponsor': 'Local ISP', 'name': 'Kyiv', 'country': 'Ukraine', 'd': 3.5,
+          'url': 'http://speed.example.net/speedtest/upload.php', 'host': 'speed.example.net:8080'}
+
+
+def _snapshot(**overrides) -> SpeedtestSnapshot:
+    st = SimpleNamespace(
+        config={
+            'client': {'ip': '203.0.113.7', 'isp': 'Example ISP', 'lat': '50.45', 'lon': '30.52'},
+            'ignore_servers': [],
+            'sizes': {'upload': [32768], 'download': [350]},
+            'counts': {'upload': 1, 'download': 1},
+            'threads': {'upload': 2, 'download': 4},
+            'length': {'upload': 10, 'download': 10},
+            'upload_max': 1
+        },
+        lat_lon=(50.45, 30.52),
+        servers={3.5: [dict(SERVER)]},
+        closest=[dict(SERVER)],
+        best=dict(SERVER, latency=12.5)
+    )
+    for key, value in overrides.items():
+        setattr(st, key, value)
+    return SpeedtestSnapshot(st, secure=True)
+
+
+class TestSpeedtestPool:
+    """Test suite for warm speedtest-cli contexts."""
+
+    @pytest.mark.unit
+    def test_acquire_builds_context_without_network(self):
+        pool = SpeedtestPool(builder=_snapshot)
+        assert pool.acquire() is None
+        assert pool.refresh()
+
+        with patch('speedtest.catch_request', side_effect=AssertionError("network used")):
+            st = pool.acquire()
+
+        assert st.best['id'] == '42'
+        assert st.results.ping == 12.5
+        assert st.results.server['sponsor'] == 'Local ISP'
+        assert st.lat_lon == (50.45, 30.52)
+        assert pool.stats()['hits'] == 1
+        assert pool.stats()['misses'] == 1
+
+    @pytest.mark.unit
+    def test_contexts_do_not_share_state(self):
+        pool = SpeedtestPool(builder=_snapshot)
+        pool.refresh()
+        first, second = pool.acquire(), pool.acquire()
+
+        first.config['threads']['download'] = 99
+        first.servers.clear()
+        assert second.config['threads']['download'] == 4
+        assert second.servers == {3.5: [SERVER]}
+
+    @pytest.mark.unit
+    def test_failed_refresh_keeps_snapshot_until_max_age(self):
+        builds = [_snapshot()]
+
+        def builder():
+            if builds:
+                return builds.pop()
+            raise RuntimeError("speedtest.net unreachable")
+
+        pool = SpeedtestPool(builder=builder, max_age=60)
+        assert pool.refresh()
+        assert not pool.refresh()
+        assert pool.snapshot() is not None
+        assert pool.stats()['refresh_failures'] == 1
+
+        pool._snapshot.created_at -= 61
+        assert pool.acquire() is None
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.lazy import LazyModule, lazy_import
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["speedtest", "geopy", "whois", "dns.resolver", "aiohttp", "bcrypt", "dateutil"]
+
+
+class TestLazyImports:
+    """Test suite for deferred imports of heavy dependencies."""
+
+    @pytest.mark.unit
+    def test_module_loads_on_first_attribute(self):
+        proxy = LazyModule("json.decoder", ("json.scanner",))
+        assert not proxy.loaded
+        assert proxy.JSONDecodeError is json.JSONDecodeError
+        assert proxy.loaded
+        assert "lazy module 'json.decoder' (loaded)" in repr(proxy)
+
+    @pytest.mark.unit
+    def test_submodules_keep_dotted_access(self):
+        proxy = lazy_import("email", "email.utils")
+        assert proxy.utils.parseaddr("A <a@example.com>") == ("A", "a@example.com")
+        assert lazy_import("email", "email.utils") is proxy
+
+    @pytest.mark.unit
+    def test_patching_the_real_module_is_seen(self):
+        proxy = lazy_import("json")
+        with patch("json.dumps", return_value="patched"):
+            assert proxy.dumps({}) == "patched"
+        assert proxy.dumps({}) == "{}"
+
+    @pytest.mark.integration
+    def test_app_startup_defers_heavy_modules(self):
+        """Importing app.main must not load the dependencies routers use lazily."""
+        code = (
+            "import json, sys; import app.main; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+        )
+        env = dict(os.environ, SUPABASE_URL="http://localhost:1", SUPABASE_ANON_KEY="test")
+        result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+@pytest.mark.api
+def test_admin_login_hashes_off_the_event_loop(client):
+    """bcrypt work for a login (and the first-use default admin) runs in a worker thread."""
+    def fake_authenticate(email, password):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        return None
+
+    with patch("app.api.v1.admin_auth.authenticate_user", side_effect=fake_authenticate) as authenticate:
+        response = client.post("/api/v1/admin/auth/login", json={"email": "a@example.com", "password": "x"})
+    assert authenticate.called
+    assert response.status_code == 401
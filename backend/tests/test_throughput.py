@@ -0,0 +1,221 @@
+import asyncio
+import os
+import socket
+import sys
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+import uvicorn
+from app.utils.throughput import (
+    summarize_samples, has_converged, _run_phase, _acknowledged_bytes, _upload_worker,
+    ByteCounter, measure_upload, measure_latency, THROUGHPUT_CONFIG
+)
+from app.utils.throughput_analysis import trimmed_mean
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from shaped_speed_server import ShapedServer
+
+UPLINK_MBPS = 16.0
+LINK_LATENCY_MS = 20.0
+
+# Short phases against local sinks
+UPLOAD_CONFIG = dict(THROUGHPUT_CONFIG, streams=3, time_budget=3.0, min_duration=3.0, ramp_time=0.5)
+
+
+def _samples(rates_mbps, interval=0.25):
+    """Build slice samples from per-slice rates in Mbps."""
+    samples = []
+    for i, rate in enumerate(rates_mbps, 1):
+        samples.append({
+            'time': i * interval,
+            'duration': interval,
+            'bytes': int(rate * 1_000_000 / 8 * interval)
+        })
+    return samples
+
+
+@pytest_asyncio.fixture
+async def shaped_sink():
+    """Local sink behind a shared UPLINK_MBPS bottleneck, answering after LINK_LATENCY_MS."""
+    shaped = ShapedServer(0, 0, UPLINK_MBPS, LINK_LATENCY_MS)
+    handlers = set()
+
+    async def handle(reader, writer):
+        handlers.add(asyncio.current_task())
+        try:
+            await shaped.handle(reader, writer)
+        finally:
+            handlers.discard(asyncio.current_task())
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    yield f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    server.close()
+    for handler in list(handlers):
+        handler.cancel()
+    await asyncio.gather(*handlers, return_exceptions=True)
+
+
+class _ReceivedBytes:
+    """ASGI wrapper that counts the request body bytes the app was handed."""
+
+    def __init__(self, app):
+        self.app = app
+        self.total = 0
+
+    async def __call__(self, scope, receive, send):
+        async def counted_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                self.total += len(message.get('body', b''))
+            return message
+        await self.app(scope, counted_receive, send)
+
+
+@pytest_asyncio.fixture
+async def backend_sink():
+    """This backend served on a local port, with the bytes its endpoints received."""
+    from app.main import app
+    received = _ReceivedBytes(app)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(received, lifespan="off", log_level="warning"))
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}", received
+    server.should_exit = True
+    await task
+
+
+class TestThroughputEngine:
+    """Test suite for the multi-stream throughput engine."""
+
+    @pytest.mark.unit
+    def test_trimmed_mean_drops_outliers(self):
+        values = [1.0] + [100.0] * 8 + [1000.0]
+        assert trimmed_mean(values, 0.1) == pytest.approx(100.0)
+
+    @pytest.mark.unit
+    def test_trimmed_mean_empty(self):
+        assert trimmed_mean([], 0.1) == 0.0
+
+    @pytest.mark.unit
+    def test_summarize_discards_ramp(self):
+        config = dict(THROUGHPUT_CONFIG, ramp_time=1.0, trim_fraction=0.0)
+        # Four slow-start slices followed by a stable 500 Mbps phase
+        result = summarize_samples(_samples([50, 150, 300, 450] + [500] * 12), config)
+        assert result['slices_total'] == 16
+        assert result['slices_used'] == 12
+        assert result['mbps'] == pytest.approx(500, rel=0.01)
+
+    @pytest.mark.unit
+    def test_summarize_no_samples(self):
+        assert summarize_samples([], THROUGHPUT_CONFIG) is None
+
+    @pytest.mark.unit
+    def test_summarize_stalled_stream(self):
+        # Every slice timed out without a byte: no rate to report
+        assert summarize_samples(_samples([0] * 29), THROUGHPUT_CONFIG) is None
+
+    @pytest.mark.unit
+    def test_summarize_reports_precision(self):
+        config = dict(THROUGHPUT_CONFIG, ramp_time=0.0, trim_fraction=0.0)
+        steady = summarize_samples(_samples([100, 101, 99, 100] * 4), config)
+        noisy = summarize_samples(_samples([50, 150, 80, 120] * 4), config)
+        assert steady['precision'] < 1.0
+        assert noisy['precision'] > steady['precision']
+
+    @pytest.mark.unit
+    def test_has_converged_requires_level_rates(self):
+        # Tight but still climbing: the window-over-window change blocks the stop
+        climbing = [100 + i * 2 for i in range(12)]
+        assert not has_converged(climbing, 6, 0.03)
+        assert has_converged([100, 101, 99, 100, 100, 101] * 2, 6, 0.03)
+        assert not has_converged([100] * 6, 6, 0.03)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_phase_stops_early_when_converged(self):
+        async def steady_worker(counter, deadline):
+            while True:
+                counter.add(12_500)
+                await asyncio.sleep(0.005)
+
+        config = dict(THROUGHPUT_CONFIG, streams=2, slice_interval=0.05, time_budget=5.0,
+                      min_duration=0.5, ramp_time=0.1, convergence_window=4, convergence_threshold=0.1)
+        start = time.monotonic()
+        result = await _run_phase(steady_worker, config)
+        assert result['converged']
+        assert time.monotonic() - start < 4.0
+        assert result['precision'] is not None
+
+    @pytest.mark.unit
+    def test_acknowledged_bytes_prefers_sink_count(self):
+        request = httpx.Request("POST", "http://sink/upload")
+        assert _acknowledged_bytes(httpx.Response(200, json={'bytes_received': 700}, request=request), 1000) == 700
+        # Never more than was sent, and the whole body for sinks that don't say
+        assert _acknowledged_bytes(httpx.Response(200, json={'bytes_received': 5000}, request=request), 1000) == 1000
+        assert _acknowledged_bytes(httpx.Response(200, json={}, request=request), 1000) == 1000
+        assert _acknowledged_bytes(httpx.Response(200, content=b"", request=request), 1000) == 1000
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_upload_worker_credits_on_answer(self, shaped_sink):
+        counter = ByteCounter()
+        config = dict(UPLOAD_CONFIG, upload_min_request_bytes=100_000)
+        async with httpx.AsyncClient() as client:
+            worker = asyncio.create_task(
+                _upload_worker(client, f"{shaped_sink}/__up", counter, time.monotonic() + 10, config)
+            )
+            # The first body takes ~50ms at the bottleneck plus the answer latency
+            await asyncio.sleep(0.03)
+            assert counter.total == 0
+            await asyncio.sleep(0.5)
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+        assert counter.total >= 100_000
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_upload_rate_matches_bottleneck(self, shaped_sink):
+        result = await measure_upload(f"{shaped_sink}/__up", UPLOAD_CONFIG)
+        assert result['mbps'] == pytest.approx(UPLINK_MBPS, rel=0.25)
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_concurrent_uploads_share_bottleneck(self, shaped_sink):
+        results = await asyncio.gather(*(measure_upload(f"{shaped_sink}/__up", UPLOAD_CONFIG) for _ in range(3)))
+        # Bytes still in socket buffers are not counted, so the runs can't move more than the link carried
+        acknowledged = sum(r['total_bytes'] for r in results)
+        duration = max(r['duration'] for r in results)
+        assert acknowledged * 8 / duration / 1_000_000 <= UPLINK_MBPS * 1.05
+        # Each stable-phase mean covers a short window of a few acknowledgements
+        assert sum(r['mbps'] for r in results) <= UPLINK_MBPS * 1.5
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_upload_to_backend_counts_received_bytes(self, backend_sink):
+        url, received = backend_sink
+        config = dict(UPLOAD_CONFIG, time_budget=1.5, min_duration=1.5, ramp_time=0.25,
+                      upload_request_bytes=5_000_000)
+        result = await measure_upload(f"{url}/api/v1/speed-test/upload", config)
+        assert result['mbps'] > 0
+        assert 0 < result['total_bytes'] <= received.total
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_upload_reports_loaded_latency(self, shaped_sink):
+        config = dict(UPLOAD_CONFIG, loaded_latency_url=f"{shaped_sink}/speedtest/latency.txt")
+        result = await measure_upload(f"{shaped_sink}/__up", config)
+        assert result['latency']['samples'] > 0
+        assert result['latency']['min'] >= LINK_LATENCY_MS
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_latency_ping_and_jitter(self, shaped_sink):
+        result = await measure_latency(f"{shaped_sink}/speedtest/latency.txt", dict(latency_samples=8))
+        assert result['samples'] == 8
+        assert LINK_LATENCY_MS <= result['ping'] < LINK_LATENCY_MS * 3
+        assert 0 <= result['jitter'] < LINK_LATENCY_MS
@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.utils.throughput_analysis import (
+    RawSeriesStore, active_window, analyze_counter, mser_truncation, series
+)
+
+
+def _counter(rates_mbps, interval=0.25):
+    """Cumulative (times, bytes) counter from per-slice rates in Mbps."""
+    times = np.arange(len(rates_mbps) + 1) * interval
+    totals = np.concatenate(([0.0], np.cumsum(np.asarray(rates_mbps) * 1_000_000 / 8 * interval)))
+    return times, totals
+
+
+class TestThroughputAnalysis:
+    """Test suite for byte-counter time-series analysis."""
+
+    @pytest.mark.unit
+    def test_mser_trims_slow_start(self):
+        rates = np.array([20, 80, 200, 350, 460] + [500, 505, 495, 500] * 5, dtype=float)
+        assert mser_truncation(rates) == 5
+        # A stationary series keeps (almost) everything
+        assert mser_truncation(np.array([100, 102, 98, 101, 99, 100] * 3, dtype=float)) <= 1
+
+    @pytest.mark.unit
+    def test_stable_phase_statistics(self):
+        times, totals = _counter([50, 200, 400] + [500] * 20)
+        analysis = analyze_counter(times, totals)
+        assert analysis['mbps'] == pytest.approx(500)
+        assert analysis['ramp_seconds'] == pytest.approx(0.75)
+        assert analysis['stable_slices'] == 20
+        assert analysis['p10'] == analysis['p90'] == pytest.approx(500)
+        assert analysis['unstable'] is False
+
+    @pytest.mark.unit
+    def test_idle_edges_are_ignored(self):
+        times, totals = _counter([0, 0, 0] + [100] * 16 + [0, 0])
+        trimmed_times, trimmed_totals = active_window(times, totals)
+        assert trimmed_times[0] == pytest.approx(0.75)
+        assert trimmed_times[-1] == pytest.approx(4.75)
+        assert analyze_counter(times, totals)['mbps'] == pytest.approx(100)
+
+    @pytest.mark.unit
+    def test_irregular_samples_average_to_bytes_over_time(self):
+        times = [0.0, 0.1, 0.2, 1.2, 1.3, 2.3, 2.4, 3.4]
+        rates = [100, 100, 10, 100, 10, 100, 10]
+        totals = np.concatenate(([0.0], np.cumsum(np.asarray(rates) * 1e6 / 8 * np.diff(times))))
+        analysis = analyze_counter(times, totals, {'min_stable_slices': 1})
+        stable = analysis['stable_seconds']
+        assert analysis['mbps'] == pytest.approx((totals[-1] - totals[-1 - analysis['stable_slices']]) * 8 / 1e6 / stable, rel=1e-3)
+
+    @pytest.mark.unit
+    def test_flags_unstable_measurements(self):
+        noisy = analyze_counter(*_counter([100, 10, 180, 20, 150, 40] * 4))
+        assert 'noisy' in noisy['flags']
+        assert noisy['unstable'] is True
+
+        drifting = analyze_counter(*_counter(list(range(100, 160, 2))))
+        assert 'trending' in drifting['flags']
+
+        short = analyze_counter(*_counter([100, 100, 100]))
+        assert {'short', 'few_samples'} <= set(short['flags'])
+
+    @pytest.mark.unit
+    def test_no_usable_samples(self):
+        assert analyze_counter([0.0], [0.0]) is None
+        assert analyze_counter([0.0, 0.0], [0.0, 10.0]) is None
+
+    @pytest.mark.unit
+    def test_raw_series_store_is_bounded(self):
+        store = RawSeriesStore(max_tests=3)
+        for i in range(5):
+            store.put(f"t{i}", "HTTP", {'download': series([0, 1], [0, 10])})
+        assert store.get("t0") is None
+        assert store.get("t4")['phases']['download'] == {'time': [0.0, 1.0], 'bytes': [0, 10]}
+
+
+@pytest.mark.api
+def test_raw_samples_are_downloadable(client: TestClient):
+    """A test's raw counter series can be fetched as JSON or CSV by its test_id."""
+    measured = {
+        'download_speed': 100.0, 'upload_speed': 20.0, 'ping': 10.0, 'jitter': 1.0,
+        'server_location': 'Test Server', 'method': 'HTTP fallback', 'success': True,
+        'download_analysis': analyze_counter(*_counter([100] * 20)),
+        'raw_samples': {'download': series(*_counter([100] * 4)), 'upload': series(*_counter([20] * 4))}
+    }
+    with patch('app.api.v1.speed_test.get_user_location', return_value=None), \
+         patch('app.api.v1.speed_test._perform_accurate_speed_test', return_value=measured):
+        result = client.post("/api/v1/speed-test").json()
+
+    assert result['download_analysis']['mbps'] == pytest.approx(100)
+    test_id = result['test_id']
+
+    data = client.get(f"/api/v1/speed-test/samples/{test_id}").json()
+    assert data['method'] == 'HTTP fallback'
+    assert len(data['phases']['download']['bytes']) == 5
+
+    csv = client.get(f"/api/v1/speed-test/samples/{test_id}?format=csv")
+    assert csv.headers['content-type'].startswith('text/csv')
+    lines = csv.text.strip().split('\n')
+    assert lines[0] == 'phase,time_s,bytes'
+    assert len(lines) == 11
+
+    assert client.get("/api/v1/speed-test/samples/unknown").status_code == 404
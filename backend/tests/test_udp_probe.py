@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.udp_probe import (
+    HEADER, MAGIC, UDP_PROBE_CONFIG, UDPEchoResponder, UDPProbeStats, resolve_target, run_udp_probe
+)
+
+
+def _packet(seq: int, sent_at: float, echoed_at: float) -> bytes:
+    return HEADER.pack(MAGIC, seq, sent_at, echoed_at) + b"\0" * 8
+
+
+class _LossyResponder(UDPEchoResponder):
+    """Drops every fifth sequence number and echoes every seventh twice."""
+
+    def datagram_received(self, data, addr):
+        seq = HEADER.unpack_from(data)[1]
+        if seq % 5 == 4:
+            return
+        super().datagram_received(data, addr)
+        if seq % 7 == 0:
+            super().datagram_received(data, addr)
+
+
+async def _responder(protocol_factory=UDPEchoResponder):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(protocol_factory, local_addr=("127.0.0.1", 0))
+    return transport, transport.get_extra_info("sockname")[1]
+
+
+@pytest.fixture
+def allow_loopback(monkeypatch):
+    monkeypatch.setitem(UDP_PROBE_CONFIG, "allow_private_targets", True)
+
+
+class TestUDPProbe:
+    """Test suite for the UDP echo packet-loss measurement."""
+
+    @pytest.mark.unit
+    def test_loss_duplicates_and_reordering(self):
+        stats = UDPProbeStats(6)
+        for seq in [0, 2, 1, 3, 3, 5]:
+            stats.record(_packet(seq, seq * 0.1, seq * 0.1 + 0.01), seq * 0.1 + 0.02)
+        stats.record(b"garbage", 1.0)
+
+        summary = stats.summary(6)
+        assert summary["packets_received"] == 5
+        assert summary["packets_lost"] == 1
+        assert summary["duplicates"] == 1
+        assert summary["reordered"] == 1
+        assert summary["max_reorder_distance"] == 1
+        assert summary["invalid"] == 1
+        assert summary["rtt"]["lost"] == 1
+
+    @pytest.mark.unit
+    def test_one_way_jitter_per_direction(self):
+        stats = UDPProbeStats(20)
+        for seq in range(20):
+            sent_at = seq * 0.1
+            # Forward transit alternates 10/20 ms, return transit is constant
+            forward = 0.010 if seq % 2 else 0.020
+            stats.record(_packet(seq, sent_at, 1000 + sent_at + forward), sent_at + forward + 0.005)
+
+        summary = stats.summary(20)
+        assert summary["jitter_forward_ms"] > 5
+        assert summary["jitter_return_ms"] == pytest.approx(0, abs=1e-6)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_private_targets_refused_by_default(self, monkeypatch):
+        monkeypatch.setitem(UDP_PROBE_CONFIG, "allow_private_targets", False)
+        with pytest.raises(ValueError):
+            await resolve_target("127.0.0.1", 9)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_send_duration_is_capped(self):
+        # 1000 packets at 1/s would hold the socket and the request for 17 minutes
+        with pytest.raises(ValueError):
+            await run_udp_probe("127.0.0.1", 9, count=1000, rate=1)
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_probe_against_local_responder(self, allow_loopback):
+        transport, port = await _responder()
+        try:
+            result = await run_udp_probe("127.0.0.1", port, count=100, rate=500, payload_size=200)
+        finally:
+            transport.close()
+
+        assert result["packets_received"] == 100
+        assert result["loss_percent"] == 0
+        assert result["duplicates"] == 0
+        assert result["payload_size"] == 200
+        assert result["rtt"]["samples"] == 100
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_probe_counts_drops_and_duplicates(self, allow_loopback):
+        transport, port = await _responder(_LossyResponder)
+        try:
+            result = await run_udp_probe("127.0.0.1", port, count=50, rate=500, drain_timeout=0.3)
+        finally:
+            transport.close()
+
+        assert result["packets_lost"] == 10
+        assert result["loss_percent"] == 20
+        assert result["duplicates"] == len([s for s in range(50) if s % 7 == 0 and s % 5 != 4])
+
+    @pytest.mark.api
+    @pytest.mark.asyncio
+    async def test_udp_test_endpoint(self, allow_loopback):
+        from app.main import app
+
+        transport, port = await _responder()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post("/api/v1/udp-test", json={
+                    "host": "127.0.0.1", "port": port, "count": 20, "rate": 200
+                })
+        finally:
+            transport.close()
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["packets_received"] == 20
+        assert data["target_ip"] == "127.0.0.1"
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            trickle = await client.post("/api/v1/udp-test", json={"host": "127.0.0.1", "port": port, "rate": 0.001})
+            too_long = await client.post("/api/v1/udp-test", json={
+                "host": "127.0.0.1", "port": port, "count": 1000, "rate": 10
+            })
+        assert trickle.status_code == 422
+        assert too_long.status_code == 400